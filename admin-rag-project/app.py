@@ -1,17 +1,36 @@
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, emit, join_room, leave_room
+import hmac
+import json
 import logging
+import os
+import time
+from functools import wraps
+from werkzeug.exceptions import HTTPException
 from config import Config
+from models.history import parse_timestamp
+from services.categories import CategoryService
 from services.external_service import ChatService, EmbeddingService, FileService, ModelService
+from services.jobs import JobConflict, JobNotCancellable, JobScheduler, job_room
+from services.local_embedding import LocalEmbeddingService
+from services.streaming import DOWNLOAD_HEADERS, sse_event
+from utils import metrics
 
 
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
-socketio = SocketIO(app, cors_allowed_origins="*")
+# SOCKETIO_MESSAGE_QUEUE permet d'émettre des événements depuis d'autres processus
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    message_queue=Config.SOCKETIO_MESSAGE_QUEUE,
+    async_mode=Config.SOCKETIO_ASYNC_MODE,
+    transports=Config.SOCKETIO_TRANSPORTS
+)
 
 # Load configuration
 app.config.from_object(Config)
@@ -23,14 +42,62 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Jobs d'embedding : l'avancement est publié dans la room Socket.IO du modèle
+jobs = JobScheduler(emit=socketio.emit)
+
+# Instrumentation : latence et statut par route, requêtes en cours
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def record_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(error=None):
+    # Pour une réponse en streaming, exécuté une fois le flux terminé
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    metrics.HTTP_IN_FLIGHT.dec()
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = 500 if error is not None else g.pop('response_status', 500)
+    metrics.HTTP_LATENCY.observe(time.perf_counter() - started, method=request.method, route=route)
+    metrics.HTTP_REQUESTS.inc(method=request.method, route=route, status=status)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
+def bulk_token_error():
+    """Réponse d'erreur si la requête ne porte pas `Authorization: Bearer <BULK_INGEST_TOKEN>`, sinon None"""
+    if not Config.BULK_INGEST_TOKEN:
+        return jsonify({"error": "Bulk ingestion is disabled"}), 403
+    header = request.headers.get('Authorization', '')
+    token = header[len('Bearer '):] if header.startswith('Bearer ') else ''
+    if not hmac.compare_digest(token.encode('utf-8'), Config.BULK_INGEST_TOKEN.encode('utf-8')):
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+def require_bulk_token(view):
+    """Exige le jeton d'ingestion en masse ; route désactivée si le jeton n'est pas configuré"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return bulk_token_error() or view(*args, **kwargs)
+    return wrapper
+
 @app.route('/')
 def home():
     return jsonify({"status": "API is running", "message": "Welcome to RAG API"})
 
 
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 # Model Routes
 @app.route('/api/models', methods=['POST'])
 def create_model():
@@ -47,19 +114,17 @@ def create_model():
     except Exception as e:
         logger.error(f"Error creating model: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
-from flask import request, jsonify
-
-from flask import request, jsonify
 
 @app.route('/api/models/upload-model', methods=['POST'])
 def upload_files():
     try:
-        model_name = request.form.get('model_name')  # C'est maintenant le nom du modèle (par exemple, "hello")
-        if not model_name:
-            return jsonify({"error": "Missing model_name"}), 400
+        if Config.STREAM_UPLOADS:
+            # Le corps est relayé tel quel vers le service de modèles, sans passer par request.files
+            request.max_content_length = Config.STREAM_MAX_CONTENT_LENGTH
+            response, status_code = ModelService.upload_stream(request.stream, request.content_type, allowed_file)
+            return jsonify(response), status_code
 
-        # Access model_id from the form data
-        model_name = request.form.get('model_name')
+        model_name = request.form.get('model_name')  # C'est maintenant le nom du modèle (par exemple, "hello")
         if not model_name:
             return jsonify({"error": "Missing model_name"}), 400
 
@@ -75,12 +140,14 @@ def upload_files():
         if not valid_files:
             return jsonify({"error": "No valid files provided"}), 400
 
-        response, status_code = ModelService.upload_files(model_name, valid_files)
-
-        response, status_code = ModelService.upload_files(model_name, valid_files)
+        response, status_code = ModelService.upload_file(model_name, valid_files)
         return jsonify(response), status_code
 
-
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except HTTPException:
+        # 413 (corps trop grand) et autres erreurs HTTP de Werkzeug gardent leur statut
+        raise
     except Exception as e:
         logger.error(f"Error uploading model files: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -116,10 +183,15 @@ def delete_model(model_id):
 
 # Model Files Routes
 @app.route('/api/models/<model_id>/files', methods=['POST'])
-def update_model_files(model_id):
-@app.route('/api/models/<model_id>/files', methods=['POST'])
 def update_model_files(model_id):
     try:
+        if Config.STREAM_UPLOADS:
+            request.max_content_length = Config.STREAM_MAX_CONTENT_LENGTH
+            response, status_code = FileService.update_model_files_stream(
+                model_id, request.stream, request.content_type, allowed_file
+            )
+            return jsonify(response), status_code
+
         if 'files[]' not in request.files:
             return jsonify({"error": "No files provided"}), 400
             
@@ -127,6 +199,10 @@ def update_model_files(model_id):
         response, status_code = FileService.update_model_files(model_id, files)
         return jsonify(response), status_code
         
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating model files: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -135,8 +211,26 @@ def update_model_files(model_id):
 @app.route('/api/models/<model_id>/files/<path:filename>', methods=['GET'])
 def get_model_file(model_id, filename):
     try:
-        response, status_code = FileService.get_model_file(model_id, filename)
-        return jsonify(response), status_code
+        upstream = FileService.get_model_file(model_id, filename, request.headers.get('Range'))
+        if upstream.status_code >= 400:
+            try:
+                return jsonify(upstream.json()), upstream.status_code
+            except ValueError:
+                return jsonify({"error": "File not available"}), upstream.status_code
+            finally:
+                upstream.close()
+
+        headers = {name: upstream.headers[name] for name in DOWNLOAD_HEADERS if name in upstream.headers}
+        headers.setdefault('Accept-Ranges', 'bytes')
+        response = Response(
+            # Octets bruts : Content-Length/Content-Encoding amont restent valides
+            upstream.raw.stream(Config.STREAM_CHUNK_SIZE, decode_content=False),
+            status=upstream.status_code,
+            headers=headers,
+            direct_passthrough=True
+        )
+        response.call_on_close(upstream.close)
+        return response
     except Exception as e:
         logger.error(f"Error listing model files: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -150,12 +244,26 @@ def delete_model_file(model_id, filename):
         logger.error(f"Error deleting model: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
-# Embedding Routesid
+# Embedding Routes
+def submit_job(kind, key, fn, *args, cancellable=True):
+    """202 avec le job créé (ou celui du même type déjà actif), 409 si un autre type de job occupe la clé"""
+    try:
+        job, created = jobs.submit(kind, key, fn, *args, cancellable=cancellable)
+    except JobConflict as e:
+        return jsonify({"error": str(e), "job": e.job.to_dict()}), 409
+    return jsonify({**job.to_dict(), "merged": not created}), 202
+
 @app.route('/api/models/<model_name>/embed', methods=['POST'])
 def embed_documents(model_name):
     try:
-        response, status_code = EmbeddingService.embed_documents(model_name)
-        return jsonify(response), status_code
+        # Jobs, rooms et suivi d'avancement sont indexés par id, comme pour le ré-embedding
+        model_id, status_code = ModelService.resolve_model_id(model_name)
+        if model_id is None:
+            error = "Model not found" if status_code == 404 else "Model service unavailable"
+            return jsonify({"error": error}), status_code
+        # Le service de modèles n'expose pas d'annulation : une fois lancé, l'embedding va à son terme
+        return submit_job('embed', model_id, EmbeddingService.embed_documents_job, model_id, model_name,
+                          cancellable=False)
     except Exception as e:
         logger.error(f"Error embedding model: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -163,12 +271,123 @@ def embed_documents(model_name):
 @app.route('/api/models/<model_id>/reembed', methods=['POST'])
 def reembed_model(model_id):
     try:
-        response, status_code = EmbeddingService.reembed_model(model_id)
-        return jsonify(response), status_code
+        if Config.EMBEDDING_BACKEND == 'local':
+            # Seuls les fichiers ajoutés, modifiés ou retirés sont traités
+            return submit_job('reembed', model_id, LocalEmbeddingService.reembed_model_job, model_id)
+        return submit_job('reembed', model_id, EmbeddingService.reembed_model_job, model_id, cancellable=False)
     except Exception as e:
         logger.error(f"Error re-embedding model: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+# Ingestion en masse d'un répertoire ou d'une archive situé sous BULK_INGEST_ROOT
+@app.route('/api/ingest/bulk', methods=['POST'])
+@require_bulk_token
+def bulk_ingest():
+    try:
+        data = request.get_json(silent=True) or {}
+        if not data.get('source'):
+            return jsonify({"error": "Missing source"}), 400
+        root = os.path.realpath(Config.BULK_INGEST_ROOT)
+        source = os.path.realpath(os.path.join(root, data['source']))
+        if os.path.commonpath([root, source]) != root:
+            return jsonify({"error": "Source must be inside the ingestion root"}), 400
+        if not os.path.exists(source):
+            return jsonify({"error": "Source not found"}), 404
+        return submit_job('bulk_ingest', source, LocalEmbeddingService.bulk_ingest_job,
+                          source, data.get('category'), bool(data.get('restart')),
+                          bool(data.get('create_categories')))
+    except Exception as e:
+        logger.error(f"Error starting bulk ingestion: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+# Catégories de documents de la base locale (création et suppression protégées comme l'ingestion)
+@app.route('/api/categories', methods=['GET'])
+def list_categories():
+    try:
+        response, status_code = CategoryService.list_categories(request.args.get('counts') == 'true')
+        return jsonify(response), status_code
+    except Exception as e:
+        logger.error(f"Error listing categories: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/categories', methods=['POST'])
+@require_bulk_token
+def create_category():
+    try:
+        data = request.get_json(silent=True) or {}
+        if not data.get('name'):
+            return jsonify({"error": "Missing name"}), 400
+        response, status_code = CategoryService.create_category(data['name'])
+        return jsonify(response), status_code
+    except Exception as e:
+        logger.error(f"Error creating category: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/categories/<path:name>', methods=['DELETE'])
+@require_bulk_token
+def delete_category(name):
+    try:
+        response, status_code = CategoryService.delete_category(name)
+        return jsonify(response), status_code
+    except Exception as e:
+        logger.error(f"Error deleting category: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+# Job Routes (les jobs d'ingestion en masse exigent le jeton, comme leur lancement)
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    listed = jobs.list(request.args.get('model'))
+    if bulk_token_error() is not None:
+        listed = [job for job in listed if job.kind != 'bulk_ingest']
+    return jsonify({"jobs": [job.to_dict() for job in listed]}), 200
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job.kind == 'bulk_ingest':
+        error = bulk_token_error()
+        if error is not None:
+            return error
+    return jsonify(job.to_dict()), 200
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = jobs.get(job_id)
+    if job is not None and job.kind == 'bulk_ingest':
+        error = bulk_token_error()
+        if error is not None:
+            return error
+    try:
+        job = jobs.cancel(job_id)
+    except JobNotCancellable as e:
+        return jsonify({"error": f"{e}: the model service has no cancel endpoint", "job": e.job.to_dict()}), 409
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+# Socket.IO : un client s'abonne aux événements de job d'un modèle
+@socketio.on('subscribe')
+def subscribe(data=None):
+    model = _subscription_model(data)
+    if model is None:
+        emit('subscription_error', {"error": "Missing model"})
+        return
+    join_room(job_room(model))
+
+@socketio.on('unsubscribe')
+def unsubscribe(data=None):
+    model = _subscription_model(data)
+    if model is None:
+        emit('subscription_error', {"error": "Missing model"})
+        return
+    leave_room(job_room(model))
+
+def _subscription_model(data):
+    model = data.get('model') if isinstance(data, dict) else None
+    return str(model) if model not in (None, '') else None
+
 # Chat Routes
 @app.route('/api/ask', methods=['POST'])
 def ask_question():
@@ -186,11 +405,107 @@ def ask_question():
         logger.error(f"Error asking question: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+def open_answer(model_name, question):
+    """Ouvre la réponse amont en streaming ; renvoie (upstream, None) ou (None, (erreur, status))"""
+    upstream = ChatService.open_answer_stream(model_name, question)
+    if upstream.status_code >= 400:
+        try:
+            error = upstream.json()
+        except ValueError:
+            error = {"error": f"Upstream returned {upstream.status_code}"}
+        finally:
+            upstream.close()
+        return None, (error, upstream.status_code)
+    return upstream, None
+
+def stream_answer(upstream, started, model_name=None, question=None):
+    """Relaie la réponse bloc par bloc : ('chunk', texte)... puis ('done', timings)"""
+    ttfb = None
+    for text in ChatService.iter_answer(upstream, model_name, question):
+        if ttfb is None:
+            ttfb = time.perf_counter() - started
+            logger.info(f"Answer time-to-first-byte: {ttfb * 1000:.1f} ms")
+        yield 'chunk', text
+    total = time.perf_counter() - started
+    yield 'done', {
+        "ttfb_ms": round(ttfb * 1000, 1) if ttfb is not None else None,
+        "total_ms": round(total * 1000, 1)
+    }
+
+@app.route('/api/ask/stream', methods=['POST'])
+def ask_question_stream():
+    started = time.perf_counter()
+    try:
+        data = request.get_json()
+        question = data.get('question')
+        model_name = data.get('model_name')
+
+        if not question or not model_name:
+            return jsonify({"error": "Question and model_name are required"}), 400
+
+        upstream, error = open_answer(model_name, question)
+        if error:
+            return jsonify(error[0]), error[1]
+    except Exception as e:
+        logger.error(f"Error asking question: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+    def generate():
+        try:
+            for event, payload in stream_answer(upstream, started, model_name, question):
+                if event == 'chunk':
+                    yield sse_event(payload)
+                else:
+                    yield sse_event(json.dumps(payload), event=event)
+        except Exception as e:
+            logger.error(f"Error streaming answer: {str(e)}", exc_info=True)
+            yield sse_event(json.dumps({"error": str(e)}), event='error')
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        # Désactive la mise en tampon des proxys (nginx) pour que chaque bloc parte immédiatement
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@socketio.on('ask')
+def ask_question_socket(data):
+    """Variante Socket.IO : answer_chunk pour chaque bloc, puis answer_done ou answer_error"""
+    started = time.perf_counter()
+    question = (data or {}).get('question')
+    model_name = (data or {}).get('model_name')
+    if not question or not model_name:
+        emit('answer_error', {"error": "Question and model_name are required"})
+        return
+    try:
+        upstream, error = open_answer(model_name, question)
+        if error:
+            emit('answer_error', error[0])
+            return
+        for event, payload in stream_answer(upstream, started, model_name, question):
+            if event == 'chunk':
+                emit('answer_chunk', {"text": payload})
+            else:
+                emit('answer_done', payload)
+    except Exception as e:
+        logger.error(f"Error streaming answer: {str(e)}", exc_info=True)
+        emit('answer_error', {"error": str(e)})
+
 @app.route('/api/history', methods=['GET'])
 def get_chat_history():
+    """Historique paginé : ?limit=&before=|after=<curseur>&model=&since=&until= (epoch ou ISO 8601)"""
     try:
-        response, status_code = ChatService.get_chat_history()
+        response, status_code = ChatService.get_chat_history(
+            limit=request.args.get('limit', type=int),
+            before=request.args.get('before'),
+            after=request.args.get('after'),
+            model_name=request.args.get('model'),
+            since=parse_timestamp(request.args.get('since')),
+            until=parse_timestamp(request.args.get('until'))
+        )
         return jsonify(response), status_code
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting chat history: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -200,6 +515,28 @@ def get_chat_history():
 def not_found(error):
     return jsonify({"error": "Endpoint not found"}), 404
 
+def startup():
+    """Démarrage d'un worker : ouvre la base et préchauffe le modèle d'embedding (EMBEDDING_WARMUP)"""
+    if not Config.EMBEDDING_WARMUP:
+        return
+    from models.database import get_db
+    started = time.perf_counter()
+    try:
+        get_db()
+    except Exception as e:
+        # Le worker sert quand même ; le chargement sera retenté à la première recherche
+        logger.error(f"Embedding model warmup failed: {str(e)}", exc_info=True)
+        return
+    logger.info(f"Embedding model warmed up in {time.perf_counter() - started:.2f}s")
+
+def shutdown(timeout=None):
+    """Arrêt d'un worker : laisse les jobs en cours se terminer dans le délai imparti"""
+    timeout = Config.SHUTDOWN_GRACE_SECONDS if timeout is None else timeout
+    remaining = jobs.shutdown(timeout)
+    logger.info(f"Worker shut down ({len(remaining)} job(s) interrupted)")
+
+# Serveur de développement ; en production : gunicorn -c gunicorn.conf.py wsgi:app
 if __name__ == '__main__':
-   socketio.run(app, host='0.0.0.0', port=5000, debug=True, allow_unsafe_werkzeug=True)
+   startup()
+   socketio.run(app, host=Config.SERVER_HOST, port=Config.SERVER_PORT, debug=Config.DEBUG, allow_unsafe_werkzeug=True)
  
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+Service de modèles factice pour les benchmarks.
+
+Reproduit les routes de MODEL_SERVICE_URL appelées par le proxy avec une
+latence simulée (`latency_ms` ± `jitter_ms`) et des réponses dont la taille
+est fixée par `payload_kb`. Utilisable seul :
+
+    python -m benchmarks.fake_model_service --port 8000 --latency-ms 50
+"""
+import argparse
+import random
+import threading
+import time
+
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+
+
+def create_app(latency_ms=20, jitter_ms=0, payload_kb=1, answer_chunks=20):
+    app = Flask(__name__)
+    padding = 'x' * (payload_kb * 1024)
+    history = []
+    lock = threading.Lock()
+
+    def delay(seconds=None):
+        if seconds is None:
+            seconds = max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000.0
+        if seconds:
+            time.sleep(seconds)
+
+    def model(model_id):
+        return {
+            "id": model_id,
+            "name": f"model-{model_id}",
+            "status": "ready",
+            "files": [{"id": "f1", "name": "doc.pdf", "path": f"uploads/{model_id}/doc.pdf"}],
+            "payload": padding
+        }
+
+    @app.route('/models', methods=['GET'])
+    def list_models():
+        delay()
+        return jsonify([model(str(i)) for i in range(10)])
+
+    @app.route('/models', methods=['POST'])
+    def create_model():
+        delay()
+        data = request.get_json(silent=True) or {}
+        return jsonify({**model("new"), "name": data.get('name')}), 201
+
+    @app.route('/models/<model_id>', methods=['GET'])
+    def get_model(model_id):
+        delay()
+        return jsonify(model(model_id))
+
+    @app.route('/models/<model_id>', methods=['DELETE'])
+    def delete_model(model_id):
+        delay()
+        return jsonify({"message": f"Model {model_id} deleted"})
+
+    @app.route('/upload', methods=['POST'])
+    @app.route('/update-model', methods=['POST'])
+    def upload():
+        # Lecture complète du corps, comme le ferait le vrai service
+        received = len(request.get_data(cache=False))
+        delay()
+        return jsonify({"message": "Files uploaded", "bytes": received})
+
+    @app.route('/models/<model_id>/files/<path:filename>', methods=['GET'])
+    def get_file(model_id, filename):
+        delay()
+        return Response(padding.encode('ascii'), mimetype='application/octet-stream')
+
+    @app.route('/models/<model_id>/files/<path:filename>', methods=['DELETE'])
+    def delete_file(model_id, filename):
+        delay()
+        return jsonify({"message": f"{filename} deleted"})
+
+    @app.route('/embed', methods=['POST'])
+    @app.route('/reembed', methods=['POST'])
+    def embed():
+        delay()
+        return jsonify({"message": "Embedding completed", "chunks": 100})
+
+    @app.route('/models/<model_id>/embedding-status', methods=['GET'])
+    def embedding_status(model_id):
+        return jsonify({"status": "running", "files_done": 1, "files_total": 2})
+
+    @app.route('/ask', methods=['POST'])
+    def ask():
+        data = request.get_json(silent=True) or {}
+        answer = ("Réponse simulée " + padding)[:max(1, payload_kb * 1024)]
+        with lock:
+            history.append({"question": data.get('question'), "answer": answer[:200]})
+            del history[:-100]
+        if not data.get('stream'):
+            delay()
+            return jsonify({"answer": answer})
+
+        size = max(1, len(answer) // answer_chunks)
+
+        def generate():
+            # Latence répartie entre les blocs, comme une génération token par token
+            for start in range(0, len(answer), size):
+                delay(latency_ms / 1000.0 / answer_chunks)
+                yield answer[start:start + size]
+
+        return Response(generate(), mimetype='text/plain')
+
+    @app.route('/history', methods=['GET'])
+    def get_history():
+        delay()
+        with lock:
+            return jsonify(list(history))
+
+    return app
+
+
+class FakeModelService:
+    """Sert `create_app(...)` sur localhost dans un thread ; `url` est connu après `start()`"""
+
+    def __init__(self, host='127.0.0.1', port=0, **options):
+        self.server = make_server(host, port, create_app(**options), threaded=True)
+        self.url = f"http://{host}:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-model-service", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--payload-kb', type=int, default=1)
+    args = parser.parse_args()
+    service = FakeModelService(args.host, args.port, latency_ms=args.latency_ms,
+                               jitter_ms=args.jitter_ms, payload_kb=args.payload_kb)
+    print(f"Fake model service listening on {service.url}")
+    service.server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
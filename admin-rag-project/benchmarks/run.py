@@ -0,0 +1,466 @@
+"""
+Benchmarks du proxy Flask et du stockage Chroma local.
+
+Proxy : un service de modèles factice est démarré sur localhost, app.py est
+servi devant lui, puis chaque route /api/* est sollicitée à plusieurs niveaux
+de concurrence. Stockage : ChromaDBManager est alimenté avec des corpus
+synthétiques de taille croissante (ingestion puis recherche). Quantification :
+chaque mode de VECTOR_STORE_MODE est comparé à une recherche exacte (octets
+de vecteurs économisés, recall@k, latence), sur un corpus synthétique ou sur
+nos propres documents (`--documents`).
+
+Les résultats (débit, p50/p95/p99) sont écrits en JSON ; `--baseline` compare
+avec un fichier produit sur un autre commit.
+
+    python -m benchmarks.run --concurrency 1,8,32 --requests 200 --output results.json
+    python -m benchmarks.run --skip-proxy --corpus-sizes 1000,10000,50000
+    python -m benchmarks.run --baseline results-main.json --max-regression 20
+    python -m benchmarks.run --skip-proxy --skip-store --documents uploads/ --model-embeddings
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from benchmarks.fake_model_service import FakeModelService
+
+WORDS = ("porte fenêtre carrelage douche baignoire robinet parquet enduit isolation menuiserie "
+         "aluminium bois vitrage joint silicone faïence lavabo receveur plinthe seuil").split()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round((len(latencies) + errors) / elapsed, 2) if elapsed else None,
+        "p50_ms": _ms(percentile(latencies, 50)),
+        "p95_ms": _ms(percentile(latencies, 95)),
+        "p99_ms": _ms(percentile(latencies, 99)),
+        "max_ms": _ms(latencies[-1] if latencies else None)
+    }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def run_load(call, concurrency, total):
+    """Exécute `call(i)` `total` fois sur `concurrency` threads ; `call` lève en cas d'échec"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            call(i)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+# Proxy
+
+def proxy_scenarios(payload_kb):
+    """
+    (nom, méthode, chemin, arguments de requests) pour chaque route /api/*
+
+    Les arguments sont construits par `kwargs(run, i)` : les questions incluent
+    l'identifiant de passe pour que deux passes n'envoient jamais le même texte
+    (sinon le single-flight de /api/ask les servirait sans appeler l'amont).
+    """
+    upload = b'%PDF-1.4 ' + os.urandom(payload_kb * 1024)
+    files = lambda: {'files[]': ('doc.pdf', upload, 'application/pdf')}
+    question = lambda run, i: {'model_name': 'm1', 'question': f"[{run}] Question numéro {i} ?"}
+    return [
+        ("GET /api/models", 'GET', '/api/models', lambda run, i: {}),
+        ("POST /api/models", 'POST', '/api/models',
+         lambda run, i: {'json': {'name': f"bench-{run}-{i}", 'description': ''}}),
+        ("GET /api/models/<id>", 'GET', '/api/models/m1', lambda run, i: {}),
+        ("DELETE /api/models/<id>", 'DELETE', '/api/models/m{i}', lambda run, i: {}),
+        ("POST /api/models/upload-model", 'POST', '/api/models/upload-model',
+         lambda run, i: {'files': files(), 'data': {'model_name': 'm1'}}),
+        ("POST /api/models/<id>/files", 'POST', '/api/models/m1/files', lambda run, i: {'files': files()}),
+        ("GET /api/models/<id>/files/<name>", 'GET', '/api/models/m1/files/doc.pdf', lambda run, i: {}),
+        ("DELETE /api/models/<id>/files/<name>", 'DELETE', '/api/models/m1/files/doc{i}.pdf', lambda run, i: {}),
+        ("POST /api/models/<name>/embed", 'POST', '/api/models/model-1/embed', lambda run, i: {}),
+        ("POST /api/models/<id>/reembed", 'POST', '/api/models/m{i}/reembed', lambda run, i: {}),
+        ("GET /api/jobs", 'GET', '/api/jobs', lambda run, i: {}),
+        ("POST /api/ask", 'POST', '/api/ask', lambda run, i: {'json': question(run, i)}),
+        ("POST /api/ask/stream", 'POST', '/api/ask/stream',
+         lambda run, i: {'json': question(run, i), 'stream': True}),
+        ("GET /api/history", 'GET', '/api/history', lambda run, i: {}),
+    ]
+
+
+def bench_proxy(args):
+    fake = FakeModelService(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                            payload_kb=args.payload_kb).start()
+    # config.py lit l'environnement à l'import : app est importé après ce réglage
+    os.environ['MODEL_SERVICE_URL'] = fake.url
+    if args.no_response_cache:
+        for name in ('RESPONSE_CACHE_TTL_MODELS', 'RESPONSE_CACHE_TTL_MODEL'):
+            os.environ[name] = '0'
+    from werkzeug.serving import make_server
+    import app as proxy
+
+    for name in (None, 'werkzeug'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, proxy.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name="proxy", daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    results = []
+    try:
+        for name, method, path, kwargs in proxy_scenarios(args.payload_kb):
+            if args.routes and not any(route in name for route in args.routes):
+                continue
+            for concurrency in args.concurrency:
+                def load(run, total):
+                    def call(i):
+                        response = session().request(method, base_url + path.format(i=i), timeout=60,
+                                                     **kwargs(run, i))
+                        for _ in response.iter_content(chunk_size=None):
+                            pass
+                        if response.status_code >= 400:
+                            raise RuntimeError(response.status_code)
+                    return run_load(call, concurrency, total)
+
+                # Premier passage hors mesure : connexions et imports paresseux
+                load(f"c{concurrency}-warmup", min(concurrency, args.requests))
+                stats = load(f"c{concurrency}", args.requests)
+                results.append({"route": name, "concurrency": concurrency, **stats})
+                print(f"{name:40} c={concurrency:<4} {stats['throughput_rps']:>9} rps  "
+                      f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms "
+                      f"errors={stats['errors']}")
+    finally:
+        server.shutdown()
+        fake.stop()
+    return results
+
+
+# Stockage local
+
+class SyntheticEmbeddings:
+    """Vecteurs déterministes dérivés du texte : mesure le stockage sans le coût du modèle"""
+
+    def __init__(self, dim):
+        self.dim = dim
+
+    def embed(self, text):
+        rng = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+        vector = [rng.gauss(0, 1) for _ in range(self.dim)]
+        norm = sum(value * value for value in vector) ** 0.5
+        return [value / norm for value in vector]
+
+    def embed_many(self, texts):
+        return [self.embed(text) for text in texts]
+
+
+def synthetic_chunk(rng, doc, index):
+    words = ' '.join(rng.choice(WORDS) for _ in range(60))
+    return f"Document {doc} section {index} : {words}"
+
+
+def bench_store(args):
+    from models.database import ChromaDBManager
+
+    if args.model_embeddings:
+        from utils.embedding_engine import get_engine
+        embed_many = get_engine().encode
+    else:
+        synthetic = SyntheticEmbeddings(args.dim)
+        embed_many = synthetic.embed_many
+
+    results = []
+    for size in args.corpus_sizes:
+        path = tempfile.mkdtemp(prefix='bench-chroma-')
+        try:
+            db = ChromaDBManager(path=path)
+            if not args.model_embeddings:
+                db.embed_query = synthetic.embed
+            categories = db.categories()
+            rng = random.Random(size)
+
+            started = time.perf_counter()
+            docs = max(1, size // args.chunks_per_doc)
+            for doc in range(docs):
+                chunks = [synthetic_chunk(rng, doc, i) for i in range(args.chunks_per_doc)]
+                db.add_chunks(categories[doc % len(categories)], f"doc-{doc}", chunks, embed_many(chunks),
+                              {"filename": f"doc-{doc}.pdf"})
+            ingest_seconds = time.perf_counter() - started
+            chunks_total = docs * args.chunks_per_doc
+            result = {
+                "corpus_chunks": chunks_total,
+                "ingest_seconds": round(ingest_seconds, 3),
+                "ingest_chunks_per_second": round(chunks_total / ingest_seconds, 1),
+                "query": {}
+            }
+            print(f"store size={chunks_total:<7} ingest {result['ingest_chunks_per_second']} chunks/s")
+
+            queries = [' '.join(rng.choice(WORDS) for _ in range(6)) + f" {i}" for i in range(args.requests)]
+            phases = [
+                ("all_categories", lambda i: db.query_collection(queries[i])),
+                ("one_category", lambda i: db.query_collection(queries[i], category=categories[0])),
+                # Questions répétées : sert le cache de résultats
+                ("cached", lambda i: db.query_collection(queries[i % 10])),
+            ]
+            for phase, call in phases:
+                for concurrency in args.concurrency:
+                    db.invalidate_collection()
+                    stats = run_load(call, concurrency, args.requests)
+                    result["query"].setdefault(phase, []).append({"concurrency": concurrency, **stats})
+                    print(f"store size={chunks_total:<7} query {phase:15} c={concurrency:<4} "
+                          f"{stats['throughput_rps']:>9} qps  p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms "
+                          f"p99={stats['p99_ms']}ms")
+            results.append(result)
+            db.query_executor.shutdown()
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+    return results
+
+
+def _ingest_documents(db, directory, categories):
+    from functools import partial
+    from utils.extractors import supported_extensions
+    from utils.ingestion import ingest_file
+
+    extensions = set(supported_extensions())
+    files = sorted(os.path.join(root, name) for root, _, names in os.walk(directory) for name in names
+                   if os.path.splitext(name)[1].lstrip('.').lower() in extensions)
+    for position, filepath in enumerate(files):
+        try:
+            ingest_file(partial(db.add_chunks, categories[position % len(categories)]), filepath)
+        except Exception as e:
+            print(f"skipped {filepath}: {e}")
+
+
+def _all_vectors(db):
+    ids, vectors = [], []
+    for collection in map(db.collection, db.categories()):
+        offset = 0
+        while True:
+            page = collection.get(limit=1000, offset=offset, include=["embeddings"])
+            if not len(page['ids']):
+                break
+            ids.extend(page['ids'])
+            vectors.extend(page['embeddings'])
+            offset += len(page['ids'])
+    return ids, np.asarray(vectors, dtype=np.float32)
+
+
+def measure_quantization(db, queries, k):
+    """Recall@k et latence de chaque mode par rapport à une recherche exacte (force brute float32)"""
+    from config import Config
+
+    ids, vectors = _all_vectors(db)
+    embeddings = [np.asarray(db.embed_query(query), dtype=np.float32) for query in queries]
+    exact = [{ids[i] for i in np.argsort(((vectors - query) ** 2).sum(axis=1))[:k]} for query in embeddings]
+    full_bytes = vectors.nbytes
+
+    result = {"vectors": len(ids), "dim": int(vectors.shape[1]) if len(ids) else 0,
+              "float32_bytes": full_bytes, "modes": {}}
+    for mode in ('chroma', 'float16', 'int8'):
+        Config.VECTOR_STORE_MODE = mode
+        db.quantized = {}
+        stored = sum(db.quantized_index(category).nbytes() for category in db.categories()) \
+            if mode != 'chroma' else full_bytes
+        db.invalidate_collection()
+        latencies, recalls = [], []
+        for query, expected in zip(queries, exact):
+            started = time.perf_counter()
+            found = {item["id"] for item in db.query_collection(query, k=k, mode='vector')}
+            latencies.append(time.perf_counter() - started)
+            recalls.append(len(found & expected) / max(1, len(expected)))
+        stats = summarize(latencies, 0, sum(latencies))
+        result["modes"][mode] = {
+            "vector_bytes": stored,
+            "saved_pct": round(100.0 * (1 - stored / full_bytes), 1) if full_bytes else 0.0,
+            f"recall_at_{k}": round(sum(recalls) / len(recalls), 4),
+            "p50_ms": stats["p50_ms"],
+            "p95_ms": stats["p95_ms"]
+        }
+    Config.VECTOR_STORE_MODE = 'chroma'
+    return result
+
+
+def bench_quantization(args):
+    from models.database import ChromaDBManager
+
+    if args.model_embeddings:
+        from utils.embedding_engine import get_engine
+        embed_many = get_engine().encode
+    else:
+        synthetic = SyntheticEmbeddings(args.dim)
+        embed_many = synthetic.embed_many
+
+    corpora = [None] if args.documents else args.corpus_sizes
+    results = []
+    for size in corpora:
+        path = tempfile.mkdtemp(prefix='bench-quantized-')
+        try:
+            db = ChromaDBManager(path=path)
+            if not args.model_embeddings:
+                db.embed_query = synthetic.embed
+            categories = db.categories()
+            rng = random.Random(size)
+            if args.documents:
+                _ingest_documents(db, args.documents, categories)
+                # Questions tirées des chunks eux-mêmes : leurs voisins exacts sont connus
+                sample = db.get_documents(limit=max(args.requests, 1))["documents"]
+                queries = [' '.join((item["text"] or "").split()[:12]) for item in sample] or ["douche"]
+            else:
+                docs = max(1, size // args.chunks_per_doc)
+                for doc in range(docs):
+                    chunks = [synthetic_chunk(rng, doc, i) for i in range(args.chunks_per_doc)]
+                    db.add_chunks(categories[doc % len(categories)], f"doc-{doc}", chunks, embed_many(chunks),
+                                  {"filename": f"doc-{doc}.pdf"})
+                queries = [' '.join(rng.choice(WORDS) for _ in range(6)) + f" {i}" for i in range(args.requests)]
+
+            result = {"corpus": args.documents or "synthetic", **measure_quantization(db, queries, args.k)}
+            for mode, stats in result["modes"].items():
+                print(f"quantization vectors={result['vectors']:<7} {mode:8} {stats['vector_bytes']:>11} bytes "
+                      f"(-{stats['saved_pct']}%)  recall@{args.k}={stats[f'recall_at_{args.k}']}  "
+                      f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms")
+            results.append(result)
+            db.query_executor.shutdown()
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+    return results
+
+
+# Comparaison
+
+def compare(results, baseline, max_regression):
+    """Affiche les écarts de p95 et de débit ; renvoie les lignes dépassant `max_regression` %"""
+    def index(data):
+        rows = {}
+        for row in data.get("proxy", []):
+            rows[("proxy", row["route"], row["concurrency"])] = row
+        for store in data.get("store", []):
+            for phase, phase_rows in store["query"].items():
+                for row in phase_rows:
+                    rows[("store", store["corpus_chunks"], phase, row["concurrency"])] = row
+        return rows
+
+    current, previous = index(results), index(baseline)
+    regressions = []
+    for key in sorted(current.keys() & previous.keys(), key=str):
+        before, after = previous[key], current[key]
+        if not before.get("p95_ms") or not after.get("p95_ms"):
+            continue
+        p95_delta = (after["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+        rps_delta = (after["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"] * 100
+        print(f"{' / '.join(map(str, key)):60} p95 {p95_delta:+6.1f}%  throughput {rps_delta:+6.1f}%")
+        if max_regression is not None and p95_delta > max_regression:
+            regressions.append(key)
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=_int_list, default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=200, help="requêtes mesurées par route et par niveau")
+    parser.add_argument('--latency-ms', type=float, default=20, help="latence simulée du service de modèles")
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--payload-kb', type=int, default=4, help="taille des réponses et fichiers simulés")
+    parser.add_argument('--routes', nargs='*', help="ne mesure que les routes contenant ces fragments")
+    parser.add_argument('--no-response-cache', action='store_true', help="désactive le cache des GET relayés")
+    parser.add_argument('--corpus-sizes', type=_int_list, default=[1000, 5000, 20000])
+    parser.add_argument('--chunks-per-doc', type=int, default=20)
+    parser.add_argument('--dim', type=int, default=384, help="dimension des vecteurs synthétiques")
+    parser.add_argument('--model-embeddings', action='store_true', help="utilise le vrai modèle d'embedding")
+    parser.add_argument('--skip-proxy', action='store_true')
+    parser.add_argument('--skip-store', action='store_true')
+    parser.add_argument('--skip-quantization', action='store_true')
+    parser.add_argument('--documents', help="répertoire de documents réels pour le benchmark de quantification")
+    parser.add_argument('--k', type=int, default=10, help="k du recall@k mesuré")
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', help="fichier de résultats d'un autre commit à comparer")
+    parser.add_argument('--max-regression', type=float, help="échec si un p95 augmente de plus de N %%")
+    args = parser.parse_args(argv)
+    # Lu par config.py à son premier import
+    os.environ['EMBEDDING_WARMUP'] = 'true' if args.model_embeddings else 'false'
+
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {name: value for name, value in vars(args).items() if name not in ('output', 'baseline')}
+        }
+    }
+    if not args.skip_proxy:
+        results["proxy"] = bench_proxy(args)
+    if not args.skip_store:
+        results["store"] = bench_store(args)
+    if not args.skip_quantization:
+        results["quantization"] = bench_quantization(args)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.max_regression}%")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
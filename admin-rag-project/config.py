@@ -7,17 +7,149 @@ class Config:
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    # Journalisation des corps échangés avec le service de modèles (tronqués)
+    LOG_UPSTREAM_PAYLOADS = os.getenv('LOG_UPSTREAM_PAYLOADS', 'false').lower() == 'true'
+    LOG_PAYLOAD_MAX_CHARS = int(os.getenv('LOG_PAYLOAD_MAX_CHARS', '500'))
     
     # File upload
     ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt', 'xlsx', 'xml'}
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+
+    # Streaming des uploads/téléchargements vers le service de modèles
+    STREAM_UPLOADS = os.getenv('STREAM_UPLOADS', 'true').lower() == 'true'
+    STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', str(64 * 1024)))
+    # Limite des corps relayés en streaming (octets, 10 Go par défaut). Doit être explicite :
+    # une limite None par requête retomberait sur MAX_CONTENT_LENGTH (envois en tampon seulement)
+    STREAM_MAX_CONTENT_LENGTH = int(os.getenv('STREAM_MAX_CONTENT_LENGTH', str(10 * 1024 ** 3)))
     
     # Services
 
     MODEL_SERVICE_URL = os.getenv('MODEL_SERVICE_URL', 'http://localhost:8000')
    
+    # HTTP client (pool de connexions vers MODEL_SERVICE_URL)
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))
+    HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '4'))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '3'))
+    HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.3'))
+
+    # Stockage local
+    CHROMA_DB_PATH = os.getenv('CHROMA_DB_PATH', 'db')
+    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
+    REGISTRY_DB_PATH = os.getenv('REGISTRY_DB_PATH', os.path.join(CHROMA_DB_PATH, 'registry.sqlite3'))
+    HISTORY_DB_PATH = os.getenv('HISTORY_DB_PATH', os.path.join(CHROMA_DB_PATH, 'history.sqlite3'))
+    QUANTIZED_DB_PATH = os.getenv('QUANTIZED_DB_PATH', os.path.join(CHROMA_DB_PATH, 'quantized'))
+    LEXICAL_DB_PATH = os.getenv('LEXICAL_DB_PATH', os.path.join(CHROMA_DB_PATH, 'lexical'))
+
+    # Historique des échanges : taille de page par défaut / max, délai avant nouvel import amont
+    HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '50'))
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv('HISTORY_MAX_PAGE_SIZE', '500'))
+    HISTORY_BACKFILL_RETRY = float(os.getenv('HISTORY_BACKFILL_RETRY', '60'))
+
+    # Embeddings
+    EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+    EMBEDDING_DEVICE = os.getenv('EMBEDDING_DEVICE', '')  # '' = choix automatique (cuda si disponible)
+    EMBEDDING_WARMUP = os.getenv('EMBEDDING_WARMUP', 'true').lower() == 'true'
+    # Micro-batching : taille max d'un batch et attente max avant envoi au modèle
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+    EMBEDDING_MAX_WAIT_MS = float(os.getenv('EMBEDDING_MAX_WAIT_MS', '5'))
+    EMBEDDING_WORKERS = int(os.getenv('EMBEDDING_WORKERS', '1'))
+    # Découpage en tokens du modèle : taille max (0 = limite du modèle), recouvrement entre chunks,
+    # remplissage au-delà duquel un paragraphe qui ne tient pas commence un nouveau chunk
+    CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '0'))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '32'))
+    CHUNK_PARAGRAPH_MIN_FILL = float(os.getenv('CHUNK_PARAGRAPH_MIN_FILL', '0.5'))
+
+    # Extraction PDF et ingestion
+    PDF_MAX_FILE_SIZE = int(os.getenv('PDF_MAX_FILE_SIZE', str(200 * 1024 * 1024)))
+    PDF_MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', '5000'))
+    PDF_TIMEOUT = float(os.getenv('PDF_TIMEOUT', '300'))
+    PDF_MAX_WORKERS = int(os.getenv('PDF_MAX_WORKERS', str(os.cpu_count() or 1)))
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '50'))
+    PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', '10'))
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '256'))
+    # Ingestion en masse : processus d'extraction, chunks par appel au modèle et par collection.add,
+    # racine des sources acceptées par l'API, manifestes de reprise, archives décompressées.
+    # L'API d'ingestion et de gestion des catégories exige `Authorization: Bearer <BULK_INGEST_TOKEN>`
+    # (désactivée si vide)
+    BULK_EXTRACT_WORKERS = int(os.getenv('BULK_EXTRACT_WORKERS', str(os.cpu_count() or 1)))
+    BULK_EMBED_BATCH = int(os.getenv('BULK_EMBED_BATCH', '1024'))
+    BULK_WRITE_BATCH = int(os.getenv('BULK_WRITE_BATCH', '512'))
+    BULK_INGEST_ROOT = os.getenv('BULK_INGEST_ROOT', UPLOAD_FOLDER)
+    BULK_MANIFEST_DIR = os.getenv('BULK_MANIFEST_DIR', os.path.join(CHROMA_DB_PATH, 'bulk'))
+    BULK_STAGING_FOLDER = os.getenv('BULK_STAGING_FOLDER', os.path.join(UPLOAD_FOLDER, '.bulk'))
+    BULK_INGEST_TOKEN = os.getenv('BULK_INGEST_TOKEN', '')
+
+    # Recherche : k par défaut, parallélisme et délai max par requête (secondes, 0 = aucun)
+    QUERY_TOP_K = int(os.getenv('QUERY_TOP_K', '3'))
+    QUERY_MAX_WORKERS = int(os.getenv('QUERY_MAX_WORKERS', '4'))
+    QUERY_TIMEOUT = float(os.getenv('QUERY_TIMEOUT', '0')) or None
+
+    # Catégories créées au premier démarrage (séparées par des virgules) et collections Chroma
+    # (catégories et modèles) gardées ouvertes au plus
+    DEFAULT_CATEGORIES = [name.strip() for name in os.getenv(
+        'DEFAULT_CATEGORIES', 'SALLE DE BAINS,REVETEMENT,MENUISERIE EXTERIEURE').split(',') if name.strip()]
+    COLLECTION_HANDLE_CACHE_SIZE = int(os.getenv('COLLECTION_HANDLE_CACHE_SIZE', '64'))
+
+    # Copie compacte des vecteurs des catégories pour la recherche : 'chroma' (désactivée), 'int8' ou 'float16'.
+    # Les QUANTIZED_RESCORE_FACTOR x k meilleurs candidats sont re-scorés en pleine précision.
+    VECTOR_STORE_MODE = os.getenv('VECTOR_STORE_MODE', 'chroma').lower()
+    QUANTIZED_RESCORE_FACTOR = int(os.getenv('QUANTIZED_RESCORE_FACTOR', '10'))
+    # Index lexical BM25 par catégorie. RETRIEVAL_MODE : 'hybrid' (BM25 + vecteurs fusionnés par RRF),
+    # 'vector' ou 'lexical' ; HYBRID_CANDIDATES résultats de chaque recherche entrent dans la fusion
+    LEXICAL_INDEX_ENABLED = os.getenv('LEXICAL_INDEX_ENABLED', 'true').lower() == 'true'
+    LEXICAL_COMPACT_OPS = int(os.getenv('LEXICAL_COMPACT_OPS', '5000'))
+    RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'hybrid').lower()
+    HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '20'))
+    RRF_K = int(os.getenv('RRF_K', '60'))
+
+    # Caches de recherche (taille max, TTL en secondes)
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '2048'))
+    QUERY_EMBEDDING_CACHE_TTL = float(os.getenv('QUERY_EMBEDDING_CACHE_TTL', '3600'))
+    RETRIEVAL_CACHE_SIZE = int(os.getenv('RETRIEVAL_CACHE_SIZE', '1024'))
+    RETRIEVAL_CACHE_TTL = float(os.getenv('RETRIEVAL_CACHE_TTL', '300'))
+
+    # Jobs d'embedding en arrière-plan
+    JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', '2'))
+    JOB_HISTORY_SIZE = int(os.getenv('JOB_HISTORY_SIZE', '200'))
+    JOB_PROGRESS_INTERVAL = float(os.getenv('JOB_PROGRESS_INTERVAL', '2'))
+    EMBED_READ_TIMEOUT = float(os.getenv('EMBED_READ_TIMEOUT', '1800'))
+    # 'remote' : le service de modèles embedde ; 'local' : ré-embedding incrémental dans db/
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'remote')
+
+    # Cache des GET relayés (TTL en secondes par route, 0 = désactivé)
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '256'))
+    RESPONSE_CACHE_TTL_MODELS = float(os.getenv('RESPONSE_CACHE_TTL_MODELS', '5'))
+    RESPONSE_CACHE_TTL_MODEL = float(os.getenv('RESPONSE_CACHE_TTL_MODEL', '10'))
+    # Durée supplémentaire pendant laquelle une entrée expirée est servie pendant son rafraîchissement
+    RESPONSE_CACHE_STALE_TTL = float(os.getenv('RESPONSE_CACHE_STALE_TTL', '60'))
+
+    # Coalescence des appels amont identiques ; fenêtre = durée de partage d'un résultat après l'appel
+    SINGLEFLIGHT_ENABLED = os.getenv('SINGLEFLIGHT_ENABLED', 'true').lower() == 'true'
+    SINGLEFLIGHT_GET_WINDOW_MS = float(os.getenv('SINGLEFLIGHT_GET_WINDOW_MS', '0'))
+    SINGLEFLIGHT_ASK_WINDOW_MS = float(os.getenv('SINGLEFLIGHT_ASK_WINDOW_MS', '2000'))
+
+    # Serveur (gunicorn.conf.py ; `python app.py` reste le mode développement)
+    SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+    SERVER_PORT = int(os.getenv('SERVER_PORT', '5000'))
+    DEBUG = os.getenv('FLASK_DEBUG', 'false').lower() in ('1', 'true')
+    # eventlet ou gevent : workers coopératifs, les appels amont ne bloquent pas le processus
+    WEB_WORKER_CLASS = os.getenv('WEB_WORKER_CLASS', 'eventlet')
+    # Ramené à 1 par gunicorn.conf.py : jobs, caches et écrivains des index sont propres au processus
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', '1'))
+    WEB_WORKER_CONNECTIONS = int(os.getenv('WEB_WORKER_CONNECTIONS', '1000'))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', '120'))
+    # Délai laissé aux requêtes et jobs en cours lors d'un arrêt (SIGTERM)
+    SHUTDOWN_GRACE_SECONDS = float(os.getenv('SHUTDOWN_GRACE_SECONDS', '30'))
+    # File de messages Socket.IO (ex. redis://redis:6379/0), pour émettre depuis d'autres processus
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '') or None
+    SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', '') or None
+    # Sans sessions persistantes au load balancer, plusieurs workers imposent 'websocket' seul
+    SOCKETIO_TRANSPORTS = [t for t in os.getenv('SOCKETIO_TRANSPORTS', 'polling,websocket').split(',') if t]
+
     # Other
-    REQUEST_TIMEOUT = 30
+    # Délai de lecture des appels vers MODEL_SERVICE_URL (secondes)
+    REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', '30'))
     DEFAULT_HEADERS = {'Content-Type': 'application/json'}
 
 # Instance de configuration
@@ -0,0 +1,56 @@
+"""
+Configuration gunicorn (voir Config pour les variables d'environnement).
+
+Chaque worker est coopératif (eventlet ou gevent) et sert jusqu'à
+WEB_WORKER_CONNECTIONS connexions simultanées, Socket.IO compris. Les calculs
+(modèle d'embedding, recherche et écriture Chroma) passent par
+`utils.cooperative.offload` et s'exécutent sur de vrais threads.
+
+Un seul worker est imposé : l'état applicatif est propre au processus. Le
+JobScheduler (un job par modèle), la coalescence des appels amont,
+l'invalidation des caches de réponses et de recherche, le verrou de
+migration de l'historique et les écrivains de Chroma et des index annexes
+(copie quantifiée, index lexical) ne sont pas partagés entre processus, et
+SOCKETIO_MESSAGE_QUEUE ne partage que les événements Socket.IO. Une valeur
+de WEB_WORKERS supérieure à 1 est donc ramenée à 1, avec une erreur au
+démarrage ; passer à l'échelle demande d'abord un état partagé (ex. Redis).
+"""
+import logging
+
+from config import Config
+
+_WORKER_CLASSES = {
+    'eventlet': 'eventlet',
+    # Flask-SocketIO avec gevent : worker gevent-websocket pour les WebSockets
+    'gevent': 'geventwebsocket.gunicorn.workers.GeventWebSocketWorker',
+}
+
+bind = f"{Config.SERVER_HOST}:{Config.SERVER_PORT}"
+worker_class = _WORKER_CLASSES.get(Config.WEB_WORKER_CLASS, Config.WEB_WORKER_CLASS)
+workers = Config.WEB_WORKERS
+if workers > 1:
+    logging.getLogger('gunicorn.error').error(
+        "WEB_WORKERS=%s is not supported: jobs, request coalescing, caches and index writers are per process; "
+        "starting a single worker (see gunicorn.conf.py)", workers
+    )
+    workers = 1
+worker_connections = Config.WEB_WORKER_CONNECTIONS
+timeout = Config.WEB_TIMEOUT
+# SIGTERM : plus de nouvelles connexions, les requêtes en cours ont ce délai pour se terminer
+graceful_timeout = int(Config.SHUTDOWN_GRACE_SECONDS)
+keepalive = 5
+# Chaque worker importe l'application après son propre monkey-patching
+preload_app = False
+loglevel = Config.LOG_LEVEL.lower()
+accesslog = '-'
+
+
+def post_worker_init(worker):
+    # Modèle d'embedding chargé avant la première requête du worker
+    from app import startup
+    startup()
+
+
+def worker_exit(server, worker):
+    from app import shutdown
+    shutdown()
@@ -1,105 +1,778 @@
 import chromadb
+import hashlib
+import heapq
+import json
+import logging
 import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+import numpy as np
 from chromadb.config import Settings
+from config import Config
+from utils.embedding_engine import get_engine
+from utils.embedding_generator import split_text_into_chunks
+from models.lexical_index import LexicalIndex, looks_like_reference
+from models.quantized_store import QuantizedIndex, chunk_document
+from models.registry import ModelRegistry
+from utils.cache import LRUCache
+from utils.cooperative import offload
+from utils.cursor import decode_cursor, encode_cursor
+from utils.metrics import CHROMA_LATENCY, register_cache
+from utils.model_registry import warmup
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+EXCERPT_SIZE = 200
+# Taille des pages lues dans Chroma pour (re)construire une copie quantifiée
+REBUILD_PAGE_SIZE = 1000
+# À incrémenter quand le découpage en chunks change (force le ré-embedding)
+CHUNKER_VERSION = 2
+
+
+def normalize_query(query):
+    return _WHITESPACE.sub(' ', query).strip().lower()
+
+
+def content_hash(text):
+    return hashlib.sha256(_WHITESPACE.sub(' ', text).strip().encode('utf-8')).hexdigest()
+
+
+def chunk_id(doc_id, index):
+    return f"{doc_id}#{index}"
+
+
+def model_collection_name(model_id):
+    return f"model_{model_id}"
+
+
+def category_collection_name(name):
+    """Nom de collection Chroma dérivé d'un nom de catégorie ("SALLE DE BAINS" -> "salle_de_bains")"""
+    folded = ''.join(char for char in unicodedata.normalize('NFKD', name) if not unicodedata.combining(char))
+    slug = re.sub(r'[^a-z0-9]+', '_', folded.lower()).strip('_')[:56]
+    # "model_<id>" et l'ancienne "ai_models" sont réservées aux modèles
+    if len(slug) < 3 or slug.startswith('model_') or slug == 'ai_models':
+        slug = f"cat_{slug}".rstrip('_')
+    return slug
+
+
+def embedding_version():
+    """Identifie le modèle et le découpage utilisés : tout changement impose un ré-embedding"""
+    return f"{Config.EMBEDDING_MODEL_NAME}/{CHUNKER_VERSION}"
+
+
+def file_digest(file):
+    """
+    Hash SHA-256 du contenu d'un fichier de modèle.
+
+    Si taille et date de modification n'ont pas bougé depuis le dernier
+    passage, le hash enregistré est réutilisé sans relire le fichier.
+    """
+    stat = os.stat(file["path"])
+    if file.get("content_hash") and file.get("size") == stat.st_size and file.get("mtime") == stat.st_mtime:
+        return file["content_hash"]
+    digest = hashlib.sha256()
+    with open(file["path"], "rb") as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def excerpt(text, size=EXCERPT_SIZE):
+    return text[:size] + "..." if len(text) > size else text
+
 
 class ChromaDBManager:
-    def __init__(self):
+    def __init__(self, path=None, registry_path=None):
+        path = path or Config.CHROMA_DB_PATH
         # Nouvelle configuration ChromaDB
         self.client = chromadb.PersistentClient(
-            path="db",
+            path=path,
             settings=Settings(
                 allow_reset=True,
                 anonymized_telemetry=False
             )
         )
-        
-        # Collections for documents
-        self.collections = {
-            "SALLE DE BAINS": self.client.get_or_create_collection("salle_de_bains"),
-            "REVETEMENT": self.client.get_or_create_collection("revetement"),
-            "MENUISERIE EXTERIEURE": self.client.get_or_create_collection("menuiserie_exterieure")
-        }
-        
-        # Collection for AI models
-        self.models_collection = self.client.get_or_create_collection("ai_models")
+
+        # Registre des modèles, des catégories et du routage des documents
+        self.registry = ModelRegistry(registry_path or (Config.REGISTRY_DB_PATH if path == Config.CHROMA_DB_PATH
+                                                        else os.path.join(path, 'registry.sqlite3')))
+        self._migrate_models_collection()
+
+        # Catégories définies à l'exécution (nom -> collection) ; les collections
+        # sont ouvertes à la demande et au plus COLLECTION_HANDLE_CACHE_SIZE restent ouvertes
+        self.collection_handles = LRUCache(Config.COLLECTION_HANDLE_CACHE_SIZE)
+        self._categories = {}
+        self._categories_lock = threading.Lock()
+        self._load_categories()
+        self._backfill_routes()
+
+        # Copies quantifiées des catégories (VECTOR_STORE_MODE), ouvertes à la première utilisation
+        self.quantized_path = Config.QUANTIZED_DB_PATH if path == Config.CHROMA_DB_PATH else os.path.join(path, 'quantized')
+        self.quantized = {}
+        self._quantized_lock = threading.Lock()
+        # Index lexicaux BM25 des catégories (LEXICAL_INDEX_ENABLED), ouverts de la même façon
+        self.lexical_path = Config.LEXICAL_DB_PATH if path == Config.CHROMA_DB_PATH else os.path.join(path, 'lexical')
+        self.lexical = {}
+        self._lexical_lock = threading.Lock()
+
+        # Caches de recherche : embeddings des questions, puis résultats top-k
+        self.query_embedding_cache = LRUCache(Config.QUERY_EMBEDDING_CACHE_SIZE, Config.QUERY_EMBEDDING_CACHE_TTL)
+        self.retrieval_cache = LRUCache(Config.RETRIEVAL_CACHE_SIZE, Config.RETRIEVAL_CACHE_TTL)
+        # Incrémentée à chaque invalidation ; lue et comparée sous `_cache_lock`
+        self._cache_generation = 0
+        self._cache_lock = threading.Lock()
+
+        # Pool borné pour interroger les collections en parallèle
+        self.query_executor = ThreadPoolExecutor(max_workers=Config.QUERY_MAX_WORKERS, thread_name_prefix="chroma-query")
+
+        # Chargement anticipé du modèle d'embedding : la première requête ne paie pas le chargement
+        if Config.EMBEDDING_WARMUP:
+            warmup()
     
-    def add_document(self, text, embeddings, category, metadata):
-        collection = self.collections.get(category)
-        if not collection:
-            raise ValueError(f"Catégorie inconnue: {category}")
-        
+    def add_document(self, text, embeddings, category, metadata, chunks=None):
+        """
+        Enregistre un document à raison d'un record par chunk.
+
+        `embeddings` contient un vecteur par chunk (voir `generate_chunk_embeddings`) ;
+        si `chunks` n'est pas fourni, le texte est redécoupé de la même façon.
+        Les ids sont de la forme "<filename>#<index>". Un chunk dont le contenu
+        est déjà présent dans la collection (même hash, quel que soit le fichier)
+        n'est pas réinséré.
+        """
+        if chunks is None:
+            chunks = split_text_into_chunks(text)
         doc_id = metadata["filename"]
-        collection.add(
-            documents=[text],
-            embeddings=[embeddings],
-            metadatas=[metadata],
-            ids=[doc_id]
-        )
-        
+        self.add_chunks(category, doc_id, chunks, embeddings, metadata)
         return doc_id
+
+    def add_chunks(self, category, doc_id, chunks, embeddings, metadata, chunk_metadatas=None, start_index=0):
+        """
+        Ajoute un lot de chunks d'un document en un seul `collection.add`.
+
+        Permet une ingestion par lots : `start_index` est l'index du premier
+        chunk du lot dans le document, `chunk_metadatas` (optionnel) des
+        métadonnées propres à chaque chunk (ex. numéro de page).
+        Renvoie le nombre de chunks réellement insérés.
+        """
+        records = self._chunk_records(doc_id, chunks, embeddings, metadata, chunk_metadatas, start_index)
+        inserted = self.add_records(category, records)
+        logger.info(f"Stored {inserted}/{len(chunks)} chunks of {doc_id} ({len(chunks) - inserted} duplicates skipped)")
+        return inserted
+
+    def add_records(self, category, records):
+        """
+        Ecrit en un seul `collection.add` des chunks pouvant venir de plusieurs
+        documents : `records` est une liste de (doc_id, index, texte, embedding,
+        métadonnées). Même dédoublonnage que `add_chunks` ; renvoie le nombre
+        de chunks insérés.
+
+        Chaque chunk, inséré ou déjà présent, est enregistré comme référence
+        de son document : un texte partagé par plusieurs fichiers n'est
+        supprimé qu'avec le dernier qui le contient (voir `delete_document`).
+        """
+        collection = self.collection(category)
+        # Index annexes ouverts (et reconstruits au besoin) avant l'écriture : le lot n'y entre qu'une fois
+        indexes = [index for index in (self.quantized_index(category), self.lexical_index(category)) if index is not None]
+        self.registry.add_references(collection.name, [
+            (content_hash(chunk), doc_id, index, metadata) for doc_id, index, chunk, _, metadata in records
+        ])
+        inserted = self._write_records(collection, records, on_added=partial(self._index_chunks, indexes))
+        self.invalidate_collection(category)
+        return inserted
+
+    @staticmethod
+    def _chunk_records(doc_id, chunks, embeddings, metadata, chunk_metadatas=None, start_index=0):
+        if len(chunks) != len(embeddings):
+            raise ValueError(f"{len(chunks)} chunks mais {len(embeddings)} embeddings")
+        chunk_metadatas = chunk_metadatas or [{} for _ in chunks]
+        return [
+            (doc_id, start_index + offset, chunk, embedding, {**metadata, **chunk_metadatas[offset]})
+            for offset, (chunk, embedding) in enumerate(zip(chunks, embeddings))
+        ]
+
+    def _add_chunks(self, collection, doc_id, chunks, embeddings, metadata, chunk_metadatas=None, start_index=0,
+                    dedupe_across_documents=True):
+        records = self._chunk_records(doc_id, chunks, embeddings, metadata, chunk_metadatas, start_index)
+        inserted = self._write_records(collection, records, None if dedupe_across_documents else doc_id)
+        logger.info(f"Stored {inserted}/{len(chunks)} chunks of {doc_id} ({len(chunks) - inserted} duplicates skipped)")
+        return inserted
+
+    def _write_records(self, collection, records, dedupe_doc_id=None, on_added=None):
+        """
+        Insère les records (doc_id, index, texte, embedding, métadonnées) dont
+        le contenu n'est pas déjà dans la collection. Avec `dedupe_doc_id`, le
+        dédoublonnage est limité aux chunks de ce document.
+
+        Chroma ignore sans erreur un id déjà présent : ces chunks sont écartés
+        avant l'écriture, pour que `on_added` (index annexes) et le nombre
+        renvoyé ne comptent que les chunks réellement stockés.
+        """
+        hashes = [content_hash(chunk) for _, _, chunk, _, _ in records]
+        seen = set()
+        if hashes:
+            where = {"content_hash": {"$in": list(set(hashes))}}
+            if dedupe_doc_id is not None:
+                where = {"$and": [where, {"doc_id": dedupe_doc_id}]}
+            with CHROMA_LATENCY.time(operation='dedupe_lookup', collection=collection.name):
+                existing = collection.get(where=where, include=["metadatas"])
+            seen.update(m["content_hash"] for m in existing["metadatas"])
+
+        ids, documents, vectors, metadatas = [], [], [], []
+        for (doc_id, index, chunk, embedding, metadata), digest in zip(records, hashes):
+            if digest in seen:
+                continue
+            seen.add(digest)
+            ids.append(chunk_id(doc_id, index))
+            documents.append(chunk)
+            vectors.append(embedding)
+            metadatas.append({
+                **metadata,
+                "doc_id": doc_id,
+                "chunk_index": index,
+                "content_hash": digest,
+                # Extrait précalculé : les listes n'ont jamais à charger le texte complet
+                "excerpt": excerpt(chunk)
+            })
+
+        if ids:
+            with CHROMA_LATENCY.time(operation='id_lookup', collection=collection.name):
+                taken = set(collection.get(ids=ids, include=[])['ids'])
+            if taken:
+                logger.warning(f"Skipped {len(taken)} chunks whose ids already exist in {collection.name}")
+                kept = [i for i, chunk in enumerate(ids) if chunk not in taken]
+                ids, documents, vectors, metadatas = ([values[i] for i in kept]
+                                                      for values in (ids, documents, vectors, metadatas))
+
+        if ids:
+            with CHROMA_LATENCY.time(operation='add', collection=collection.name):
+                offload(
+                    collection.add,
+                    documents=documents,
+                    embeddings=vectors,
+                    metadatas=metadatas,
+                    ids=ids
+                )
+            if on_added:
+                on_added(ids, documents, vectors)
+        return len(ids)
     
-    def get_documents(self, category=None):
-        if category:
-            collections = [self.collections.get(category)]
-        else:
-            collections = self.collections.values()
+    def get_documents(self, category=None, limit=50, offset=0, cursor=None, with_total=False):
+        """
+        Liste paginée des chunks enregistrés (métadonnées + extrait).
+
+        La pagination est faite par Chroma (limit/offset) et seules les
+        métadonnées sont lues. `cursor` (renvoyé dans `next_cursor`) permet de
+        reprendre la lecture là où la page précédente s'est arrêtée, y compris
+        d'une collection à la suivante : seules les collections lues par la
+        page sont ouvertes. `total` (un `count()` par collection) n'est
+        calculé qu'avec `with_total`.
+        """
+        categories = [category] if category else self.categories()
+
+        position = decode_cursor(cursor) if cursor else {"c": 0, "o": offset}
+        index, offset = position["c"], position["o"]
         
         documents = []
-        for collection in collections:
-            items = collection.get()
+        while index < len(categories) and len(documents) < limit:
+            collection = self.collection(categories[index])
+            items = collection.get(limit=limit - len(documents), offset=offset, include=["metadatas"])
+            missing = [doc_id for i, doc_id in enumerate(items['ids']) if "excerpt" not in (items['metadatas'][i] or {})]
+            # Documents enregistrés sans extrait : seul le texte de cette page est chargé
+            texts = {}
+            if missing:
+                legacy = collection.get(ids=missing, include=["documents"])
+                texts = {doc_id: excerpt(text) for doc_id, text in zip(legacy['ids'], legacy['documents'])}
             for i, doc_id in enumerate(items['ids']):
+                metadata = items['metadatas'][i] or {}
                 documents.append({
                     "id": doc_id,
                     "category": collection.name,
-                    "metadata": items['metadatas'][i],
-                    "text": items['documents'][i][:200] + "..."  # Extrait seulement
+                    "metadata": metadata,
+                    "text": metadata.get("excerpt", texts.get(doc_id))
                 })
-        
-        return documents
+            offset += len(items['ids'])
+            if len(documents) < limit:
+                index, offset = index + 1, 0
+
+        next_cursor = encode_cursor({"c": index, "o": offset}) if index < len(categories) else None
+        page = {"documents": documents, "next_cursor": next_cursor}
+        if with_total:
+            page["total"] = sum(self.collection(name).count() for name in categories)
+        return page
     
     def delete_document(self, doc_id):
-        deleted = False
-        for collection in self.collections.values():
-            try:
-                collection.delete(ids=[doc_id])
-                deleted = True
-            except:
-                continue
-        return deleted
+        """
+        Supprime `doc_id` dans la ou les seules collections qui le contiennent
+        (table de routage). Un chunk stocké sous `doc_id` mais encore
+        référencé par un autre document lui est réattribué au lieu d'être supprimé.
+        """
+        categories = self._document_categories(doc_id)
+        for category in categories:
+            collection = self.collection(category)
+            self.registry.delete_references(collection.name, doc_id)
+            owned = collection.get(where={"doc_id": doc_id}, include=["metadatas"])
+            hashes = {(metadata or {}).get("content_hash") for metadata in owned['metadatas']} - {None}
+            heirs = self.registry.reference_heirs(collection.name, hashes)
+            shared = [chunk for chunk, metadata in zip(owned['ids'], owned['metadatas'])
+                      if (metadata or {}).get("content_hash") in heirs]
+            transferred = collection.get(ids=shared, include=["documents", "embeddings", "metadatas"]) \
+                if shared else None
+
+            collection.delete(where={"doc_id": doc_id})
+            # Documents enregistrés avant le découpage par chunk
+            collection.delete(ids=[doc_id])
+            for index in (self.quantized_index(category), self.lexical_index(category)):
+                if index is not None:
+                    index.remove_document(doc_id)
+            if transferred:
+                records = []
+                for text, embedding, metadata in zip(transferred['documents'], transferred['embeddings'],
+                                                      transferred['metadatas']):
+                    heir, index, heir_metadata = heirs[metadata["content_hash"]]
+                    records.append((heir, index, text, embedding, heir_metadata))
+                self.add_records(category, records)
+                logger.info(f"Reassigned {len(records)} shared chunks of {doc_id} in {collection.name}")
+            self.invalidate_collection(category)
+        self.registry.delete_routes(doc_id)
+        return bool(categories)
+
+    def get_document(self, doc_id):
+        """Chunks de `doc_id` (métadonnées + extrait) lus dans sa collection ; None si inconnu"""
+        chunks = []
+        for category in self._document_categories(doc_id):
+            collection = self.collection(category)
+            items = collection.get(where={"doc_id": doc_id}, include=["metadatas"])
+            if not items['ids']:
+                items = collection.get(ids=[doc_id], include=["metadatas"])
+            for chunk, metadata in zip(items['ids'], items['metadatas']):
+                metadata = metadata or {}
+                chunks.append({"id": chunk, "category": collection.name, "metadata": metadata,
+                               "text": metadata.get("excerpt")})
+        chunks.sort(key=lambda chunk: (chunk["category"], chunk["metadata"].get("chunk_index", 0)))
+        return chunks or None
+
+    def _document_categories(self, doc_id):
+        by_collection = {collection: category for category, collection in self._categories.items()}
+        return [by_collection[name] for name in self.registry.routes(doc_id) if name in by_collection]
+
+    # Catégories
+
+    def _load_categories(self):
+        with self._categories_lock:
+            rows = self.registry.list_categories()
+            if not rows and not self.registry.get_meta("categories_seeded"):
+                # Premier démarrage : catégories par défaut (mêmes collections qu'avant leur définition dynamique)
+                for name in Config.DEFAULT_CATEGORIES:
+                    self.registry.create_category(name, category_collection_name(name))
+                self.registry.set_meta("categories_seeded", "1")
+                rows = self.registry.list_categories()
+            self._categories = {row["name"]: row["collection"] for row in rows}
+
+    def categories(self):
+        return list(self._categories)
+
+    def resolve_category(self, name):
+        """Catégorie désignée par son nom ou celui de sa collection, sans tenir compte de la casse"""
+        for _ in range(2):
+            for category, collection in self._categories.items():
+                if name.lower() in (category.lower(), collection.lower()):
+                    return category
+            # Peut avoir été créée par un autre processus depuis le dernier chargement
+            self._load_categories()
+        raise ValueError(f"Catégorie inconnue: {name}")
+
+    def collection(self, category):
+        """Collection Chroma de `category`, ouverte au besoin ; ValueError si la catégorie n'existe pas"""
+        name = self._categories.get(category)
+        if name is None:
+            self._load_categories()
+            name = self._categories.get(category)
+            if name is None:
+                raise ValueError(f"Catégorie inconnue: {category}")
+        return self._handle(name)
+
+    def _handle(self, name):
+        collection = self.collection_handles.get(name)
+        if collection is None:
+            collection = self.client.get_or_create_collection(name)
+            self.collection_handles.set(name, collection)
+        return collection
+
+    def create_category(self, name):
+        name = ' '.join((name or '').split())
+        if not name:
+            raise ValueError("Nom de catégorie manquant")
+        self._load_categories()
+        if any(name.lower() == category.lower() for category in self._categories):
+            raise ValueError(f"Catégorie déjà existante: {name}")
+        base = collection = category_collection_name(name)
+        taken = set(self._categories.values())
+        suffix = 2
+        while collection in taken:
+            collection = f"{base}_{suffix}"
+            suffix += 1
+        category = self.registry.create_category(name, collection)
+        self._load_categories()
+        self._handle(collection)
+        return category
+
+    def delete_category(self, name):
+        """Supprime une catégorie, sa collection et ses index annexes"""
+        try:
+            name = self.resolve_category(name)
+        except ValueError:
+            return False
+        collection = self.registry.delete_category(name)
+        if collection is None:
+            return False
+        self._load_categories()
+        self.collection_handles.invalidate(lambda key: key == collection)
+        try:
+            self.client.delete_collection(collection)
+        except Exception:
+            pass
+        for indexes, root in ((self.quantized, self.quantized_path), (self.lexical, self.lexical_path)):
+            indexes.pop(name, None)
+            shutil.rmtree(os.path.join(root, collection), ignore_errors=True)
+        self.invalidate_collection(name)
+        return True
+
+    def _backfill_routes(self):
+        """Import unique des routes des documents enregistrés avant la table de routage"""
+        if self.registry.get_meta("routes_backfilled"):
+            return
+        for category, name in self._categories.items():
+            collection = self.collection(category)
+            offset = 0
+            while True:
+                page = collection.get(limit=REBUILD_PAGE_SIZE, offset=offset, include=["metadatas"])
+                if not page['ids']:
+                    break
+                self.registry.add_routes(name, {(metadata or {}).get("doc_id", chunk)
+                                                for chunk, metadata in zip(page['ids'], page['metadatas'])})
+                offset += len(page['ids'])
+        self.registry.set_meta("routes_backfilled", "1")
+
+    def invalidate_collection(self, category=None):
+        """
+        Invalide les résultats en cache touchant `category` (toutes si None).
+        A appeler après toute modification d'une collection (ajout, suppression, ré-embedding).
+        """
+        # Une recherche en cours ne pourra pas remettre en cache un résultat périmé
+        with self._cache_lock:
+            self._cache_generation += 1
+        if category is None:
+            return self.retrieval_cache.invalidate()
+        # Les recherches sans catégorie portent aussi sur cette collection
+        return self.retrieval_cache.invalidate(lambda key: key[1] in (category, None))
+
+    def _cache_results(self, cache_key, generation, results):
+        # Sous le verrou : aucune invalidation ne peut survenir entre la comparaison et l'écriture
+        with self._cache_lock:
+            if generation == self._cache_generation:
+                self.retrieval_cache.set(cache_key, results)
+
+    @staticmethod
+    def _index_chunks(indexes, ids, documents, vectors):
+        # Tient les index annexes de la catégorie à jour après un `collection.add`
+        for index in indexes:
+            index.add(ids, vectors if isinstance(index, QuantizedIndex) else documents)
+
+    def quantized_index(self, category):
+        """
+        Copie quantifiée de la collection `category`, ou None si VECTOR_STORE_MODE vaut 'chroma'.
+
+        Chroma reste la source de vérité : à l'ouverture, une copie absente,
+        d'un autre mode ou désynchronisée (nombre de vecteurs différent) est
+        reconstruite page par page depuis la collection.
+        """
+        if Config.VECTOR_STORE_MODE == 'chroma':
+            return None
+        index = self.quantized.get(category)
+        if index is None:
+            with self._quantized_lock:
+                index = self.quantized.get(category)
+                if index is None:
+                    collection = self.collection(category)
+                    index = QuantizedIndex(os.path.join(self.quantized_path, collection.name), Config.VECTOR_STORE_MODE)
+                    if len(index) != collection.count():
+                        self._rebuild_quantized(collection, index)
+                    self.quantized[category] = index
+        return index
+
+    @staticmethod
+    def _rebuild_quantized(collection, index):
+        index.clear()
+        offset = 0
+        while True:
+            page = collection.get(limit=REBUILD_PAGE_SIZE, offset=offset, include=["embeddings"])
+            if not len(page['ids']):
+                break
+            index.add(page['ids'], page['embeddings'])
+            offset += len(page['ids'])
+        logger.info(f"Rebuilt {index.dtype} index of collection {collection.name}: {offset} vectors")
+
+    def lexical_index(self, category):
+        """
+        Index BM25 de la collection `category`, ou None si LEXICAL_INDEX_ENABLED est faux.
+        Reconstruit depuis les textes de Chroma s'il est absent ou désynchronisé.
+        """
+        if not Config.LEXICAL_INDEX_ENABLED:
+            return None
+        index = self.lexical.get(category)
+        if index is None:
+            with self._lexical_lock:
+                index = self.lexical.get(category)
+                if index is None:
+                    collection = self.collection(category)
+                    index = LexicalIndex(os.path.join(self.lexical_path, collection.name), Config.LEXICAL_COMPACT_OPS)
+                    if len(index) != collection.count():
+                        self._rebuild_lexical(collection, index)
+                    self.lexical[category] = index
+        return index
+
+    @staticmethod
+    def _rebuild_lexical(collection, index):
+        index.clear()
+        offset = 0
+        while True:
+            page = collection.get(limit=REBUILD_PAGE_SIZE, offset=offset, include=["documents"])
+            if not len(page['ids']):
+                break
+            index.add(page['ids'], page['documents'])
+            offset += len(page['ids'])
+        logger.info(f"Rebuilt lexical index of collection {collection.name}: {offset} chunks")
+
+    def cache_stats(self):
+        return {
+            "query_embeddings": self.query_embedding_cache.stats(),
+            "retrieval": self.retrieval_cache.stats()
+        }
+
+    def embed_query(self, query):
+        key = (normalize_query(query), Config.EMBEDDING_MODEL_NAME)
+        query_embedding = self.query_embedding_cache.get(key)
+        if query_embedding is None:
+            query_embedding = get_engine().encode([query])[0]
+            self.query_embedding_cache.set(key, query_embedding)
+        return query_embedding
     
-    def query_collection(self, query, category=None):
-        from sentence_transformers import SentenceTransformer
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        query_embedding = model.encode(query).tolist()
-        
+    def query_collection(self, query, category=None, k=None, where=None, timeout=None, mode=None):
+        """
+        Recherche les `k` passages les plus proches de `query`.
+
+        `mode` (RETRIEVAL_MODE par défaut) : 'vector' (Chroma seul),
+        'lexical' (BM25 seul, sans embedding) ou 'hybrid' : les
+        HYBRID_CANDIDATES meilleurs résultats des deux recherches sont
+        fusionnés par reciprocal rank fusion (clé `rrf`). En hybride, une
+        question qui n'est qu'une référence ("REF-1234", "60x120") trouvée
+        telle quelle est résolue par l'index lexical seul. `score` est la
+        distance au vecteur de la question (None sans embedding), `bm25` le
+        score lexical quand le passage a été trouvé par l'index lexical.
+
+        Sans catégorie, toutes les collections sont interrogées en parallèle et
+        les résultats fusionnés en un top-k global. `where` est transmis tel
+        quel à Chroma (filtre sur les métadonnées). Si `timeout` (secondes)
+        expire, les résultats des collections ayant déjà répondu sont renvoyés
+        et ne sont pas mis en cache.
+        Avec VECTOR_STORE_MODE int8/float16, les recherches sans `where`
+        passent par la copie quantifiée (voir `_query_quantized`).
+        """
+        k = k or Config.QUERY_TOP_K
+        timeout = timeout if timeout is not None else Config.QUERY_TIMEOUT
+        mode = mode or Config.RETRIEVAL_MODE
+        if mode not in ('vector', 'lexical', 'hybrid'):
+            raise ValueError(f"Mode de recherche inconnu: {mode}")
+        if not Config.LEXICAL_INDEX_ENABLED:
+            mode = 'vector'
+        where_key = json.dumps(where, sort_keys=True) if where else None
+        cache_key = (normalize_query(query), category, k, where_key, mode)
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            return [dict(result) for result in cached]
+
         if category:
-            collections = [self.collections.get(category)]
+            self.collection(category)
+            categories = [category]
         else:
-            collections = self.collections.values()
-        
-        results = []
-        for collection in collections:
+            categories = self.categories()
+
+        with self._cache_lock:
+            generation = self._cache_generation
+        fetch = k if mode == 'vector' else max(k, Config.HYBRID_CANDIDATES)
+        lexical_hits = []
+        if mode == 'hybrid' and looks_like_reference(query):
+            # Référence trouvée telle quelle : seuls les passages qui la contiennent, sans embedding
+            lexical_hits = self._lexical_search(query, categories, k, parts=False)
+            if lexical_hits:
+                mode = 'lexical'
+        if mode != 'vector' and not lexical_hits:
+            lexical_hits = self._lexical_search(query, categories, fetch)
+        if mode == 'lexical':
+            results = self._fetch_hits(lexical_hits, where)[:k]
+            self._cache_results(cache_key, generation, results)
+            return [dict(result) for result in results]
+
+        query_embedding = self.embed_query(query)
+        futures = {}
+        for name in categories:
+            collection = self.collection(name)
+            # Filtre sur les métadonnées : seul Chroma sait l'appliquer
+            index = None if where else self.quantized_index(name)
+            if index is not None:
+                future = self.query_executor.submit(offload, self._query_quantized, collection, index,
+                                                    query_embedding, fetch)
+            else:
+                future = self.query_executor.submit(offload, self._query_one, collection, query_embedding, fetch,
+                                                    where)
+            futures[future] = collection.name
+        done, pending = wait(futures, timeout=timeout)
+        for future in pending:
+            future.cancel()
+            logger.warning(f"Query on collection {futures[future]} exceeded {timeout}s, returning partial results")
+
+        candidates = []
+        for future in done:
+            try:
+                candidates.extend(future.result())
+            except Exception as e:
+                logger.error(f"Query on collection {futures[future]} failed: {str(e)}")
+                pending.add(future)
+
+        results = heapq.nsmallest(fetch, candidates, key=lambda x: x['score'])
+        if mode == 'hybrid':
+            results = self._fuse(results, lexical_hits, where, query_embedding)
+        results = results[:k]
+        if not pending:
+            self._cache_results(cache_key, generation, results)
+        return [dict(result) for result in results]
+
+    def _lexical_search(self, query, categories, n, parts=True):
+        """(catégorie, id, score BM25) des `n` meilleurs passages, toutes catégories confondues"""
+        hits = []
+        for category in categories:
+            index = self.lexical_index(category)
+            with CHROMA_LATENCY.time(operation='lexical_search', collection=self.collection(category).name):
+                hits.extend((category, chunk, score) for chunk, score in index.search(query, n, parts))
+        return heapq.nlargest(n, hits, key=lambda hit: hit[2])
+
+    def _fetch_hits(self, hits, where=None, query_embedding=None):
+        """
+        Texte et métadonnées des passages trouvés par l'index lexical, dans
+        l'ordre de `hits`, filtrés par `where`. Avec `query_embedding`, la
+        distance est calculée sur les vecteurs enregistrés.
+        """
+        include = ["documents", "metadatas"] + (["embeddings"] if query_embedding is not None else [])
+        by_category = {}
+        for category, chunk, _ in hits:
+            by_category.setdefault(category, []).append(chunk)
+        found = {}
+        for category, ids in by_category.items():
+            collection = self.collection(category)
+            items = collection.get(ids=ids, where=where or None, include=include)
+            for i, doc_id in enumerate(items['ids']):
+                score = None
+                if query_embedding is not None:
+                    vector = np.asarray(items['embeddings'][i], dtype=np.float32)
+                    score = float(((vector - np.asarray(query_embedding, dtype=np.float32)) ** 2).sum())
+                found[doc_id] = {
+                    "id": doc_id,
+                    "category": collection.name,
+                    "score": score,
+                    "metadata": items['metadatas'][i],
+                    "text": items['documents'][i]
+                }
+        return [{**found[chunk], "bm25": bm25} for _, chunk, bm25 in hits if chunk in found]
+
+    def _fuse(self, vector_results, lexical_hits, where, query_embedding):
+        """Reciprocal rank fusion : 1 / (RRF_K + rang) sommé sur les deux classements"""
+        fused = {}
+        for rank, result in enumerate(vector_results, start=1):
+            fused[result["id"]] = {**result, "rrf": 1.0 / (Config.RRF_K + rank)}
+        missing = [hit for hit in lexical_hits if hit[1] not in fused]
+        extra = {result["id"]: result for result in self._fetch_hits(missing, where, query_embedding)}
+        for rank, (_, chunk, bm25) in enumerate(lexical_hits, start=1):
+            result = fused.get(chunk) or extra.get(chunk)
+            if result is None:
+                continue
+            fused[chunk] = {**result, "bm25": bm25, "rrf": result.get("rrf", 0.0) + 1.0 / (Config.RRF_K + rank)}
+        return sorted(fused.values(), key=lambda result: -result["rrf"])
+
+    @staticmethod
+    def _query_one(collection, query_embedding, k, where):
+        with CHROMA_LATENCY.time(operation='query', collection=collection.name):
             query_result = collection.query(
                 query_embeddings=[query_embedding],
-                n_results=3
+                n_results=k,
+                where=where or None
             )
-            
-            for i, doc_id in enumerate(query_result['ids'][0]):
-                results.append({
-                    "id": doc_id,
-                    "category": collection.name,
-                    "score": query_result['distances'][0][i],
-                    "metadata": query_result['metadatas'][0][i],
-                    "text": query_result['documents'][0][i]
-                })
-        
-        return sorted(results, key=lambda x: x['score'])
+        return [
+            {
+                "id": doc_id,
+                "category": collection.name,
+                "score": query_result['distances'][0][i],
+                "metadata": query_result['metadatas'][0][i],
+                "text": query_result['documents'][0][i]
+            }
+            for i, doc_id in enumerate(query_result['ids'][0])
+        ]
     
+    @staticmethod
+    def _query_quantized(collection, index, query_embedding, k):
+        """
+        Recherche sur la copie quantifiée puis re-score exact des
+        QUANTIZED_RESCORE_FACTOR x k meilleurs candidats avec leurs vecteurs
+        float32 lus dans Chroma. Même distance (L2²) et même format que `_query_one`.
+        """
+        with CHROMA_LATENCY.time(operation='quantized_search', collection=collection.name):
+            candidates = index.search(query_embedding, k * Config.QUANTIZED_RESCORE_FACTOR)
+        if not candidates:
+            return []
+        with CHROMA_LATENCY.time(operation='rescore', collection=collection.name):
+            items = collection.get(ids=candidates, include=["embeddings"])
+        if not len(items['ids']):
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        distances = ((np.asarray(items['embeddings'], dtype=np.float32) - query) ** 2).sum(axis=1)
+        scores = {items['ids'][i]: float(distances[i]) for i in np.argsort(distances)[:k]}
+        # Texte et métadonnées des seuls k retenus
+        top = collection.get(ids=list(scores), include=["documents", "metadatas"])
+        results = [
+            {
+                "id": doc_id,
+                "category": collection.name,
+                "score": scores[doc_id],
+                "metadata": top['metadatas'][i],
+                "text": top['documents'][i]
+            }
+            for i, doc_id in enumerate(top['ids'])
+        ]
+        return sorted(results, key=lambda result: result["score"])
+
     # Model management methods
+    def _migrate_models_collection(self):
+        """Importe une seule fois les modèles stockés dans l'ancienne collection Chroma `ai_models`"""
+        if self.registry.count():
+            return
+        try:
+            legacy = self.client.get_collection("ai_models")
+        except Exception:
+            return
+        items = legacy.get(include=["metadatas"])
+        for metadata in items['metadatas']:
+            model_data = {**metadata, "files": json.loads(metadata.get("files") or "[]")}
+            self.registry.create_model(model_data)
+        logger.info(f"Migrated {len(items['ids'])} models from the ai_models collection")
+
     def create_model(self, name, description):
         import uuid
         from datetime import datetime
-        import json
         
         model_id = str(uuid.uuid4())
         model_data = {
@@ -111,90 +784,57 @@ class ChromaDBManager:
             "files": []
         }
         
-        # Create a copy of the data with files serialized for ChromaDB storage
-        chroma_data = {**model_data}
-        chroma_data["files"] = json.dumps(model_data["files"])
-        
-        self.models_collection.add(
-            documents=[str(model_data)],
-            metadatas=[chroma_data],
-            ids=[model_id]
-        )
-        
-        return model_data
+        return self.registry.create_model(model_data)
 
-    def get_models(self, skip=0, limit=10):
-        import json
-        items = self.models_collection.get()
-        models = []
-        
-        for i, model_id in enumerate(items['ids']):
-            model_data = items['metadatas'][i]
-            # Deserialize the files array
-            model_data["files"] = json.loads(model_data["files"])
-            models.append(model_data)
-        
-        total = len(models)
-        models = models[skip:skip + limit]
+    def get_models(self, skip=0, limit=10, cursor=None, fields=None):
+        """
+        Page de modèles lue par index dans le registre.
+
+        `cursor` (renvoyé dans `next_cursor`) reprend après le dernier modèle
+        de la page précédente. `fields` restreint les champs renvoyés ; les
+        fichiers ne sont lus que si `files` est demandé.
+        """
+        after = None
+        if cursor:
+            position = decode_cursor(cursor)
+            after = (position["d"], position["i"])
+        with_files = not fields or "files" in fields
+        models = self.registry.list_models(limit=limit, offset=skip, after=after, with_files=with_files)
+
+        next_cursor = None
+        if len(models) == limit:
+            last = models[-1]
+            next_cursor = encode_cursor({"d": last["dateCreated"], "i": last["id"]})
+        if fields:
+            models = [{key: value for key, value in model.items() if key in fields} for model in models]
         
-        return {"models": models, "total": total}
+        return {"models": models, "total": self.registry.count(), "next_cursor": next_cursor}
 
     def get_model_by_id(self, model_id):
-        import json
-        try:
-            result = self.models_collection.get(ids=[model_id])
-            if result['metadatas']:
-                model_data = result['metadatas'][0]
-                # Deserialize the files array
-                model_data["files"] = json.loads(model_data["files"])
-                return model_data
-            return None
-        except:
-            return None
+        return self.registry.get_model(model_id)
 
     def delete_model(self, model_id):
-        try:
-            model = self.get_model_by_id(model_id)
-            if model:
-                # Delete all model files
-                for file in model['files']:
-                    if os.path.exists(file['path']):
-                        os.remove(file['path'])
-                
-                # Delete model from collection
-                self.models_collection.delete(ids=[model_id])
-                return True
-            return False
-        except:
+        files = self.registry.delete_model(model_id)
+        if files is None:
             return False
+        self.collection_handles.invalidate(lambda key: key == model_collection_name(model_id))
+        try:
+            self.client.delete_collection(model_collection_name(model_id))
+        except Exception:
+            pass
+        # Delete all model files
+        for file in files:
+            if os.path.exists(file['path']):
+                os.remove(file['path'])
+        return True
 
     def update_model(self, model_id, updates):
-        import json
-        try:
-            model = self.get_model_by_id(model_id)
-            if model:
-                updated_model = {**model, **updates}
-                
-                # Create a copy of the data with files serialized for ChromaDB storage
-                chroma_data = {**updated_model}
-                chroma_data["files"] = json.dumps(updated_model["files"])
-                
-                self.models_collection.update(
-                    ids=[model_id],
-                    metadatas=[chroma_data],
-                    documents=[str(updated_model)]
-                )
-                return updated_model
-            return None
-        except:
-            return None
+        return self.registry.update_model(model_id, updates)
 
     def add_model_files(self, model_id, files):
         import uuid
-        import json
         
-        model = self.get_model_by_id(model_id)
-        if not model:
+        if not self.registry.get_model(model_id, with_files=False):
             return None
         
         new_files = []
@@ -203,28 +843,115 @@ class ChromaDBManager:
             file_data = {
                 "id": file_id,
                 "name": file.filename,
-                "path": os.path.join("uploads", f"{file_id}_{file.filename}")
+                "path": os.path.join(Config.UPLOAD_FOLDER, f"{file_id}_{file.filename}")
             }
             file.save(file_data["path"])
             new_files.append(file_data)
         
-        model['files'].extend(new_files)
-        return self.update_model(model_id, {"files": model['files']})
+        if not self.registry.add_files(model_id, new_files):
+            return None
+        return self.registry.get_model(model_id)
 
     def delete_model_file(self, model_id, file_id):
-        model = self.get_model_by_id(model_id)
-        if not model:
+        file_to_delete = self.registry.delete_file(model_id, file_id)
+        if not file_to_delete:
             return False
-            
-        file_to_delete = next((f for f in model['files'] if f['id'] == file_id), None)
-        if file_to_delete:
-            # Remove file from filesystem
-            if os.path.exists(file_to_delete['path']):
-                os.remove(file_to_delete['path'])
-            
-            # Update model files list
-            model['files'] = [f for f in model['files'] if f['id'] != file_id]
-            self.update_model(model_id, {"files": model['files']})
-            return True
-            
-        return False
\ No newline at end of file
+
+        # Remove file from filesystem
+        if os.path.exists(file_to_delete['path']):
+            os.remove(file_to_delete['path'])
+        self.get_model_collection(model_id).delete(where={"doc_id": file_id})
+        return True
+
+    # Model embeddings
+    def get_model_collection(self, model_id):
+        return self._handle(model_collection_name(model_id))
+
+    def add_model_chunks(self, model_id, doc_id, chunks, embeddings, metadata, chunk_metadatas=None, start_index=0):
+        """
+        Equivalent de `add_chunks` pour la collection propre à un modèle.
+        Le dédoublonnage reste limité au fichier : chaque fichier possède ses
+        chunks et peut être ré-embeddé ou retiré indépendamment des autres.
+        """
+        return self._add_chunks(self.get_model_collection(model_id), doc_id, chunks, embeddings,
+                                metadata, chunk_metadatas, start_index, dedupe_across_documents=False)
+
+    def reembed_model(self, model_id, progress=None):
+        """
+        Ré-embedding incrémental des fichiers d'un modèle.
+
+        Chaque fiche fichier garde le hash du contenu et la version d'embedding
+        (modèle + chunker) de son dernier passage. Seuls les fichiers ajoutés
+        ou modifiés sont redécoupés et ré-embeddés (leurs anciens chunks sont
+        supprimés), les chunks des fichiers retirés du modèle sont supprimés,
+        le reste est ignoré. `progress(files_done, files_total, chunks_done)`
+        est appelé après chaque fichier. Renvoie un rapport du travail évité.
+        """
+        from utils.ingestion import ingest_file
+
+        model = self.registry.get_model(model_id)
+        if not model:
+            return None
+        started = time.perf_counter()
+        collection = self.get_model_collection(model_id)
+        version = embedding_version()
+        report = {"files_total": len(model["files"]), "added": 0, "changed": 0, "removed": 0,
+                  "skipped": 0, "failed": 0, "chunks_embedded": 0, "chunks_skipped": 0}
+
+        for done, file in enumerate(model["files"], start=1):
+            digest = file_digest(file)
+            if digest == file.get("content_hash") and file.get("embedding_version") == version:
+                report["skipped"] += 1
+                report["chunks_skipped"] += file.get("chunks", 0)
+            else:
+                previously_embedded = "content_hash" in file
+                collection.delete(where={"doc_id": file["id"]})
+                try:
+                    chunks = ingest_file(
+                        partial(self.add_model_chunks, model_id),
+                        file["path"],
+                        {"filename": file["name"], "doc_id": file["id"]}
+                    )
+                except Exception as e:
+                    logger.error(f"Re-embedding {file['name']} of model {model_id} failed: {str(e)}")
+                    report["failed"] += 1
+                    continue
+                self.registry.update_file(model_id, file["id"], {
+                    "content_hash": digest,
+                    "embedding_version": version,
+                    "size": os.path.getsize(file["path"]),
+                    "mtime": os.path.getmtime(file["path"]),
+                    "chunks": chunks
+                })
+                report["changed" if previously_embedded else "added"] += 1
+                report["chunks_embedded"] += chunks
+            if progress:
+                progress(done, report["files_total"], report["chunks_embedded"])
+
+        # Chunks de fichiers qui ne font plus partie du modèle
+        current_ids = [file["id"] for file in model["files"]]
+        where = {"doc_id": {"$nin": current_ids}} if current_ids else None
+        orphans = collection.get(where=where, include=["metadatas"])
+        removed_docs = {metadata["doc_id"] for metadata in orphans["metadatas"] if metadata}
+        if orphans["ids"]:
+            collection.delete(ids=orphans["ids"])
+        report["removed"] = len(removed_docs)
+        report["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(f"Incremental re-embed of model {model_id}: {report}")
+        return report
+
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def get_db():
+    """Instance partagée du processus (ouverte au premier appel)"""
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                _db = ChromaDBManager()
+                register_cache('query_embeddings', _db.query_embedding_cache.stats)
+                register_cache('retrieval', _db.retrieval_cache.stats)
+    return _db
@@ -0,0 +1,262 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    model_name TEXT,
+    question TEXT NOT NULL,
+    answer TEXT,
+    created_at REAL NOT NULL,
+    -- Clé stable (modèle, question, horodatage) : dédoublonne échanges relayés et entrées importées
+    source_key TEXT
+);
+DROP INDEX IF EXISTS idx_chat_history_model;
+-- Pages lues sur (created_at, seq) : seq, alias du rowid, termine chaque index
+CREATE INDEX IF NOT EXISTS idx_chat_history_model_created ON chat_history (model_name, created_at);
+CREATE INDEX IF NOT EXISTS idx_chat_history_created ON chat_history (created_at);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_history_source ON chat_history (source_key)
+    WHERE source_key IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS history_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def parse_timestamp(value):
+    """Epoch (secondes) ou date ISO 8601 -> epoch ; None si absent, ValueError si illisible"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def format_timestamp(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
+
+
+def entry_key(model_name, question, created_at):
+    """
+    Clé stable d'un échange : modèle, question (espaces normalisés) et
+    horodatage à la seconde. Identique pour un échange relayé localement et
+    le même échange rendu plus tard par l'historique amont.
+    """
+    content = [model_name, ' '.join(question.split()), int(created_at)]
+    return "sha1:" + hashlib.sha1(json.dumps(content).encode('utf-8')).hexdigest()
+
+
+class ChatHistory:
+    """
+    Index local, en ajout seul, de l'historique des questions/réponses (SQLite, WAL).
+
+    Chaque échange relayé par le proxy y est ajouté ; l'historique du service
+    de modèles n'est importé qu'une fois (`backfill`), y compris avec
+    plusieurs processus sur le même fichier. Les pages sont lues par l'index
+    dans l'ordre chronologique (created_at, puis seq à égalité), sans jamais
+    charger l'historique complet.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._backfilled = False
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _entry_from_row(row):
+        return {
+            "id": row["seq"],
+            "model_name": row["model_name"],
+            "question": row["question"],
+            "answer": row["answer"],
+            "created_at": format_timestamp(row["created_at"]),
+            "position": (row["created_at"], row["seq"])
+        }
+
+    def append(self, model_name, question, answer, created_at=None):
+        """Ajoute un échange ; renvoie son seq, ou None si sa clé est déjà présente"""
+        created_at = created_at or time.time()
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO chat_history (model_name, question, answer, created_at, source_key) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (model_name, question, answer, created_at, entry_key(model_name, question, created_at))
+            )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def extend(self, entries):
+        """
+        Ajoute des entrées (model_name, question, answer, created_at, source_key)
+        en une transaction ; une entrée dont la clé est déjà présente est ignorée.
+        Renvoie le nombre d'entrées ajoutées.
+        """
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO chat_history (model_name, question, answer, created_at, source_key) "
+                "VALUES (?, ?, ?, ?, ?)",
+                entries
+            )
+            return conn.total_changes - before
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM chat_history").fetchone()[0]
+
+    def page(self, limit, before=None, after=None, model_name=None, since=None, until=None):
+        """
+        Page d'entrées, de la plus récente à la plus ancienne.
+
+        `before`/`after` sont des positions (created_at, seq) : `before` donne
+        les entrées plus anciennes, `after` les plus récentes (pour le suivi
+        des nouveaux échanges). Renvoie (entrées, has_more) ; has_more indique
+        qu'il reste des entrées au-delà de la page dans le sens de lecture.
+        Chaque entrée porte sa `position`.
+        """
+        conditions, params = [], []
+        if model_name:
+            conditions.append("model_name = ?")
+            params.append(model_name)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(until)
+        if before is not None:
+            conditions.append("(created_at, seq) < (?, ?)")
+            params.extend(before)
+        if after is not None:
+            conditions.append("(created_at, seq) > (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # Avec `after` seul, on lit vers le haut depuis le curseur puis on remet dans l'ordre décroissant
+        order = "ASC" if after is not None and before is None else "DESC"
+        rows = self._connection().execute(
+            f"SELECT * FROM chat_history {where} ORDER BY created_at {order}, seq {order} LIMIT ?", (*params, limit + 1)
+        ).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if order == "ASC":
+            rows.reverse()
+        return [self._entry_from_row(row) for row in rows], has_more
+
+    def get_meta(self, key):
+        row = self._connection().execute("SELECT value FROM history_meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key, value):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO history_meta (key, value) VALUES (?, ?)", (key, value))
+
+    def backfill(self, fetch):
+        """
+        Import unique de l'historique amont. `fetch()` renvoie (réponse, status).
+
+        Le droit d'importer est pris dans une transaction (BEGIN IMMEDIATE) sur
+        history_meta : un seul processus appelle l'amont, les autres continuent
+        sans attendre. Ce droit expire après HISTORY_BACKFILL_RETRY secondes ;
+        un échec est donc retenté au plus tôt après ce délai, et l'import d'un
+        processus arrêté en cours de route est repris. Les entrées sont
+        importées par ordre chronologique et dédoublonnées sur `entry_key`,
+        y compris avec les échanges déjà relayés localement.
+        """
+        if self._backfilled:
+            return
+        now = time.time()
+        with self.transaction() as conn:
+            rows = conn.execute(
+                "SELECT key, value FROM history_meta WHERE key IN ('backfilled', 'backfill_until')"
+            ).fetchall()
+            meta = {row["key"]: row["value"] for row in rows}
+            if "backfilled" in meta:
+                self._backfilled = True
+                return
+            if float(meta.get("backfill_until") or 0) > now:
+                return
+            conn.execute("INSERT OR REPLACE INTO history_meta (key, value) VALUES ('backfill_until', ?)",
+                         (str(now + Config.HISTORY_BACKFILL_RETRY),))
+
+        response, status_code = fetch()
+        if status_code != 200:
+            # Le droit pris reste en place jusqu'à son expiration : aucun processus ne retente avant
+            logger.warning(f"Chat history backfill failed with status {status_code}, will retry")
+            return
+        items = response.get("history", []) if isinstance(response, dict) else response or []
+        entries = []
+        for item in items:
+            if not isinstance(item, dict) or not item.get("question"):
+                continue
+            try:
+                created_at = parse_timestamp(item.get("created_at") or item.get("timestamp"))
+            except ValueError:
+                created_at = None
+            model_name = item.get("model_name") or item.get("model")
+            created_at = created_at or now
+            entries.append((model_name, item["question"], item.get("answer"), created_at,
+                            entry_key(model_name, item["question"], created_at)))
+        entries.sort(key=lambda entry: entry[3])
+        imported = self.extend(entries)
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO history_meta (key, value) VALUES ('backfilled', ?)",
+                         (format_timestamp(now),))
+            conn.execute("DELETE FROM history_meta WHERE key = 'backfill_until'")
+        self._backfilled = True
+        logger.info(f"Imported {imported} chat history entries from the model service")
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history():
+    """Index partagé du processus (ouvert au premier appel)"""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = ChatHistory(Config.HISTORY_DB_PATH)
+    return _history
@@ -0,0 +1,266 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from models.quantized_store import chunk_document
+
+logger = logging.getLogger(__name__)
+
+# Mots, références et cotes : "REF-1234/B", "60x120", "1,5" restent un seul terme
+_TOKEN = re.compile(r"\w+(?:[.,/\-]\w+)*")
+_PART = re.compile(r"\w+")
+_REFERENCE = re.compile(r"^(?=.*\d)[\w.,/\-]+$")
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Part de documents supprimés au-delà de laquelle le segment est réécrit
+COMPACT_RATIO = 0.25
+
+
+def _fold(text):
+    # Minuscules sans accents : "Faïence" et "faience" donnent le même terme
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def looks_like_reference(query):
+    """Question limitée à une à trois références ou cotes (chaque mot contient un chiffre)"""
+    words = query.split()
+    return 0 < len(words) <= 3 and all(_REFERENCE.match(word) for word in words)
+
+
+def tokenize(text, parts=True):
+    """Termes d'un texte ; une référence composée donne aussi ses parties ("ref-12" -> ref-12, ref, 12)"""
+    for match in _TOKEN.finditer(_fold(text)):
+        token = match.group()
+        yield token
+        if parts and not token.isalnum():
+            yield from _PART.findall(token)
+
+
+class LexicalIndex:
+    """
+    Index inversé BM25 des chunks d'une collection, sur disque à côté de la base Chroma.
+
+    `segment.npz` contient les postings compacts (numéros de documents codés
+    en delta + fréquences, compressés), `log.jsonl` les ajouts et
+    suppressions survenus depuis, rejoués au chargement. Le journal est
+    fusionné dans un nouveau segment quand il dépasse `compact_ops`
+    opérations ou que les suppressions dépassent COMPACT_RATIO.
+    """
+
+    def __init__(self, path, compact_ops=5000):
+        self.path = path
+        self.compact_ops = compact_ops
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.ids = []
+        self._lengths = array('I')
+        self._deleted = set()
+        self._rows_by_doc = {}
+        self._total_length = 0
+        # Segment : terme -> (début, fin) dans les tableaux de postings
+        self._segment_terms = {}
+        self._segment_docs = np.empty(0, dtype=np.uint32)
+        self._segment_tfs = np.empty(0, dtype=np.uint16)
+        # Ajouts depuis le segment : terme -> (documents, fréquences)
+        self._recent = {}
+        self._log_ops = 0
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if os.path.exists(self._file("segment.npz")):
+            with np.load(self._file("segment.npz")) as segment:
+                terms = bytes(segment["terms"]).decode("utf-8").split("\n") if segment["terms"].size else []
+                offsets = segment["offsets"]
+                self._segment_terms = {term: (int(offsets[i]), int(offsets[i + 1])) for i, term in enumerate(terms)}
+                self._segment_docs = segment["docs"]
+                self._segment_tfs = segment["tfs"]
+                ids = bytes(segment["ids"]).decode("utf-8")
+                self.ids = ids.split("\n") if ids else []
+                self._lengths = array('I', segment["lengths"].tolist())
+            for row, chunk_id in enumerate(self.ids):
+                self._rows_by_doc.setdefault(chunk_document(chunk_id), []).append(row)
+            self._total_length = sum(self._lengths)
+        if os.path.exists(self._file("log.jsonl")):
+            with open(self._file("log.jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if "add" in entry:
+                        self._apply_add(entry["add"])
+                    else:
+                        self._apply_delete(entry["delete"])
+                    self._log_ops += 1
+
+    def __len__(self):
+        return len(self.ids) - len(self._deleted)
+
+    def nbytes(self):
+        """Taille sur disque (segment + journal)"""
+        return sum(os.path.getsize(self._file(name)) for name in ("segment.npz", "log.jsonl")
+                   if os.path.exists(self._file(name)))
+
+    def clear(self):
+        with self._lock:
+            for name in ("segment.npz", "log.jsonl"):
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+            self._reset()
+
+    def _apply_add(self, documents):
+        for chunk_id, frequencies in documents:
+            row = len(self.ids)
+            self.ids.append(chunk_id)
+            length = sum(frequencies.values())
+            self._lengths.append(length)
+            self._total_length += length
+            self._rows_by_doc.setdefault(chunk_document(chunk_id), []).append(row)
+            for term, tf in frequencies.items():
+                docs, tfs = self._recent.setdefault(term, (array('I'), array('H')))
+                docs.append(row)
+                tfs.append(min(tf, 65535))
+
+    def _apply_delete(self, doc_id):
+        rows = self._rows_by_doc.pop(doc_id, [])
+        for row in rows:
+            self._deleted.add(row)
+            self._total_length -= self._lengths[row]
+        return len(rows)
+
+    def _append_log(self, entry):
+        with open(self._file("log.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._log_ops += 1
+
+    def add(self, ids, texts):
+        documents = [(chunk_id, dict(Counter(tokenize(text)))) for chunk_id, text in zip(ids, texts)]
+        if not documents:
+            return
+        with self._lock:
+            self._append_log({"add": documents})
+            self._apply_add(documents)
+            self._maybe_compact()
+
+    def remove_document(self, doc_id):
+        """Retire tous les chunks d'un document ; renvoie leur nombre"""
+        with self._lock:
+            removed = self._apply_delete(doc_id)
+            if removed:
+                self._append_log({"delete": doc_id})
+                self._maybe_compact()
+            return removed
+
+    def _maybe_compact(self):
+        if self._log_ops >= self.compact_ops or len(self._deleted) > COMPACT_RATIO * max(1, len(self.ids)):
+            self._compact()
+
+    def _postings(self, term):
+        # Appelé sous le verrou : (documents, fréquences) du segment puis des ajouts récents
+        parts_docs, parts_tfs = [], []
+        span = self._segment_terms.get(term)
+        if span:
+            start, end = span
+            parts_docs.append(np.cumsum(self._segment_docs[start:end], dtype=np.uint32))
+            parts_tfs.append(self._segment_tfs[start:end])
+        recent = self._recent.get(term)
+        if recent:
+            # Copies : une vue garderait les tableaux `array` verrouillés contre les ajouts
+            parts_docs.append(np.array(recent[0], dtype=np.uint32))
+            parts_tfs.append(np.array(recent[1], dtype=np.uint16))
+        if not parts_docs:
+            return None, None
+        docs = np.concatenate(parts_docs) if len(parts_docs) > 1 else parts_docs[0]
+        tfs = np.concatenate(parts_tfs) if len(parts_tfs) > 1 else parts_tfs[0]
+        if self._deleted:
+            live = ~np.isin(docs, np.fromiter(self._deleted, dtype=np.uint32, count=len(self._deleted)))
+            docs, tfs = docs[live], tfs[live]
+        return docs, tfs
+
+    def _compact(self):
+        # Appelé sous le verrou : un nouveau segment sans les documents supprimés, journal vidé
+        keep = [row for row in range(len(self.ids)) if row not in self._deleted]
+        renumber = np.full(len(self.ids), -1, dtype=np.int64)
+        renumber[keep] = np.arange(len(keep))
+        terms = sorted(set(self._segment_terms) | set(self._recent))
+        offsets, all_docs, all_tfs = [0], [], []
+        kept_terms = []
+        for term in terms:
+            docs, tfs = self._postings(term)
+            if docs is None or not len(docs):
+                continue
+            docs = renumber[docs].astype(np.uint32)
+            order = np.argsort(docs, kind="stable")
+            docs, tfs = docs[order], tfs[order]
+            all_docs.append(np.diff(docs, prepend=np.uint32(0)).astype(np.uint32))
+            all_tfs.append(tfs.astype(np.uint16))
+            offsets.append(offsets[-1] + len(docs))
+            kept_terms.append(term)
+
+        ids = [self.ids[row] for row in keep]
+        lengths = np.array([self._lengths[row] for row in keep], dtype=np.uint32)
+        docs = np.concatenate(all_docs) if all_docs else np.empty(0, dtype=np.uint32)
+        tfs = np.concatenate(all_tfs) if all_tfs else np.empty(0, dtype=np.uint16)
+        with open(self._file("segment.tmp.npz"), "wb") as f:
+            np.savez_compressed(
+                f,
+                terms=np.frombuffer("\n".join(kept_terms).encode("utf-8"), dtype=np.uint8),
+                offsets=np.array(offsets, dtype=np.int64),
+                docs=docs,
+                tfs=tfs,
+                ids=np.frombuffer("\n".join(ids).encode("utf-8"), dtype=np.uint8),
+                lengths=lengths
+            )
+        os.replace(self._file("segment.tmp.npz"), self._file("segment.npz"))
+        if os.path.exists(self._file("log.jsonl")):
+            os.remove(self._file("log.jsonl"))
+        self._reset()
+        self._load()
+        logger.info(f"Compacted lexical index {self.path}: {len(ids)} chunks, {len(kept_terms)} terms")
+
+    def search(self, query, n, parts=True):
+        """
+        Les `n` chunks les mieux classés par BM25 pour `query` : [(id, score)],
+        du meilleur au moins bon. Avec `parts=False`, une référence composée
+        n'est cherchée qu'entière.
+        """
+        terms = set(tokenize(query, parts))
+        with self._lock:
+            count = len(self)
+            if not terms or not count or n <= 0:
+                return []
+            average_length = self._total_length / count
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+            matched_docs, matched_scores = [], []
+            for term in terms:
+                docs, tfs = self._postings(term)
+                if docs is None or not len(docs):
+                    continue
+                idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                tfs = tfs.astype(np.float32)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[docs] / average_length)
+                matched_docs.append(docs)
+                matched_scores.append(idf * tfs * (BM25_K1 + 1) / (tfs + norm))
+            del lengths
+            ids = self.ids
+        if not matched_docs:
+            return []
+        docs, inverse = np.unique(np.concatenate(matched_docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(matched_scores))
+        top = np.argpartition(-scores, n - 1)[:n] if n < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(ids[docs[i]], float(scores[i])) for i in top]
@@ -0,0 +1,182 @@
+import heapq
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DTYPES = {"int8": np.int8, "float16": np.float16}
+# Lignes déquantifiées à la fois pendant la recherche (borne la mémoire temporaire)
+BLOCK_ROWS = 8192
+# Part de lignes supprimées au-delà de laquelle les fichiers sont réécrits
+COMPACT_RATIO = 0.25
+
+
+def quantize(vectors, dtype):
+    """(vecteurs quantifiés, échelle par vecteur) ; l'échelle vaut 1 en float16"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "float16":
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def chunk_document(chunk_id):
+    # Les ids de chunk sont "doc_id#index" ; les anciens documents ont leur doc_id pour id
+    return chunk_id.rsplit('#', 1)[0] if '#' in chunk_id else chunk_id
+
+
+class QuantizedIndex:
+    """
+    Copie compacte (int8 + échelle par vecteur, ou float16) des vecteurs d'une
+    collection, dans des fichiers mappés en mémoire à côté de la base Chroma.
+
+    `vectors.bin` et `scales.bin` sont en ajout seul, `ids.txt` donne l'id
+    Chroma de chaque ligne ; les suppressions sont notées dans `deleted.txt`
+    et les fichiers sont réécrits quand elles dépassent COMPACT_RATIO. La
+    recherche parcourt la copie par blocs avec NumPy et renvoie des candidats
+    à re-scorer en pleine précision.
+    """
+
+    def __init__(self, path, dtype="int8"):
+        if dtype not in DTYPES:
+            raise ValueError(f"Type de quantification inconnu: {dtype}")
+        self.path = path
+        self.dtype = dtype
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self.dim = None
+        self.ids = []
+        self._rows_by_doc = {}
+        self._deleted = set()
+        self._vectors = None
+        self._scales = None
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        meta_path = self._file("meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["dtype"] != self.dtype:
+            # Changement de mode : la copie sera reconstruite depuis Chroma
+            self.clear()
+            return
+        self.dim = meta["dim"]
+        with open(self._file("ids.txt"), encoding="utf-8") as f:
+            self.ids = [line.rstrip("\n") for line in f]
+        if os.path.exists(self._file("deleted.txt")):
+            with open(self._file("deleted.txt"), encoding="utf-8") as f:
+                self._deleted = {int(line) for line in f if line.strip()}
+        for row, chunk_id in enumerate(self.ids):
+            if row not in self._deleted:
+                self._rows_by_doc.setdefault(chunk_document(chunk_id), []).append(row)
+        self._remap()
+
+    def _remap(self):
+        rows = len(self.ids)
+        if not rows:
+            self._vectors = self._scales = None
+            return
+        self._vectors = np.memmap(self._file("vectors.bin"), dtype=DTYPES[self.dtype], mode="r", shape=(rows, self.dim))
+        self._scales = np.memmap(self._file("scales.bin"), dtype=np.float32, mode="r", shape=(rows,))
+
+    def __len__(self):
+        return len(self.ids) - len(self._deleted)
+
+    def nbytes(self):
+        """Taille sur disque de la copie quantifiée"""
+        return sum(os.path.getsize(self._file(name)) for name in ("vectors.bin", "scales.bin")
+                   if os.path.exists(self._file(name)))
+
+    def clear(self):
+        with self._lock:
+            for name in ("meta.json", "ids.txt", "deleted.txt", "vectors.bin", "scales.bin"):
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+            self.dim = None
+            self.ids, self._rows_by_doc, self._deleted = [], {}, set()
+            self._vectors = self._scales = None
+
+    def add(self, ids, vectors):
+        if not ids:
+            return
+        quantized, scales = quantize(vectors, self.dtype)
+        with self._lock:
+            if self.dim is None:
+                self.dim = quantized.shape[1]
+                with open(self._file("meta.json"), "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim, "dtype": self.dtype}, f)
+            with open(self._file("vectors.bin"), "ab") as f:
+                f.write(quantized.tobytes())
+            with open(self._file("scales.bin"), "ab") as f:
+                f.write(scales.tobytes())
+            with open(self._file("ids.txt"), "a", encoding="utf-8") as f:
+                f.writelines(f"{chunk_id}\n" for chunk_id in ids)
+            start = len(self.ids)
+            self.ids.extend(ids)
+            for offset, chunk_id in enumerate(ids):
+                self._rows_by_doc.setdefault(chunk_document(chunk_id), []).append(start + offset)
+            self._remap()
+
+    def remove_document(self, doc_id):
+        """Retire toutes les lignes d'un document ; renvoie leur nombre"""
+        with self._lock:
+            rows = self._rows_by_doc.pop(doc_id, [])
+            if not rows:
+                return 0
+            self._deleted.update(rows)
+            with open(self._file("deleted.txt"), "a", encoding="utf-8") as f:
+                f.writelines(f"{row}\n" for row in rows)
+            if len(self._deleted) > COMPACT_RATIO * len(self.ids):
+                self._compact()
+            return len(rows)
+
+    def _compact(self):
+        # Appelé sous le verrou : réécrit les fichiers sans les lignes supprimées
+        keep = np.array([row for row in range(len(self.ids)) if row not in self._deleted], dtype=np.int64)
+        vectors = np.array(self._vectors[keep]) if len(keep) else np.empty((0, self.dim), DTYPES[self.dtype])
+        scales = np.array(self._scales[keep]) if len(keep) else np.empty(0, np.float32)
+        ids = [self.ids[row] for row in keep]
+        self._vectors = self._scales = None
+        for name, data in (("vectors.bin", vectors.tobytes()), ("scales.bin", scales.tobytes()),
+                           ("ids.txt", "".join(f"{chunk_id}\n" for chunk_id in ids).encode("utf-8"))):
+            with open(self._file(name + ".tmp"), "wb") as f:
+                f.write(data)
+            os.replace(self._file(name + ".tmp"), self._file(name))
+        if os.path.exists(self._file("deleted.txt")):
+            os.remove(self._file("deleted.txt"))
+        self.ids, self._deleted = ids, set()
+        self._rows_by_doc = {}
+        for row, chunk_id in enumerate(ids):
+            self._rows_by_doc.setdefault(chunk_document(chunk_id), []).append(row)
+        self._remap()
+        logger.info(f"Compacted quantized index {self.path}: {len(ids)} rows")
+
+    def search(self, query, n):
+        """Les `n` ids les plus proches de `query` (distance L2² approchée), du plus proche au plus loin"""
+        with self._lock:
+            vectors, scales, ids, deleted = self._vectors, self._scales, self.ids, set(self._deleted)
+        if vectors is None or n <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        query_norm = float(query @ query)
+        best = []
+        for start in range(0, len(vectors), BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+            block *= np.asarray(scales[start:start + BLOCK_ROWS])[:, None]
+            distances = query_norm - 2.0 * (block @ query) + np.einsum('ij,ij->i', block, block)
+            count = min(n + len(deleted), len(distances))
+            top = np.argpartition(distances, count - 1)[:count] if count < len(distances) else np.arange(len(distances))
+            best.extend((float(distances[i]), start + int(i)) for i in top if start + int(i) not in deleted)
+            best = heapq.nsmallest(n, best)
+        return [ids[row] for _, row in best]
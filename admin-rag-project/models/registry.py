@@ -0,0 +1,349 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    status TEXT,
+    date_created TEXT NOT NULL,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_models_created ON models (date_created, id);
+CREATE INDEX IF NOT EXISTS idx_models_name ON models (name);
+
+CREATE TABLE IF NOT EXISTS model_files (
+    id TEXT PRIMARY KEY,
+    model_id TEXT NOT NULL REFERENCES models (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_model_files_model ON model_files (model_id);
+
+CREATE TABLE IF NOT EXISTS categories (
+    name TEXT PRIMARY KEY,
+    collection TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL
+);
+
+-- Routage doc_id -> collection(s) contenant ses chunks
+CREATE TABLE IF NOT EXISTS document_routes (
+    doc_id TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    PRIMARY KEY (doc_id, collection)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_document_routes_collection ON document_routes (collection);
+
+-- Documents référençant chaque contenu dédoublonné d'une collection : le chunk
+-- n'est stocké qu'une fois dans Chroma, sous le premier document
+CREATE TABLE IF NOT EXISTS chunk_refs (
+    collection TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    metadata TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (collection, content_hash, doc_id, chunk_index)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_chunk_refs_document ON chunk_refs (collection, doc_id);
+
+CREATE TABLE IF NOT EXISTS registry_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Colonnes dédiées ; toute autre clé d'un modèle ou d'un fichier va dans `extra` (JSON)
+MODEL_COLUMNS = {"id": "id", "name": "name", "description": "description", "status": "status", "dateCreated": "date_created"}
+FILE_COLUMNS = {"id": "id", "name": "name", "path": "path"}
+# Paramètres par requête `IN (...)` (limite SQLite : 999 sur les anciennes versions)
+SQL_BATCH_SIZE = 500
+
+
+class ModelRegistry:
+    """
+    Registre des modèles et de leurs fichiers (SQLite en mode WAL).
+
+    Chaque fichier est une ligne indexée par `model_id` : ajouter ou
+    supprimer un fichier est une insertion/suppression unitaire dans une
+    transaction, sans réécrire la liste complète. Une connexion par thread.
+
+    Le registre tient aussi les catégories de documents (nom -> collection
+    Chroma), la table de routage doc_id -> collection, qui évite de
+    chercher un document dans toutes les collections, et les références de
+    chaque chunk dédoublonné (tous les documents qui contiennent ce texte).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _split(data, columns):
+        values = {column: data.get(key) for key, column in columns.items() if key in data}
+        extra = {key: value for key, value in data.items() if key not in columns and key != "files"}
+        return values, extra
+
+    @staticmethod
+    def _model_from_row(row, files=None):
+        model = {key: row[column] for key, column in MODEL_COLUMNS.items()}
+        model.update(json.loads(row["extra"]))
+        if files is not None:
+            model["files"] = files
+        return model
+
+    @staticmethod
+    def _file_from_row(row):
+        return {"id": row["id"], "name": row["name"], "path": row["path"], **json.loads(row["extra"])}
+
+    def _insert_files(self, conn, model_id, files):
+        rows = []
+        for file in files:
+            values, extra = self._split(file, FILE_COLUMNS)
+            rows.append((values["id"], model_id, values["name"], values["path"], json.dumps(extra)))
+        conn.executemany(
+            "INSERT INTO model_files (id, model_id, name, path, extra) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM models").fetchone()[0]
+
+    def create_model(self, model):
+        values, extra = self._split(model, MODEL_COLUMNS)
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO models (id, name, description, status, date_created, extra) VALUES (?, ?, ?, ?, ?, ?)",
+                (values["id"], values["name"], values.get("description"), values.get("status"),
+                 values["date_created"], json.dumps(extra))
+            )
+            self._insert_files(conn, values["id"], model.get("files", []))
+        return model
+
+    def get_files(self, model_id):
+        rows = self._connection().execute(
+            "SELECT * FROM model_files WHERE model_id = ? ORDER BY rowid", (model_id,)
+        ).fetchall()
+        return [self._file_from_row(row) for row in rows]
+
+    def get_file(self, model_id, file_id):
+        row = self._connection().execute(
+            "SELECT * FROM model_files WHERE id = ? AND model_id = ?", (file_id, model_id)
+        ).fetchone()
+        return self._file_from_row(row) if row else None
+
+    def get_model(self, model_id, with_files=True):
+        row = self._connection().execute("SELECT * FROM models WHERE id = ?", (model_id,)).fetchone()
+        if row is None:
+            return None
+        return self._model_from_row(row, self.get_files(model_id) if with_files else None)
+
+    def list_models(self, limit=10, offset=0, after=None, with_files=True):
+        """
+        Page de modèles triés par (dateCreated, id).
+
+        `after` = (dateCreated, id) du dernier modèle de la page précédente :
+        la page suivante est lue par l'index sans parcourir les précédentes.
+        """
+        conn = self._connection()
+        if after:
+            rows = conn.execute(
+                "SELECT * FROM models WHERE (date_created, id) > (?, ?) ORDER BY date_created, id LIMIT ?",
+                (after[0], after[1], limit)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM models ORDER BY date_created, id LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        if not with_files:
+            return [self._model_from_row(row) for row in rows]
+        files = {row["id"]: [] for row in rows}
+        if files:
+            placeholders = ", ".join("?" for _ in files)
+            for file_row in conn.execute(
+                f"SELECT * FROM model_files WHERE model_id IN ({placeholders}) ORDER BY rowid", tuple(files)
+            ):
+                files[file_row["model_id"]].append(self._file_from_row(file_row))
+        return [self._model_from_row(row, files[row["id"]]) for row in rows]
+
+    def update_model(self, model_id, updates):
+        """Met à jour les champs donnés ; une clé `files` remplace la liste de fichiers"""
+        with self.transaction() as conn:
+            row = conn.execute("SELECT * FROM models WHERE id = ?", (model_id,)).fetchone()
+            if row is None:
+                return None
+            values, extra = self._split(updates, MODEL_COLUMNS)
+            values.pop("id", None)
+            if extra:
+                values["extra"] = json.dumps({**json.loads(row["extra"]), **extra})
+            if values:
+                assignments = ", ".join(f"{column} = ?" for column in values)
+                conn.execute(f"UPDATE models SET {assignments} WHERE id = ?", (*values.values(), model_id))
+            if "files" in updates:
+                conn.execute("DELETE FROM model_files WHERE model_id = ?", (model_id,))
+                self._insert_files(conn, model_id, updates["files"])
+        return self.get_model(model_id)
+
+    def delete_model(self, model_id):
+        """Supprime le modèle et ses fichiers ; renvoie les fichiers supprimés (None si absent)"""
+        with self.transaction() as conn:
+            files = self.get_files(model_id)
+            deleted = conn.execute("DELETE FROM models WHERE id = ?", (model_id,)).rowcount
+        return files if deleted else None
+
+    def add_files(self, model_id, files):
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM models WHERE id = ?", (model_id,)).fetchone() is None:
+                return False
+            self._insert_files(conn, model_id, files)
+        return True
+
+    def update_file(self, model_id, file_id, updates):
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM model_files WHERE id = ? AND model_id = ?", (file_id, model_id)
+            ).fetchone()
+            if row is None:
+                return None
+            values, extra = self._split(updates, FILE_COLUMNS)
+            values.pop("id", None)
+            values["extra"] = json.dumps({**json.loads(row["extra"]), **extra})
+            assignments = ", ".join(f"{column} = ?" for column in values)
+            conn.execute(f"UPDATE model_files SET {assignments} WHERE id = ?", (*values.values(), file_id))
+        return self.get_file(model_id, file_id)
+
+    def delete_file(self, model_id, file_id):
+        """Supprime un fichier du registre ; renvoie sa fiche (None si absent)"""
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM model_files WHERE id = ? AND model_id = ?", (file_id, model_id)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM model_files WHERE id = ?", (file_id,))
+        return self._file_from_row(row)
+
+    # Catégories de documents
+
+    def list_categories(self):
+        rows = self._connection().execute("SELECT * FROM categories ORDER BY created_at, name").fetchall()
+        return [dict(row) for row in rows]
+
+    def create_category(self, name, collection):
+        """Enregistre une catégorie ; ValueError si le nom ou la collection est déjà pris"""
+        try:
+            with self.transaction() as conn:
+                conn.execute("INSERT INTO categories (name, collection, created_at) VALUES (?, ?, ?)",
+                             (name, collection, time.time()))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Catégorie déjà existante: {name}")
+        return {"name": name, "collection": collection}
+
+    def delete_category(self, name):
+        """Supprime une catégorie et ses routes ; renvoie le nom de sa collection (None si absente)"""
+        with self.transaction() as conn:
+            row = conn.execute("SELECT collection FROM categories WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM categories WHERE name = ?", (name,))
+            conn.execute("DELETE FROM document_routes WHERE collection = ?", (row["collection"],))
+            conn.execute("DELETE FROM chunk_refs WHERE collection = ?", (row["collection"],))
+        return row["collection"]
+
+    # Routage des documents
+
+    def add_routes(self, collection, doc_ids):
+        with self.transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO document_routes (doc_id, collection) VALUES (?, ?)",
+                             [(doc_id, collection) for doc_id in doc_ids])
+
+    def routes(self, doc_id):
+        """Collections contenant des chunks de `doc_id`"""
+        rows = self._connection().execute(
+            "SELECT collection FROM document_routes WHERE doc_id = ?", (doc_id,)
+        ).fetchall()
+        return [row["collection"] for row in rows]
+
+    def delete_routes(self, doc_id):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM document_routes WHERE doc_id = ?", (doc_id,))
+
+    # Références des chunks dédoublonnés
+
+    def add_references(self, collection, references):
+        """
+        Enregistre les (content_hash, doc_id, index, métadonnées) d'un lot,
+        chunks insérés comme chunks ignorés car déjà présents, et la route de
+        chaque document vers `collection`.
+        """
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO chunk_refs (collection, content_hash, doc_id, chunk_index, metadata) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(collection, digest, doc_id, index, json.dumps(metadata))
+                 for digest, doc_id, index, metadata in references]
+            )
+            conn.executemany("INSERT OR IGNORE INTO document_routes (doc_id, collection) VALUES (?, ?)",
+                             [(doc_id, collection) for doc_id in {reference[1] for reference in references}])
+
+    def delete_references(self, collection, doc_id):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM chunk_refs WHERE collection = ? AND doc_id = ?", (collection, doc_id))
+
+    def reference_heirs(self, collection, hashes):
+        """Pour chaque hash encore référencé : {hash: (doc_id, index, métadonnées)} de sa première référence"""
+        hashes = list(hashes)
+        heirs = {}
+        conn = self._connection()
+        for start in range(0, len(hashes), SQL_BATCH_SIZE):
+            batch = hashes[start:start + SQL_BATCH_SIZE]
+            rows = conn.execute(
+                f"SELECT content_hash, doc_id, chunk_index, metadata FROM chunk_refs "
+                f"WHERE collection = ? AND content_hash IN ({', '.join('?' * len(batch))}) "
+                f"ORDER BY doc_id, chunk_index",
+                [collection, *batch]
+            ).fetchall()
+            for row in rows:
+                heirs.setdefault(row["content_hash"], (row["doc_id"], row["chunk_index"], json.loads(row["metadata"])))
+        return heirs
+
+    def get_meta(self, key):
+        row = self._connection().execute("SELECT value FROM registry_meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key, value):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO registry_meta (key, value) VALUES (?, ?)", (key, value))
@@ -0,0 +1,33 @@
+from typing import Dict, Tuple
+
+
+class CategoryService:
+    """Catégories de documents de la base locale, définies à l'exécution"""
+
+    @staticmethod
+    def list_categories(with_counts: bool = False) -> Tuple[Dict, int]:
+        from models.database import get_db
+
+        db = get_db()
+        categories = db.registry.list_categories()
+        if with_counts:
+            for category in categories:
+                category["chunks"] = db.collection(category["name"]).count()
+        return {"categories": categories}, 200
+
+    @staticmethod
+    def create_category(name: str) -> Tuple[Dict, int]:
+        from models.database import get_db
+
+        try:
+            return get_db().create_category(name), 201
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+    @staticmethod
+    def delete_category(name: str) -> Tuple[Dict, int]:
+        from models.database import get_db
+
+        if not get_db().delete_category(name):
+            return {"error": "Category not found"}, 404
+        return {"message": f"Category {name} deleted"}, 200
@@ -1,43 +1,141 @@
 from config import Config
+import codecs
+import json
 import requests
-from typing import List, Dict, Optional, Any, Tuple
+from typing import List, Dict, Iterator, Optional, Any, Tuple
 import logging
+import threading
 from requests.exceptions import RequestException
+from services.http_client import get_async_http_client, get_http_client
+from models.history import get_history
+from services.response_cache import MODEL_DETAILS, MODEL_LIST, model_tag, response_cache
+from services.singleflight import SingleFlight
+from services.streaming import MultipartStream, RelayedMultipartStream, iter_sse_events
+from utils.cursor import decode_cursor, encode_cursor
+from utils.metrics import observe_upstream
 
 # Utilisez la configuration
 settings = Config()
 logger = logging.getLogger(__name__)
 
+# Coalescence des GET identiques et des questions identiques en cours ; les erreurs amont ne sont pas gardées
+_upstream_ok = lambda result: result[1] < 500
+upstream_gets = SingleFlight('upstream_get', settings.SINGLEFLIGHT_GET_WINDOW_MS / 1000.0, keep=_upstream_ok)
+asks = SingleFlight('ask', settings.SINGLEFLIGHT_ASK_WINDOW_MS / 1000.0, keep=_upstream_ok)
+
+
+def _truncate(value):
+    text = str(value)
+    limit = settings.LOG_PAYLOAD_MAX_CHARS
+    return text if len(text) <= limit else f"{text[:limit]}... ({len(text)} chars)"
+
+
 class ExternalService:
     @staticmethod
-    def forward_request(url, method='POST', files=None, data=None):
-        import requests
+    def forward_request(url, method='POST', files=None, data=None, timeout=None):
         method = method.upper()
-        logger.info(f"Sending {method} request to {url} with data: {data}, files: {[f[1][0] for f in files] if files else None}")
+        if method not in ('POST', 'GET', 'DELETE'):
+            return {"error": "Unsupported HTTP method"}, 400
+        if method == 'GET' and settings.SINGLEFLIGHT_ENABLED:
+            key = (url, json.dumps(data, sort_keys=True, default=str))
+            return upstream_gets.do(key, lambda: ExternalService._send(url, method, files, data, timeout))
+        return ExternalService._send(url, method, files, data, timeout)
+
+    @staticmethod
+    def _send(url, method, files=None, data=None, timeout=None):
+        logger.info(f"Sending {method} request to {url}")
+        if settings.LOG_UPSTREAM_PAYLOADS:
+            logger.info(f"Request payload: data={_truncate(data)}, files={[f[1][0] for f in files] if files else None}")
+        client = get_http_client()
         try:
-            if method == 'POST':
-                if files:
-                    # Pour les requêtes avec fichiers, utiliser multipart/form-data
-                    response = requests.post(url, files=files, data=data)
+            with observe_upstream(method, url) as outcome:
+                if method == 'POST':
+                    if files:
+                        # Pour les requêtes avec fichiers, utiliser multipart/form-data
+                        response = client.post(url, files=files, data=data, timeout=timeout)
+                    else:
+                        # Pour les requêtes JSON, utiliser json=data
+                        response = client.post(url, json=data, timeout=timeout)
+                elif method == 'GET':
+                    response = client.get(url, params=data, timeout=timeout)
                 else:
-                    # Pour les requêtes JSON, utiliser json=data
-                    response = requests.post(url, json=data)
-            elif method == 'GET':
-                response = requests.get(url, params=data)
-            elif method == 'DELETE':
-                response = requests.delete(url, data=data)
-            else:
-                return {"error": "Unsupported HTTP method"}, 400
-            
-            logger.info(f"Received response: {response.status_code} - {response.text}")
-            try:
-                return response.json(), response.status_code
-            except ValueError:
-                logger.error(f"Invalid JSON response from {url}: {response.text}")
-                return {"error": "Invalid JSON response"}, response.status_code
+                    response = client.delete(url, data=data, timeout=timeout)
+                outcome["status"] = response.status_code
+
+            return ExternalService._parse_response(url, response.status_code, response.text, response.json)
+        except RequestException as e:
+            logger.error(f"Request failed: {str(e)}")
+            return {"error": f"Request failed: {str(e)}"}, 500
+
+    @staticmethod
+    def forward_stream(url, body, timeout=None):
+        """Envoie un corps multipart produit à la volée (Transfer-Encoding: chunked)"""
+        logger.info(f"Streaming POST request to {url}")
+        try:
+            with observe_upstream('POST', url) as outcome:
+                response = get_http_client().post(
+                    url,
+                    data=iter(body),
+                    headers={'Content-Type': body.content_type},
+                    timeout=timeout
+                )
+                outcome["status"] = response.status_code
+            return ExternalService._parse_response(url, response.status_code, response.text, response.json)
         except RequestException as e:
             logger.error(f"Request failed: {str(e)}")
             return {"error": f"Request failed: {str(e)}"}, 500
+
+    @staticmethod
+    def open_stream(url, method='GET', headers=None, data=None, timeout=None):
+        """Ouvre une réponse amont en streaming ; l'appelant doit la fermer"""
+        method = method.upper()
+        logger.info(f"Opening streamed {method} request to {url} with headers: {headers}")
+        with observe_upstream(method, url) as outcome:
+            if method == 'POST':
+                response = get_http_client().post(url, json=data, headers=headers, stream=True, timeout=timeout)
+            else:
+                response = get_http_client().get(url, params=data, headers=headers, stream=True, timeout=timeout)
+            outcome["status"] = response.status_code
+        return response
+
+    @staticmethod
+    async def forward_request_async(url, method='POST', data=None, timeout=None):
+        """Équivalent asyncio de forward_request (sans fichiers)"""
+        import httpx
+
+        method = method.upper()
+        if method not in ('POST', 'GET', 'DELETE'):
+            return {"error": "Unsupported HTTP method"}, 400
+        logger.info(f"Sending async {method} request to {url}")
+        if settings.LOG_UPSTREAM_PAYLOADS:
+            logger.info(f"Request payload: data={_truncate(data)}")
+        client = get_async_http_client()
+        kwargs = {'timeout': timeout} if timeout else {}
+        try:
+            with observe_upstream(method, url) as outcome:
+                if method == 'POST':
+                    response = await client.post(url, json=data, **kwargs)
+                elif method == 'GET':
+                    response = await client.get(url, params=data, **kwargs)
+                else:
+                    response = await client.request('DELETE', url, data=data, **kwargs)
+                outcome["status"] = response.status_code
+
+            return ExternalService._parse_response(url, response.status_code, response.text, response.json)
+        except httpx.HTTPError as e:
+            logger.error(f"Request failed: {str(e)}")
+            return {"error": f"Request failed: {str(e)}"}, 500
+
+    @staticmethod
+    def _parse_response(url, status_code, text, json_loader):
+        logger.info(f"Received response from {url}: {status_code}")
+        if settings.LOG_UPSTREAM_PAYLOADS:
+            logger.info(f"Response payload: {_truncate(text)}")
+        try:
+            return json_loader(), status_code
+        except ValueError:
+            logger.error(f"Invalid JSON response from {url}: {_truncate(text)}")
+            return {"error": "Invalid JSON response"}, status_code
     
 '''
 class DocumentService:
@@ -93,49 +191,88 @@ class ModelService:
     @staticmethod
     def create_model(name: str, description: Optional[str] = None) -> Tuple[Dict, int]:
         logger.info(f"Creating model with name: {name}, description: {description}")
-        return ExternalService.forward_request(
+        result = ExternalService.forward_request(
             f"{settings.MODEL_SERVICE_URL}/models",
             method='POST',
             data={'name': name, 'description': description}
         )
+        response_cache.invalidate(MODEL_LIST)
+        return result
         
         
     @staticmethod
     def list_models() -> Tuple[Dict, int]:
-        """List all available models"""
-        result = ExternalService.forward_request(
-            f"{settings.MODEL_SERVICE_URL}/models",
-            method='GET'
+        """
+        List all available models (served from the response cache).
+
+        The cache coalesces its own misses per invalidation generation, so the
+        fetch bypasses the upstream GET single-flight, whose shared result may
+        predate a mutation.
+        """
+        return response_cache.get(
+            'list_models', (),
+            lambda: ExternalService._send(f"{settings.MODEL_SERVICE_URL}/models", 'GET'),
+            tags=(MODEL_LIST,)
         )
-        return result
         
     @staticmethod
     def get_model(model_id: str) -> Tuple[Dict, int]:
-        """List files for a specific model"""
-        return ExternalService.forward_request(
-            f"{settings.MODEL_SERVICE_URL}/models/{model_id}",
-            method='GET'
+        """List files for a specific model (served from the response cache)"""
+        return response_cache.get(
+            'get_model', (model_id,),
+            lambda: ExternalService._send(f"{settings.MODEL_SERVICE_URL}/models/{model_id}", 'GET'),
+            tags=(MODEL_DETAILS, model_tag(model_id))
         )
     
+    @staticmethod
+    def resolve_model_id(model_key: str) -> Tuple[Optional[str], int]:
+        """
+        Id of the model designated by its id or its name, from the cached model
+        list: (id, 200), (None, 404) if unknown, (None, status) if the list failed.
+        """
+        response, status_code = ModelService.list_models()
+        if status_code != 200:
+            return None, status_code
+        models = response.get('models', []) if isinstance(response, dict) else response
+        models = [model for model in models or [] if isinstance(model, dict)]
+        for field in ('id', 'name'):
+            for model in models:
+                if model.get(field) == model_key and model.get('id'):
+                    return str(model['id']), 200
+        return None, 404
+
     @staticmethod
     def delete_model(model_id: str) -> Tuple[Dict, int]:
         """Delete a model and its associated files"""
-        return ExternalService.forward_request(
+        result = ExternalService.forward_request(
             f"{settings.MODEL_SERVICE_URL}/models/{model_id}",
             method='DELETE'
         )
+        response_cache.invalidate(MODEL_LIST, model_tag(model_id))
+        return result
   
 
     @staticmethod
     def upload_file(model_name: str, files: List[Any]) -> Tuple[Dict, int]:
         files_list = [(f'files[]', (f.filename, f.stream, f.content_type)) for f in files]
         logger.info(f"Sending {len(files_list)} files to external service: {[f[1][0] for f in files_list]}")
-        return ExternalService.forward_request(
+        result = ExternalService.forward_stream(
             f"{settings.MODEL_SERVICE_URL}/upload",
-            method='POST',
-            files=files_list,
-            data={'model_name': model_name}
+            MultipartStream(fields={'model_name': model_name}, files=files_list)
         )
+        # Le modèle est désigné par son nom : toutes les fiches détaillées sont concernées
+        response_cache.invalidate(MODEL_LIST, MODEL_DETAILS)
+        return result
+
+    @staticmethod
+    def upload_stream(stream: Any, content_type: str, file_filter=None) -> Tuple[Dict, int]:
+        """Relay a raw multipart upload body to the model service without buffering"""
+        body = RelayedMultipartStream(stream, content_type, file_filter=file_filter)
+        # Mêmes refus (400) que l'envoi en tampon, avant d'ouvrir la requête amont
+        body.validate(required_fields=('model_name',), require_file=True)
+        result = ExternalService.forward_stream(f"{settings.MODEL_SERVICE_URL}/upload", body)
+        response_cache.invalidate(MODEL_LIST, MODEL_DETAILS)
+        return result
         
 '''         
     @staticmethod
@@ -190,49 +327,111 @@ class FileService:
     @staticmethod
     def update_model_files(model_id: str, files: List[Any]) -> Tuple[Dict, int]:
         """Update files for a specific model"""
-        files_dict = {f'files[]': (f.filename, f.stream, f.content_type) for f in files}
-        return ExternalService.forward_request(
+        files_list = [('files[]', (f.filename, f.stream, f.content_type)) for f in files]
+        result = ExternalService.forward_stream(
             f"{settings.MODEL_SERVICE_URL}/update-model",
-            method='POST',
-            files=files_dict,
-            data={'model_id': model_id}
+            MultipartStream(fields={'model_id': model_id}, files=files_list)
         )
+        response_cache.invalidate(MODEL_LIST, model_tag(model_id))
+        return result
 
     @staticmethod
-    def get_model_file(model_id: str, filename: str) -> Tuple[Any, int]:
-        """Get a specific model file"""
-        return ExternalService.forward_request(
+    def update_model_files_stream(model_id: str, stream: Any, content_type: str, file_filter=None) -> Tuple[Dict, int]:
+        """Relay a raw multipart body of model files without buffering"""
+        body = RelayedMultipartStream(stream, content_type, fields={'model_id': model_id}, file_filter=file_filter)
+        body.validate(require_file=True)
+        result = ExternalService.forward_stream(f"{settings.MODEL_SERVICE_URL}/update-model", body)
+        response_cache.invalidate(MODEL_LIST, model_tag(model_id))
+        return result
+
+    @staticmethod
+    def get_model_file(model_id: str, filename: str, range_header: Optional[str] = None) -> requests.Response:
+        """Open a streamed download of a specific model file (Range is forwarded)"""
+        headers = {'Range': range_header} if range_header else None
+        return ExternalService.open_stream(
             f"{settings.MODEL_SERVICE_URL}/models/{model_id}/files/{filename}",
-            method='GET',
-            return_json=False
+            headers=headers
         )
 
     @staticmethod
     def delete_model_file(model_id: str, filename: str) -> Tuple[Dict, int]:
         """Delete a specific model file"""
-        return ExternalService.forward_request(
+        result = ExternalService.forward_request(
             f"{settings.MODEL_SERVICE_URL}/models/{model_id}/files/{filename}",
             method='DELETE'
         )
+        response_cache.invalidate(MODEL_LIST, model_tag(model_id))
+        return result
 
 class EmbeddingService:
+    # Champs de l'état amont relayés comme avancement d'un job
+    PROGRESS_FIELDS = ('files_done', 'files_total', 'chunks_done', 'chunks_total')
+
+    @staticmethod
+    def _timeout():
+        # L'embedding d'un modèle peut durer bien plus que le read timeout par défaut
+        return (settings.HTTP_CONNECT_TIMEOUT, settings.EMBED_READ_TIMEOUT)
+
     @staticmethod
     def embed_documents(model_name: str) -> Tuple[Dict, int]:
-        
-        return ExternalService.forward_request(
+        # Statut modifié dès le début de l'embedding, puis à la fin
+        response_cache.invalidate(MODEL_LIST, MODEL_DETAILS)
+        result = ExternalService.forward_request(
             f"{settings.MODEL_SERVICE_URL}/embed",
             method='POST',
-            data={'model_name': model_name}
-        )   
+            data={'model_name': model_name},
+            timeout=EmbeddingService._timeout()
+        )
+        response_cache.invalidate(MODEL_LIST, MODEL_DETAILS)
+        return result
     
     @staticmethod
     def reembed_model(model_id: str) -> Tuple[Dict, int]:
         """Re-embed all documents for a model"""
-        return ExternalService.forward_request(
+        response_cache.invalidate(MODEL_LIST, model_tag(model_id))
+        result = ExternalService.forward_request(
             f"{settings.MODEL_SERVICE_URL}/reembed",
             method='POST',
-            data={'model_id': model_id}
+            data={'model_id': model_id},
+            timeout=EmbeddingService._timeout()
         )
+        response_cache.invalidate(MODEL_LIST, model_tag(model_id))
+        return result
+
+    @staticmethod
+    def embed_documents_job(context, model_id: str, model_name: str) -> Dict:
+        """Job body for embed_documents (see services.jobs); the upstream /embed takes the name"""
+        return EmbeddingService._run_job(context, model_id, lambda: EmbeddingService.embed_documents(model_name))
+
+    @staticmethod
+    def reembed_model_job(context, model_id: str) -> Dict:
+        """Job body for reembed_model (see services.jobs)"""
+        return EmbeddingService._run_job(context, model_id, lambda: EmbeddingService.reembed_model(model_id))
+
+    @staticmethod
+    def _run_job(context, model_id: str, call) -> Dict:
+        """
+        Runs the blocking upstream call while a side thread polls the embedding
+        status (served by model id) and publishes it as job progress.
+        """
+        stop = threading.Event()
+
+        def poll_status():
+            while not stop.wait(settings.JOB_PROGRESS_INTERVAL) and not context.cancelled:
+                status, status_code = EmbeddingService.get_embedding_status(model_id)
+                if status_code == 200 and isinstance(status, dict):
+                    fields = {name: status[name] for name in EmbeddingService.PROGRESS_FIELDS if name in status}
+                    context.report(upstream_status=status.get('status'), **fields)
+
+        poller = threading.Thread(target=poll_status, name=f"embedding-status-{model_id}", daemon=True)
+        poller.start()
+        try:
+            response, status_code = call()
+        finally:
+            stop.set()
+        if status_code >= 400:
+            raise RuntimeError(response.get('error', f"Upstream returned {status_code}"))
+        return response
     
     @staticmethod
     def get_embedding_status(model_id: str) -> Tuple[Dict, int]:
@@ -245,20 +444,128 @@ class EmbeddingService:
 class ChatService:
     @staticmethod
     def ask_question(model_name: str, question: str) -> Tuple[Dict, int]:
-        """Ask a question to a specific model"""
-        return ExternalService.forward_request(
+        """Ask a question to a specific model (identical concurrent questions share one call)"""
+        def ask():
+            history = ChatService._history()
+            response, status_code = ExternalService.forward_request(
+                f"{settings.MODEL_SERVICE_URL}/ask",
+                method='POST',
+                data={
+                    'model_name': model_name,
+                    'question': question
+                }
+            )
+            if status_code == 200:
+                answer = response.get('answer') if isinstance(response, dict) else response
+                history.append(model_name, question, answer if isinstance(answer, str) else json.dumps(answer))
+            return response, status_code
+
+        if not settings.SINGLEFLIGHT_ENABLED:
+            return ask()
+        return asks.do((model_name, ' '.join(question.split()).lower()), ask)
+
+    @staticmethod
+    def open_answer_stream(model_name: str, question: str) -> requests.Response:
+        """Ask a question and keep the upstream answer open for token streaming"""
+        ChatService._history()
+        return ExternalService.open_stream(
             f"{settings.MODEL_SERVICE_URL}/ask",
             method='POST',
+            headers={'Accept': 'text/event-stream, text/plain, application/json'},
             data={
                 'model_name': model_name,
-                'question': question
+                'question': question,
+                'stream': True
             }
         )
 
     @staticmethod
-    def get_chat_history() -> Tuple[Dict, int]:
-        """Get complete chat history"""
-        return ExternalService.forward_request(
-            f"{settings.MODEL_SERVICE_URL}/history",
-            method='GET'
-        )
\ No newline at end of file
+    def iter_answer(upstream: requests.Response, model_name: Optional[str] = None,
+                    question: Optional[str] = None) -> Iterator[str]:
+        """
+        Yield answer text as upstream chunks arrive, then close the response.
+        An SSE upstream is parsed and only its message payloads are yielded; a
+        JSON upstream yields its `answer` at once. With model_name and question,
+        the text of a fully received answer is added to the history.
+        """
+        parts = []
+        try:
+            for text in ChatService._answer_parts(upstream):
+                parts.append(text)
+                yield text
+        finally:
+            upstream.close()
+        if question:
+            get_history().append(model_name, question, ''.join(parts))
+
+    @staticmethod
+    def _answer_parts(upstream: requests.Response) -> Iterator[str]:
+        content_type = upstream.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+        def texts():
+            # chunk_size=None : chaque bloc est rendu dès sa réception, sans attendre de tampon plein
+            for chunk in upstream.iter_content(chunk_size=None):
+                text = decoder.decode(chunk)
+                if text:
+                    yield text
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+
+        if content_type == 'text/event-stream':
+            for event, data in iter_sse_events(texts()):
+                if event == 'error':
+                    raise RuntimeError(f"Upstream error: {data}")
+                if event in ('done', 'end') or data == '[DONE]':
+                    break
+                if event in (None, 'message', 'chunk', 'token') and data:
+                    yield data
+        elif content_type == 'application/json':
+            body = json.loads(''.join(texts()) or 'null')
+            answer = body.get('answer') if isinstance(body, dict) else body
+            if answer is not None:
+                yield answer if isinstance(answer, str) else json.dumps(answer)
+        else:
+            yield from texts()
+
+    @staticmethod
+    def _history():
+        """Local history index, backfilled once from the model service"""
+        history = get_history()
+        history.backfill(lambda: ExternalService.forward_request(f"{settings.MODEL_SERVICE_URL}/history", method='GET'))
+        return history
+
+    @staticmethod
+    def _cursor_position(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+        if not cursor:
+            return None
+        position = decode_cursor(cursor)
+        if not isinstance(position, dict) or not isinstance(position.get("s"), int) \
+                or not isinstance(position.get("t"), (int, float)) or isinstance(position.get("t"), bool):
+            raise ValueError(f"Curseur invalide: {cursor}")
+        return position["t"], position["s"]
+
+    @staticmethod
+    def get_chat_history(limit: Optional[int] = None, before: Optional[str] = None, after: Optional[str] = None,
+                         model_name: Optional[str] = None, since: Optional[float] = None,
+                         until: Optional[float] = None) -> Tuple[Dict, int]:
+        """
+        Get a page of chat history from the local index, newest first.
+        `next_cursor` (use as `before`) reads older entries, `prev_cursor`
+        (use as `after`) newer ones. Raises ValueError on an invalid cursor.
+        """
+        limit = max(1, min(limit or settings.HISTORY_PAGE_SIZE, settings.HISTORY_MAX_PAGE_SIZE))
+        before_position = ChatService._cursor_position(before)
+        after_position = ChatService._cursor_position(after)
+        entries, has_more = ChatService._history().page(limit, before_position, after_position,
+                                                        model_name, since, until)
+        positions = [entry.pop("position") for entry in entries]
+
+        reading_newer = after_position is not None and before_position is None
+        older_exist = has_more if not reading_newer else bool(entries)
+        next_cursor = encode_cursor({"t": positions[-1][0], "s": positions[-1][1]}) \
+            if entries and older_exist else None
+        prev_cursor = encode_cursor({"t": positions[0][0], "s": positions[0][1]}) if entries else after
+        return {"history": entries, "next_cursor": next_cursor, "prev_cursor": prev_cursor,
+                "has_more": has_more}, 200
\ No newline at end of file
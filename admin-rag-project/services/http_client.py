@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Seules les méthodes idempotentes sont rejouées automatiquement
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+RETRY_STATUS_CODES = (502, 503, 504)
+
+
+def default_timeout() -> Tuple[float, float]:
+    """(connect, read) timeout appliqué à chaque appel sortant"""
+    return (Config.HTTP_CONNECT_TIMEOUT, Config.REQUEST_TIMEOUT)
+
+
+class HttpClient:
+    """
+    Client HTTP partagé avec pool de connexions keep-alive.
+
+    Une seule `requests.Session` est réutilisée par tous les threads : le pool
+    urllib3 sous-jacent est thread-safe, et les connexions vers
+    MODEL_SERVICE_URL restent ouvertes entre deux requêtes.
+    """
+
+    def __init__(self, pool_size=None, pool_connections=None, max_retries=None, backoff_factor=None):
+        self.pool_size = pool_size or Config.HTTP_POOL_SIZE
+        self.pool_connections = pool_connections or Config.HTTP_POOL_CONNECTIONS
+        retries = Retry(
+            total=Config.HTTP_MAX_RETRIES if max_retries is None else max_retries,
+            backoff_factor=Config.HTTP_BACKOFF_FACTOR if backoff_factor is None else backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_size,
+            max_retries=retries,
+            pool_block=True
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, url, timeout=None, **kwargs) -> requests.Response:
+        return self.session.request(method.upper(), url, timeout=timeout or default_timeout(), **kwargs)
+
+    def get(self, url, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def delete(self, url, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncHttpClient:
+    """
+    Variante asyncio du client (httpx.AsyncClient).
+
+    Le pool est lié à la boucle d'événements qui l'a créé : utiliser une
+    instance par boucle (voir `get_async_http_client`).
+    """
+
+    def __init__(self, pool_size=None, max_retries=None, backoff_factor=None):
+        import httpx
+
+        self._httpx = httpx
+        self.max_retries = Config.HTTP_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_factor = Config.HTTP_BACKOFF_FACTOR if backoff_factor is None else backoff_factor
+        pool_size = pool_size or Config.HTTP_POOL_SIZE
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(Config.REQUEST_TIMEOUT, connect=Config.HTTP_CONNECT_TIMEOUT)
+        )
+
+    async def request(self, method, url, **kwargs):
+        method = method.upper()
+        attempts = self.max_retries + 1 if method in IDEMPOTENT_METHODS else 1
+        for attempt in range(attempts):
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == attempts - 1:
+                    return response
+            except self._httpx.TransportError:
+                if attempt == attempts - 1:
+                    raise
+            delay = self.backoff_factor * (2 ** attempt)
+            logger.warning(f"Retrying {method} {url} in {delay:.2f}s (attempt {attempt + 2}/{attempts})")
+            await asyncio.sleep(delay)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request('DELETE', url, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_http_client() -> HttpClient:
+    """Retourne le client partagé du processus (créé à la première utilisation)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
+
+
+def get_async_http_client() -> AsyncHttpClient:
+    """Retourne le client asynchrone associé à la boucle courante"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncHttpClient()
+    return client
@@ -0,0 +1,249 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobConflict(Exception):
+    """Un job d'un autre type est déjà actif sur la même clé"""
+
+    def __init__(self, job):
+        super().__init__(f"A {job.kind} job is already active for {job.key}")
+        self.job = job
+
+
+class JobNotCancellable(Exception):
+    """Le job a démarré et son travail ne peut pas être interrompu (ex. embedding amont)"""
+
+    def __init__(self, job):
+        super().__init__(f"Cancelling a running {job.kind} job is not supported")
+        self.job = job
+
+
+def job_room(key: str) -> str:
+    """Room Socket.IO dans laquelle sont publiés les événements d'un modèle"""
+    return f"model:{key}"
+
+
+class Job:
+    def __init__(self, kind: str, key: str, cancellable: bool = True):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.key = key
+        self.cancellable = cancellable
+        self.status = QUEUED
+        self.progress: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "model": self.key,
+            "status": self.status,
+            "cancellable": self.cancellable,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobContext:
+    """Passé à la fonction du job : publication de l'avancement et test d'annulation"""
+
+    def __init__(self, job: Job, publish: Callable[[str, Job], None]):
+        self.job = job
+        self._publish = publish
+
+    @property
+    def cancelled(self) -> bool:
+        return self.job.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    def report(self, files_done=None, files_total=None, chunks_done=None, chunks_total=None, **extra):
+        """Met à jour l'avancement ; débit (chunks/s) et ETA sont calculés ici"""
+        progress = self.job.progress
+        for name, value in (('files_done', files_done), ('files_total', files_total),
+                            ('chunks_done', chunks_done), ('chunks_total', chunks_total)):
+            if value is not None:
+                progress[name] = value
+        progress.update(extra)
+
+        elapsed = time.time() - (self.job.started_at or time.time())
+        done = progress.get('chunks_done', progress.get('files_done'))
+        total = progress.get('chunks_total', progress.get('files_total'))
+        if done and elapsed > 0:
+            rate = done / elapsed
+            progress['throughput'] = round(rate, 2)
+            progress['eta_seconds'] = round((total - done) / rate, 1) if total else None
+        self._publish('job_progress', self.job)
+
+
+class JobScheduler:
+    """
+    File de jobs en mémoire avec un nombre borné de workers.
+
+    Un seul job actif par clé (le modèle) : soumettre un job du même type
+    sur une clé occupée renvoie le job existant au lieu d'en créer un second ;
+    un job d'un autre type (un ré-embedding pendant un embedding du même
+    modèle) est refusé (JobConflict). Les événements (job_queued,
+    job_progress, job_finished) sont publiés via `emit(event, payload, room)`
+    dans la room du modèle.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, emit: Optional[Callable] = None,
+                 history_size: Optional[int] = None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or Config.JOB_MAX_WORKERS,
+                                           thread_name_prefix="job-worker")
+        self.emit = emit
+        self.history_size = history_size or Config.JOB_HISTORY_SIZE
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, key: str, fn: Callable, *args, cancellable: bool = True) -> Tuple[Job, bool]:
+        """
+        Planifie `fn(context, *args)` ; renvoie (job, created). `cancellable=False`
+        pour un job qui ne peut plus être interrompu une fois démarré.
+
+        Raises:
+            JobConflict: un job d'un autre type est actif sur `key`
+        """
+        with self._lock:
+            existing = self._active.get(key)
+            if existing is not None and existing.active and not existing.cancel_event.is_set():
+                if existing.kind != kind:
+                    raise JobConflict(existing)
+                return existing, False
+            job = Job(kind, key, cancellable)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._trim()
+        self._publish('job_queued', job)
+        self.executor.submit(self._run, job, fn, args)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, key: Optional[str] = None) -> List[Job]:
+        return [job for job in list(self._jobs.values()) if key is None or job.key == key]
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Demande l'annulation : un job en file ne démarrera pas, un job en cours
+        s'arrête au prochain `check_cancelled` et son résultat est ignoré.
+
+        Raises:
+            JobNotCancellable: le job est en cours et n'est pas annulable
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.status == RUNNING and not job.cancellable:
+            raise JobNotCancellable(job)
+        if job.active:
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+        return job
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """
+        Arrêt propre : les jobs en file sont annulés, ceux en cours peuvent
+        se terminer pendant `timeout` secondes (None = sans limite).
+        Renvoie les jobs encore actifs à l'échéance.
+        """
+        for job in self.list():
+            if job.status == QUEUED:
+                self.cancel(job.id)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for job in self.list():
+            if job.active:
+                job.done_event.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        remaining = [job for job in self.list() if job.active]
+        for job in remaining:
+            logger.warning(f"Job {job.kind} for {job.key} still running at shutdown")
+        return remaining
+
+    def _run(self, job: Job, fn: Callable, args):
+        if job.cancel_event.is_set():
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        self._publish('job_progress', job)
+        context = JobContext(job, self._publish)
+        try:
+            result = fn(context, *args)
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+            job.result = result
+            self._finish(job, SUCCEEDED)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            logger.error(f"Job {job.kind} for {job.key} failed: {str(e)}", exc_info=True)
+            job.error = str(e)
+            self._finish(job, FAILED)
+
+    def _finish(self, job: Job, status: str):
+        with self._lock:
+            if not job.active:
+                return
+            job.status = status
+            job.finished_at = time.time()
+            if self._active.get(job.key) is job:
+                del self._active[job.key]
+        job.done_event.set()
+        self._publish('job_finished', job)
+
+    def _trim(self):
+        # Conserve un historique borné des jobs terminés
+        while len(self._jobs) > self.history_size:
+            oldest_id = next((job_id for job_id, job in self._jobs.items() if not job.active), None)
+            if oldest_id is None:
+                break
+            del self._jobs[oldest_id]
+
+    def _publish(self, event: str, job: Job):
+        if self.emit is None:
+            return
+        try:
+            self.emit(event, job.to_dict(), to=job_room(job.key))
+        except Exception as e:
+            logger.warning(f"Could not publish {event} for job {job.id}: {str(e)}")
@@ -0,0 +1,34 @@
+from typing import Dict, Optional
+
+from services.jobs import JobContext
+
+
+class LocalEmbeddingService:
+    """Jobs d'embedding exécutés sur la base locale (EMBEDDING_BACKEND=local)"""
+
+    @staticmethod
+    def reembed_model_job(context: JobContext, model_id: str) -> Dict:
+        from models.database import get_db
+
+        def progress(files_done, files_total, chunks_done):
+            context.check_cancelled()
+            context.report(files_done=files_done, files_total=files_total, chunks_done=chunks_done)
+
+        report = get_db().reembed_model(model_id, progress=progress)
+        if report is None:
+            raise ValueError(f"Model not found: {model_id}")
+        return report
+
+    @staticmethod
+    def bulk_ingest_job(context: JobContext, source: str, category: Optional[str] = None,
+                        restart: bool = False, create_categories: bool = False) -> Dict:
+        """Import d'un répertoire ou d'une archive (voir utils.bulk_ingestion), annulable entre deux lots"""
+        from models.database import get_db
+        from utils.bulk_ingestion import BulkIngestion
+
+        def progress(files_done, files_total, chunks_done):
+            context.check_cancelled()
+            context.report(files_done=files_done, files_total=files_total, chunks_done=chunks_done)
+
+        return BulkIngestion(get_db(), source, category, progress=progress,
+                             create_categories=create_categories).run(restart=restart)
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from config import Config
+from services.singleflight import SingleFlight
+from utils.cache import LRUCache
+from utils.metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+# Tags d'invalidation
+MODEL_LIST = 'models:list'
+MODEL_DETAILS = 'models:detail'
+
+
+def model_tag(model_id: str) -> str:
+    return f"model:{model_id}"
+
+
+class _Entry:
+    __slots__ = ('body', 'status_code', 'fetched_at', 'tags')
+
+    def __init__(self, body, status_code, tags):
+        self.body = body
+        self.status_code = status_code
+        self.fetched_at = time.monotonic()
+        self.tags = frozenset(tags)
+
+
+class ResponseCache:
+    """
+    Cache des réponses GET du service de modèles (LRU borné, TTL par route).
+
+    Une entrée expirée depuis moins de RESPONSE_CACHE_STALE_TTL secondes est
+    servie immédiatement pendant qu'un thread la rafraîchit. Si l'amont est
+    indisponible, la dernière réponse connue est servie. Les mutations
+    invalident les entrées portant leurs tags.
+
+    Les lectures simultanées d'une même entrée sont coalescées, par génération :
+    un appel commencé avant une mutation n'est ni partagé avec les appelants
+    suivants ni mis en cache.
+    """
+
+    def __init__(self, maxsize=None, ttls=None, stale_ttl=None):
+        self.ttls = ttls if ttls is not None else {
+            'list_models': Config.RESPONSE_CACHE_TTL_MODELS,
+            'get_model': Config.RESPONSE_CACHE_TTL_MODEL
+        }
+        self.stale_ttl = Config.RESPONSE_CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+        self.entries = LRUCache(maxsize or Config.RESPONSE_CACHE_SIZE)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._flight = SingleFlight('response_cache')
+        self.stale_served = 0
+        self.refreshes = 0
+
+    def get(self, route: str, key: Tuple, fetch: Callable[[], Tuple[Any, int]],
+            tags: Iterable[str] = ()) -> Tuple[Any, int]:
+        ttl = self.ttls.get(route, 0)
+        if not ttl:
+            return fetch()
+
+        cache_key = (route,) + tuple(key)
+        entry = self.entries.get(cache_key)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < ttl:
+                return entry.body, entry.status_code
+            if age < ttl + self.stale_ttl:
+                self._refresh_in_background(cache_key, fetch, tags)
+                self.stale_served += 1
+                return entry.body, entry.status_code
+
+        body, status_code = self._fetch(cache_key, fetch, tags)
+        if status_code >= 500 and entry is not None:
+            logger.warning(f"Upstream unavailable for {route}, serving cached response")
+            self.stale_served += 1
+            return entry.body, entry.status_code
+        return body, status_code
+
+    def invalidate(self, *tags: str):
+        """Supprime les entrées portant l'un des tags (toutes si aucun tag)"""
+        with self._lock:
+            self._generation += 1
+        if not tags:
+            return self.entries.invalidate()
+        wanted = set(tags)
+        return self.entries.invalidate_entries(lambda key, entry: not entry.tags.isdisjoint(wanted))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.entries.stats(), "stale_served": self.stale_served, "refreshes": self.refreshes}
+
+    def _fetch(self, cache_key, fetch, tags):
+        # Génération relevée avant d'entrer dans la coalescence : elle date le début de l'appel partagé
+        with self._lock:
+            generation = self._generation
+        if Config.SINGLEFLIGHT_ENABLED:
+            body, status_code = self._flight.do(cache_key + (generation,), fetch)
+        else:
+            body, status_code = fetch()
+        if status_code == 200:
+            # Une mutation survenue pendant l'appel rend la réponse potentiellement périmée
+            with self._lock:
+                if generation == self._generation:
+                    self.entries.set(cache_key, _Entry(body, status_code, tags))
+        return body, status_code
+
+    def _refresh_in_background(self, cache_key, fetch, tags):
+        with self._lock:
+            if cache_key in self._refreshing:
+                return
+            self._refreshing.add(cache_key)
+            self.refreshes += 1
+
+        def refresh():
+            try:
+                self._fetch(cache_key, fetch, tags)
+            except Exception as e:
+                logger.warning(f"Background refresh of {cache_key} failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(cache_key)
+
+        threading.Thread(target=refresh, name="response-cache-refresh", daemon=True).start()
+
+
+response_cache = ResponseCache()
+register_cache('responses', response_cache.stats)
@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable
+
+from utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_CALLS = Counter('singleflight_calls_total',
+                             'Appels coalescés : executed = appel amont réel, shared = appel économisé.',
+                             ('group', 'result'))
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'finished_at')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+
+class SingleFlight:
+    """
+    Coalescence des appels identiques simultanés.
+
+    Le premier appelant d'une clé exécute `fn` ; ceux qui arrivent pendant
+    l'appel, ou moins de `window` secondes après sa fin, attendent et
+    reçoivent le même résultat (ou la même exception) sans nouvel appel.
+    Un résultat refusé par `keep` (ex. une erreur amont) n'est partagé
+    qu'avec les appelants déjà en attente.
+    """
+
+    def __init__(self, name: str, window: float = 0.0, keep: Callable[[Any], bool] = None):
+        self.name = name
+        self.window = window
+        self.keep = keep
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None or (call.finished_at is not None and now - call.finished_at >= self.window)
+            if leader:
+                self._evict_expired(now)
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            SINGLEFLIGHT_CALLS.inc(group=self.name, result='shared')
+            call.done.wait()
+        else:
+            SINGLEFLIGHT_CALLS.inc(group=self.name, result='executed')
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                call.finished_at = time.monotonic()
+                if not self.window or call.error is not None or (self.keep and not self.keep(call.result)):
+                    with self._lock:
+                        if self._calls.get(key) is call:
+                            del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _evict_expired(self, now):
+        # Appelé sous le verrou : retire les résultats dont la fenêtre est passée
+        expired = [key for key, call in self._calls.items()
+                   if call.finished_at is not None and now - call.finished_at >= self.window]
+        for key in expired:
+            del self._calls[key]
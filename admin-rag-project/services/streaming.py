@@ -0,0 +1,217 @@
+import logging
+import uuid
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+CRLF = b"\r\n"
+
+# En-têtes amont relayés tels quels vers le client lors d'un téléchargement
+DOWNLOAD_HEADERS = (
+    'Content-Type',
+    'Content-Length',
+    'Content-Encoding',
+    'Content-Range',
+    'Content-Disposition',
+    'Accept-Ranges',
+    'ETag',
+    'Last-Modified',
+)
+
+
+def sse_event(data: str, event: Optional[str] = None) -> str:
+    """Formate un message Server-Sent Events (une ligne `data:` par ligne de texte)"""
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+
+def iter_sse_events(chunks: Iterable[str]) -> Iterator[Tuple[Optional[str], str]]:
+    """(event, data) de chaque message d'un flux Server-Sent Events reçu en morceaux de texte quelconques"""
+    event, data = None, []
+    for line in _iter_lines(chunks):
+        line = line.rstrip('\r')
+        if not line:
+            if data:
+                yield event, '\n'.join(data)
+            event, data = None, []
+        elif not line.startswith(':'):
+            field, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if field == 'event':
+                event = value
+            elif field == 'data':
+                data.append(value)
+    # Dernier message sans ligne vide finale
+    if data:
+        yield event, '\n'.join(data)
+
+
+def _iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split('\n')
+        yield from lines
+    if buffer:
+        yield buffer
+
+
+def iter_stream(stream, chunk_size=None) -> Iterator[bytes]:
+    """Lit un flux binaire par blocs de taille fixe"""
+    chunk_size = chunk_size or Config.STREAM_CHUNK_SIZE
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _quote(value: str) -> bytes:
+    return value.replace('\\', '\\\\').replace('"', '\\"').encode('utf-8')
+
+
+def _part_header(boundary: bytes, name: str, filename: Optional[str] = None, content_type: Optional[str] = None) -> bytes:
+    header = b'--' + boundary + CRLF + b'Content-Disposition: form-data; name="' + _quote(name) + b'"'
+    if filename is not None:
+        header += b'; filename="' + _quote(filename) + b'"'
+    header += CRLF
+    if content_type:
+        header += b'Content-Type: ' + content_type.encode('latin-1') + CRLF
+    return header + CRLF
+
+
+class MultipartStream:
+    """
+    Corps multipart/form-data produit à la volée.
+
+    Les fichiers sont lus bloc par bloc au moment de l'envoi : le corps n'est
+    jamais construit en mémoire, et `requests` l'envoie en Transfer-Encoding
+    chunked puisqu'il s'agit d'un itérable.
+    """
+
+    def __init__(self, fields: Optional[Dict[str, Any]] = None,
+                 files: Optional[List[Tuple[str, Tuple[str, Any, Optional[str]]]]] = None,
+                 boundary: Optional[str] = None):
+        self.fields = fields or {}
+        self.files = files or []
+        self.boundary = (boundary or uuid.uuid4().hex).encode('ascii')
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary.decode('ascii')}"
+
+    def _iter_fields(self) -> Iterator[bytes]:
+        for name, value in self.fields.items():
+            if value is not None:
+                yield _part_header(self.boundary, name) + str(value).encode('utf-8') + CRLF
+
+    def _iter_parts(self) -> Iterator[bytes]:
+        for name, (filename, stream, content_type) in self.files:
+            yield _part_header(self.boundary, name, filename, content_type or 'application/octet-stream')
+            yield from iter_stream(stream)
+            yield CRLF
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._iter_fields()
+        yield from self._iter_parts()
+        yield b'--' + self.boundary + b'--' + CRLF
+
+
+class RelayedMultipartStream(MultipartStream):
+    """
+    Ré-émet un corps multipart entrant vers l'amont sans le mettre en tampon.
+
+    Le corps de la requête Flask (`request.stream`) est décodé de façon
+    incrémentale : chaque bloc lu est ré-encodé et transmis immédiatement,
+    sans passer par `request.files` (qui copierait les fichiers en mémoire
+    ou dans un fichier temporaire). Les fichiers refusés par `file_filter`
+    sont ignorés, les champs de `fields` sont ajoutés en tête et remplacent
+    les champs entrants de même nom.
+
+    Raises:
+        ValueError: si le Content-Type n'est pas multipart/form-data
+    """
+
+    def __init__(self, stream, content_type: str, fields: Optional[Dict[str, Any]] = None,
+                 file_filter: Optional[Callable[[str], bool]] = None):
+        mimetype, options = parse_options_header(content_type or '')
+        if mimetype != 'multipart/form-data' or 'boundary' not in options:
+            raise ValueError("Expected a multipart/form-data body")
+        super().__init__(fields=fields)
+        self.stream = stream
+        self.file_filter = file_filter
+        self.decoder = MultipartDecoder(options['boundary'].encode('latin-1'),
+                                        max_form_memory_size=Config.STREAM_CHUNK_SIZE * 2)
+        # Valeurs des champs entrants relayés et nombre de fichiers acceptés jusqu'ici
+        self.field_values: Dict[str, str] = {}
+        self.accepted_files = 0
+        self._relay = self._relay_parts()
+        self._prefetched: List[bytes] = []
+
+    def validate(self, required_fields: Tuple[str, ...] = (), require_file: bool = False) -> None:
+        """
+        Lit le corps jusqu'à l'en-tête du premier fichier accepté (rien n'est
+        encore envoyé) et vérifie la présence des champs requis, qui doivent
+        précéder les fichiers. Seuls les champs et cet en-tête sont gardés
+        en mémoire ; le reste du corps est relayé ensuite.
+
+        Raises:
+            ValueError: champ requis absent ou vide, ou aucun fichier accepté
+        """
+        for chunk in self._relay:
+            self._prefetched.append(chunk)
+            if self.accepted_files:
+                break
+        for name in required_fields:
+            if not self.field_values.get(name, '').strip():
+                raise ValueError(f"Missing {name}")
+        if require_file and not self.accepted_files:
+            raise ValueError("No valid files provided")
+
+    def _iter_parts(self) -> Iterator[bytes]:
+        prefetched, self._prefetched = self._prefetched, []
+        yield from prefetched
+        yield from self._relay
+
+    def _relay_parts(self) -> Iterator[bytes]:
+        skipping = False
+        field = None
+        eof = False
+        while not eof:
+            chunk = self.stream.read(Config.STREAM_CHUNK_SIZE)
+            eof = not chunk
+            self.decoder.receive_data(chunk or None)
+            event = self.decoder.next_event()
+            while not isinstance(event, NeedData):
+                if isinstance(event, Epilogue):
+                    eof = True
+                    break
+                if isinstance(event, File):
+                    field = None
+                    skipping = self.file_filter is not None and not self.file_filter(event.filename)
+                    if skipping:
+                        logger.info(f"Skipping disallowed file: {event.filename}")
+                    else:
+                        self.accepted_files += 1
+                        yield _part_header(self.boundary, event.name, event.filename,
+                                           event.headers.get('Content-Type', 'application/octet-stream'))
+                elif isinstance(event, Field):
+                    skipping = event.name in self.fields
+                    field = None if skipping else event.name
+                    if not skipping:
+                        self.field_values[field] = ''
+                        yield _part_header(self.boundary, event.name)
+                elif isinstance(event, Data) and not skipping:
+                    if field is not None:
+                        self.field_values[field] += event.data.decode('utf-8', 'replace')
+                    if event.data:
+                        yield event.data
+                    if not event.more_data:
+                        yield CRLF
+                event = self.decoder.next_event()
@@ -0,0 +1,64 @@
+import os
+import re
+import sys
+
+import pytest
+
+# Les tests n'ont pas accès au modèle d'embedding : pas de préchargement
+os.environ.setdefault('EMBEDDING_WARMUP', 'false')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import SyntheticEmbeddings  # noqa: E402
+
+DIM = 32
+
+
+class WhitespaceTokenizer:
+    """Tokenizer minimal (un token par mot) avec l'interface utilisée par `iter_chunks`"""
+
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=False):
+        if isinstance(texts, list):
+            return {'input_ids': [[0] * len(text.split()) for text in texts]}
+        spans = [match.span() for match in re.finditer(r'\S+', texts)]
+        return {'input_ids': [0] * len(spans), 'offset_mapping': spans}
+
+
+class SyntheticEngine:
+    """Remplace le moteur d'embedding : vecteurs déterministes, appels comptés"""
+
+    def __init__(self):
+        self.embeddings = SyntheticEmbeddings(DIM)
+        self.calls = 0
+
+    def encode(self, texts, timeout=None):
+        self.calls += 1
+        return self.embeddings.embed_many(texts)
+
+
+@pytest.fixture
+def tokenizer(monkeypatch):
+    import utils.embedding_generator as embedding_generator
+
+    tokenizer = WhitespaceTokenizer()
+    monkeypatch.setattr(embedding_generator, 'get_tokenizer', lambda name=None: (tokenizer, 64))
+    return tokenizer
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    import models.database as database
+    import utils.embedding_engine as embedding_engine
+
+    engine = SyntheticEngine()
+    monkeypatch.setattr(embedding_engine, 'get_engine', lambda: engine)
+    monkeypatch.setattr(database, 'get_engine', lambda: engine)
+    return engine
+
+
+@pytest.fixture
+def db(tmp_path, engine):
+    from models.database import ChromaDBManager
+
+    manager = ChromaDBManager(path=str(tmp_path / 'db'))
+    yield manager
+    manager.query_executor.shutdown(wait=False)
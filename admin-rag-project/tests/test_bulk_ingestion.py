@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from config import Config
+from utils.bulk_ingestion import BulkIngestion, Manifest
+
+
+@pytest.fixture
+def source(tmp_path):
+    root = tmp_path / 'source'
+    for category in ('REVETEMENT', 'SALLE DE BAINS'):
+        os.makedirs(root / category)
+        for i in range(2):
+            (root / category / f'fiche{i}.txt').write_text(
+                '\n\n'.join(f"Fiche {category} {i}, paragraphe {j} : référence CODE-{i}{j}." for j in range(5)),
+                encoding='utf-8')
+    return root
+
+
+@pytest.fixture
+def bulk(tmp_path, monkeypatch, db, tokenizer, source):
+    monkeypatch.setattr(Config, 'BULK_MANIFEST_DIR', str(tmp_path / 'manifests'))
+
+    def run(restart=False):
+        return BulkIngestion(db, str(source), workers=2).run(restart=restart)
+    return run
+
+
+def test_manifest_last_line_wins(tmp_path):
+    path = tmp_path / 'manifest.jsonl'
+    data = tmp_path / 'a.txt'
+    data.write_text('contenu', encoding='utf-8')
+    stat = os.stat(data)
+
+    manifest = Manifest(str(path))
+    manifest.record('a.txt', stat, 'failed', error='boom')
+    manifest.record('a.txt', stat, 'done', chunks=1)
+    assert Manifest(str(path)).is_done('a.txt', stat)
+
+    os.utime(data, (stat.st_atime, stat.st_mtime + 10))
+    assert not Manifest(str(path)).is_done('a.txt', os.stat(data))
+
+    manifest.reset()
+    assert not path.exists() and not Manifest(str(path)).entries
+
+
+def test_resume_skips_finished_files(bulk, db, engine):
+    first = bulk()
+    assert (first["files_done"], first["skipped"], first["failed"]) == (4, 0, 0)
+    counts = {category: db.collection(category).count() for category in db.categories()}
+
+    calls = engine.calls
+    second = bulk()
+    assert (second["files_done"], second["skipped"]) == (0, 4)
+    assert engine.calls == calls
+    assert {category: db.collection(category).count() for category in db.categories()} == counts
+
+
+def test_changed_file_replaces_its_chunks(bulk, db, source):
+    bulk()
+    changed = source / 'REVETEMENT' / 'fiche0.txt'
+    changed.write_text("Nouvelle fiche : dalle vinyle clipsable NOUV-1.", encoding='utf-8')
+
+    report = bulk()
+    assert (report["files_done"], report["replaced"], report["skipped"]) == (1, 1, 3)
+    collection = db.collection('REVETEMENT')
+    stored = collection.get(where={"doc_id": "REVETEMENT/fiche0.txt"}, include=["documents"])
+    assert stored['documents'] == ["Nouvelle fiche : dalle vinyle clipsable NOUV-1."]
+    hits = db.lexical_index('REVETEMENT').search("CODE-03", 5, parts=False)
+    assert all(not chunk_id.startswith("REVETEMENT/fiche0.txt#") for chunk_id, _ in hits)
+
+
+def test_restart_reimports_everything(bulk, db):
+    bulk()
+    count = db.collection('REVETEMENT').count()
+    report = bulk(restart=True)
+    assert (report["files_done"], report["replaced"], report["skipped"]) == (4, 4, 0)
+    assert db.collection('REVETEMENT').count() == count
+
+
+def test_hung_extraction_fails_the_file_only(bulk, db, source, monkeypatch):
+    # Lire un tube nommé sans écrivain bloque indéfiniment le processus d'extraction
+    os.mkfifo(source / 'REVETEMENT' / 'bloque.txt')
+    monkeypatch.setattr(Config, 'PDF_TIMEOUT', 2)
+    report = bulk()
+    assert (report["files_done"], report["failed"]) == (4, 1)
+    assert "REVETEMENT/bloque.txt" in report["errors"]
+    assert db.collection('SALLE DE BAINS').count() > 0
@@ -0,0 +1,42 @@
+from utils.embedding_generator import iter_chunks, split_text_into_chunks
+
+
+def _sentences(count, words=8):
+    return [f"Phrase {i} " + ' '.join(f"mot{i}x{j}" for j in range(words - 2)) + "." for i in range(count)]
+
+
+def test_chunks_respect_limit_and_overlap(tokenizer):
+    sentences = _sentences(30)
+    chunks = [chunk for chunk, _ in iter_chunks([(1, ' '.join(sentences))], max_tokens=40, overlap=16,
+                                                tokenizer=tokenizer, model_max=64)]
+    assert len(chunks) > 1
+    assert all(len(chunk.split()) <= 40 for chunk in chunks)
+    # Chaque chunk reprend les deux dernières phrases (16 tokens) du précédent
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.startswith(' '.join(previous.split()[-16:]))
+    # Aucune phrase perdue, dans l'ordre
+    covered = [sentence for sentence in sentences if any(sentence in chunk for chunk in chunks)]
+    assert covered == sentences
+
+
+def test_limit_is_capped_by_model_max(tokenizer):
+    text = ' '.join(_sentences(40))
+    assert max(len(chunk.split()) for chunk in split_text_into_chunks(text, max_tokens=500)) <= 62
+    chunks = [chunk for chunk, _ in iter_chunks([(None, text)], max_tokens=500, tokenizer=tokenizer, model_max=20)]
+    assert max(len(chunk.split()) for chunk in chunks) <= 18
+
+
+def test_long_sentence_is_windowed(tokenizer):
+    sentence = ' '.join(f"ref{i}" for i in range(100))
+    chunks = [chunk for chunk, _ in iter_chunks([(None, sentence)], max_tokens=40, overlap=10,
+                                                tokenizer=tokenizer, model_max=64)]
+    assert [len(chunk.split()) for chunk in chunks] == [40, 40, 40]
+    assert chunks[1].split()[0] == "ref30"
+    assert chunks[-1].split()[-1] == "ref99"
+
+
+def test_location_is_where_fresh_text_starts(tokenizer):
+    pages = [(page, ' '.join(_sentences(3))) for page in (1, 2, 3)]
+    located = list(iter_chunks(pages, max_tokens=24, overlap=8, tokenizer=tokenizer, model_max=64))
+    assert [location for _, location in located] == sorted(location for _, location in located)
+    assert located[0][1] == 1 and located[-1][1] == 3
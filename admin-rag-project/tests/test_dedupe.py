@@ -0,0 +1,65 @@
+from models.database import content_hash
+
+SHARED = "Garantie décennale : la pose doit respecter le DTU 52.2 en vigueur."
+
+
+def _add(db, engine, category, doc_id, chunks, page):
+    vectors = engine.embeddings.embed_many(chunks)
+    return db.add_chunks(category, doc_id, chunks, vectors, {"filename": doc_id},
+                         chunk_metadatas=[{"page": page} for _ in chunks])
+
+
+def _chunks(db, category):
+    items = db.collection(category).get(include=["documents", "metadatas"])
+    return {chunk_id: (text, metadata) for chunk_id, text, metadata
+            in zip(items['ids'], items['documents'], items['metadatas'])}
+
+
+def test_content_hash_ignores_whitespace():
+    assert content_hash("  Carrelage\n grès   cérame ") == content_hash("Carrelage grès cérame")
+    assert content_hash("Carrelage") != content_hash("carrelage")
+
+
+def test_shared_chunk_is_stored_once(db, engine):
+    category = db.categories()[0]
+    assert _add(db, engine, category, "a.pdf", ["Texte propre au fichier A.", SHARED], page=1) == 2
+    assert _add(db, engine, category, "b.pdf", [SHARED, "Texte propre au fichier B."], page=3) == 1
+    assert db.collection(category).count() == 3
+
+
+def test_deleting_one_owner_keeps_shared_chunk(db, engine):
+    category = db.categories()[0]
+    _add(db, engine, category, "a.pdf", ["Texte propre au fichier A.", SHARED], page=1)
+    _add(db, engine, category, "b.pdf", [SHARED, "Texte propre au fichier B."], page=3)
+
+    assert db.delete_document("a.pdf")
+    chunks = _chunks(db, category)
+    assert set(chunks) == {"b.pdf#0", "b.pdf#1"}
+    text, metadata = chunks["b.pdf#0"]
+    assert text == SHARED
+    assert (metadata["doc_id"], metadata["filename"], metadata["page"]) == ("b.pdf", "b.pdf", 3)
+    assert db.get_document("a.pdf") is None
+
+    # Index lexical : le chunk réattribué reste trouvable sous son nouvel id
+    hits = db.lexical_index(category).search("DTU 52.2", 5)
+    assert [chunk_id for chunk_id, _ in hits] == ["b.pdf#0"]
+
+
+def test_deleting_last_owner_removes_shared_chunk(db, engine):
+    category = db.categories()[0]
+    _add(db, engine, category, "a.pdf", [SHARED], page=1)
+    _add(db, engine, category, "b.pdf", [SHARED], page=2)
+
+    db.delete_document("a.pdf")
+    db.delete_document("b.pdf")
+    assert db.collection(category).count() == 0
+    assert db.registry.reference_heirs(db.collection(category).name, {content_hash(SHARED)}) == {}
+    assert db.lexical_index(category).search("DTU", 5) == []
+
+
+def test_existing_ids_are_not_counted(db, engine):
+    category = db.categories()[0]
+    _add(db, engine, category, "a.pdf", ["Première version."], page=1)
+    # Même id (a.pdf#0), autre contenu : Chroma l'ignorerait, il n'est ni compté ni indexé
+    assert _add(db, engine, category, "a.pdf", ["Seconde version."], page=1) == 0
+    assert db.lexical_index(category).search("seconde", 5) == []
@@ -0,0 +1,13 @@
+from utils.extractors import iter_segments
+
+
+def test_text_is_split_into_paragraphs(tmp_path):
+    path = tmp_path / 'fiche.txt'
+    path.write_text("\nCarrelage grès cérame\n60x120, rectifié.\n\n\n  \nPose collée\r\ndouble encollage.\n"
+                    "\nDernière ligne", encoding='utf-8')
+    assert list(iter_segments(str(path))) == [
+        (2, "Carrelage grès cérame 60x120, rectifié."),
+        (7, "Pose collée double encollage."),
+        (10, "Dernière ligne"),
+    ]
+    assert list(iter_segments(str(path), mime_type='text/plain; charset=utf-8'))[0][0] == 2
@@ -0,0 +1,52 @@
+import pytest
+
+from models.history import ChatHistory
+from services import external_service
+from services.external_service import ChatService
+
+
+@pytest.fixture
+def history(tmp_path):
+    return ChatHistory(str(tmp_path / 'history.sqlite3'))
+
+
+def _questions(entries):
+    return [entry["question"] for entry in entries]
+
+
+def test_backfill_is_ordered_by_time_and_deduplicated(history):
+    history.append("m1", "relayée localement", "réponse", created_at=1000.2)
+    history.append("m1", "récente", "réponse", created_at=3000)
+    upstream = {"history": [
+        {"id": 7, "model": "m1", "question": "importée récente", "answer": "a", "timestamp": 2000},
+        {"id": 3, "model": "m1", "question": "importée ancienne", "answer": "a", "timestamp": "1970-01-01T00:08:20Z"},
+        {"id": 5, "model": "m1", "question": "relayée  localement", "answer": "réponse", "timestamp": 1000.7},
+    ]}
+    history.backfill(lambda: (upstream, 200))
+
+    entries, has_more = history.page(10)
+    assert _questions(entries) == ["récente", "importée récente", "relayée localement", "importée ancienne"]
+    assert not has_more and history.count() == 4
+    # Un échange déjà enregistré (même modèle, question, seconde) n'est pas dupliqué
+    assert history.append("m1", "récente", "réponse", created_at=3000.5) is None
+
+
+def test_cursors_follow_time_then_insertion_order(history, monkeypatch):
+    history._backfilled = True
+    monkeypatch.setattr(external_service, 'get_history', lambda: history)
+    for index, created_at in enumerate([100, 300, 200, 200, 400]):
+        history.append("m1", f"q{index}", "a", created_at=created_at)
+
+    page, _ = ChatService.get_chat_history(limit=2)
+    assert _questions(page["history"]) == ["q4", "q1"] and page["has_more"]
+    page, _ = ChatService.get_chat_history(limit=2, before=page["next_cursor"])
+    assert _questions(page["history"]) == ["q3", "q2"]
+    page, _ = ChatService.get_chat_history(limit=2, before=page["next_cursor"])
+    assert _questions(page["history"]) == ["q0"] and page["next_cursor"] is None
+
+    history.append("m1", "q5", "a", created_at=500)
+    newer, _ = ChatService.get_chat_history(limit=10, after=page["prev_cursor"])
+    assert _questions(newer["history"]) == ["q5", "q4", "q1", "q3", "q2"]
+
+    with pytest.raises(ValueError):
+        ChatService.get_chat_history(before="eyJzIjogMX0=")
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services.external_service import ExternalService
+from services.http_client import AsyncHttpClient
+
+
+class _Upstream(BaseHTTPRequestHandler):
+    # Réponses servies dans l'ordre, puis la dernière indéfiniment
+    replies = []
+    calls = 0
+
+    def do_GET(self):
+        cls = type(self)
+        status, body = cls.replies[min(cls.calls, len(cls.replies) - 1)]
+        cls.calls += 1
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream():
+    _Upstream.replies, _Upstream.calls = [], 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Upstream)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield _Upstream, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_forward_request_async(upstream):
+    handler, url = upstream
+    handler.replies = [(200, {"models": ["m1"]})]
+    assert asyncio.run(ExternalService.forward_request_async(f"{url}/models", method='GET')) == \
+        ({"models": ["m1"]}, 200)
+    assert asyncio.run(ExternalService.forward_request_async(url, method='PUT')) == \
+        ({"error": "Unsupported HTTP method"}, 400)
+
+
+def test_async_client_retries_idempotent_requests(upstream):
+    handler, url = upstream
+    handler.replies = [(503, {}), (200, {"ok": True})]
+
+    async def call():
+        client = AsyncHttpClient(max_retries=2, backoff_factor=0)
+        try:
+            return await client.get(url)
+        finally:
+            await client.aclose()
+
+    response = asyncio.run(call())
+    assert (response.status_code, response.json(), handler.calls) == (200, {"ok": True}, 2)
@@ -0,0 +1,136 @@
+import threading
+
+import pytest
+
+from services.jobs import CANCELLED, SUCCEEDED, JobConflict, JobNotCancellable, JobScheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = JobScheduler(max_workers=2)
+    yield scheduler
+    scheduler.shutdown(timeout=5)
+
+
+def _blocking_job():
+    started, release = threading.Event(), threading.Event()
+
+    def run(context):
+        started.set()
+        while not release.wait(0.01):
+            context.check_cancelled()
+        return "fini"
+    return run, started, release
+
+
+def test_same_kind_is_merged_and_other_kind_conflicts(scheduler):
+    run, started, release = _blocking_job()
+    job, created = scheduler.submit('embed', 'm1', run)
+    assert created and started.wait(5)
+
+    assert scheduler.submit('embed', 'm1', run) == (job, False)
+    with pytest.raises(JobConflict) as conflict:
+        scheduler.submit('reembed', 'm1', run)
+    assert conflict.value.job is job
+    # Autre modèle : indépendant
+    other, created = scheduler.submit('reembed', 'm2', lambda context: None)
+    assert created and other.done_event.wait(5)
+
+    release.set()
+    assert job.done_event.wait(5) and job.status == SUCCEEDED
+    assert scheduler.submit('reembed', 'm1', lambda context: None)[1]
+
+
+def test_running_job_that_is_not_cancellable(scheduler):
+    run, started, release = _blocking_job()
+    job, _ = scheduler.submit('embed', 'm1', run, cancellable=False)
+    assert started.wait(5)
+    with pytest.raises(JobNotCancellable):
+        scheduler.cancel(job.id)
+    assert job.active and job.to_dict()["cancellable"] is False
+    release.set()
+    assert job.done_event.wait(5) and job.status == SUCCEEDED
+
+
+def test_cancel_running_and_queued_jobs():
+    scheduler = JobScheduler(max_workers=1)
+    run, started, release = _blocking_job()
+    running, _ = scheduler.submit('reembed', 'm1', run)
+    assert started.wait(5)
+    queued, _ = scheduler.submit('embed', 'm2', lambda context: None, cancellable=False)
+
+    # Pas encore démarré : même un job non annulable peut être retiré de la file
+    assert scheduler.cancel(queued.id).status == CANCELLED
+    scheduler.cancel(running.id)
+    assert running.done_event.wait(5) and running.status == CANCELLED
+    assert scheduler.cancel('inconnu') is None
+    scheduler.shutdown(timeout=5)
+
+
+def test_routes_report_conflicts_and_uncancellable_jobs(monkeypatch):
+    import app as proxy
+    from services.external_service import EmbeddingService, ModelService
+
+    started, release = threading.Event(), threading.Event()
+
+    def embed_job(context, model_id, name):
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(proxy, 'jobs', JobScheduler(max_workers=2))
+    monkeypatch.setattr(ModelService, 'resolve_model_id', staticmethod(lambda key: ("m1", 200)))
+    monkeypatch.setattr(EmbeddingService, 'embed_documents_job', staticmethod(embed_job))
+    client = proxy.app.test_client()
+
+    response = client.post('/api/models/catalogue/embed')
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    response = client.post('/api/models/m1/reembed')
+    assert response.status_code == 409 and response.get_json()["job"]["job_id"] == job_id
+    assert client.post('/api/models/catalogue/embed').get_json()["merged"] is True
+
+    assert started.wait(5)
+    assert client.delete(f'/api/jobs/{job_id}').status_code == 409
+    release.set()
+    proxy.jobs.shutdown(timeout=5)
+
+
+
+def test_bulk_jobs_require_the_token(monkeypatch):
+    import app as proxy
+    from config import Config
+
+    monkeypatch.setattr(Config, 'BULK_INGEST_TOKEN', 'secret')
+    monkeypatch.setattr(proxy, 'jobs', JobScheduler(max_workers=2))
+    run, started, release = _blocking_job()
+    bulk, _ = proxy.jobs.submit('bulk_ingest', '/data/catalogues', run)
+    embed, _ = proxy.jobs.submit('embed', 'm1', lambda context: None)
+    assert started.wait(5) and embed.done_event.wait(5)
+    client = proxy.app.test_client()
+    authorized = {"Authorization": "Bearer secret"}
+
+    listed = client.get('/api/jobs').get_json()["jobs"]
+    assert [job["job_id"] for job in listed] == [embed.id]
+    assert len(client.get('/api/jobs', headers=authorized).get_json()["jobs"]) == 2
+    assert client.get(f'/api/jobs/{bulk.id}').status_code == 401
+    assert client.get(f'/api/jobs/{embed.id}').status_code == 200
+    assert client.delete(f'/api/jobs/{bulk.id}', headers={"Authorization": "Bearer faux"}).status_code == 401
+    assert bulk.status != CANCELLED
+
+    assert client.delete(f'/api/jobs/{bulk.id}', headers=authorized).status_code == 200
+    assert bulk.done_event.wait(5) and bulk.status == CANCELLED
+    release.set()
+    proxy.jobs.shutdown(timeout=5)
+
+def test_subscribe_rejects_malformed_payloads():
+    import app as proxy
+
+    client = proxy.socketio.test_client(proxy.app)
+    for payload in (None, "m1", {}, {"model": ""}):
+        client.emit('subscribe', payload)
+    client.emit('unsubscribe')
+    errors = [event for event in client.get_received() if event['name'] == 'subscription_error']
+    assert len(errors) == 5
+    client.emit('subscribe', {"model": "m1"})
+    assert client.get_received() == []
+    client.disconnect()
@@ -0,0 +1,65 @@
+import pytest
+
+from models.lexical_index import LexicalIndex, looks_like_reference, tokenize
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LexicalIndex(str(tmp_path / 'lexical'), compact_ops=1000)
+
+
+def _ids(hits):
+    return [chunk_id for chunk_id, _ in hits]
+
+
+def test_tokenize_folds_accents_and_splits_references():
+    assert list(tokenize("Faïence REF-12/B")) == ["faience", "ref-12/b", "ref", "12", "b"]
+    assert list(tokenize("REF-12/B", parts=False)) == ["ref-12/b"]
+    assert looks_like_reference("REF-12 60x120")
+    assert not looks_like_reference("quelle colle pour REF-12")
+
+
+def test_search_ranks_by_bm25(index):
+    index.add(["a#0", "a#1", "b#0"], [
+        "Colle carrelage C2 pour faïence murale",
+        "Joint époxy pour carrelage, joint souple",
+        "Parquet chêne massif, pose collée",
+    ])
+    assert _ids(index.search("joint", 5)) == ["a#1"]
+    assert _ids(index.search("carrelage joint", 5))[0] == "a#1"
+    assert _ids(index.search("faience", 5)) == ["a#0"]
+    assert index.search("inconnu", 5) == []
+
+
+def test_remove_document_hides_its_chunks(index):
+    index.add(["a#0", "b#0"], ["carrelage grès", "carrelage faïence"])
+    assert index.remove_document("a") == 1
+    assert index.remove_document("a") == 0
+    assert _ids(index.search("carrelage", 5)) == ["b#0"]
+    assert len(index) == 1
+
+
+def test_log_is_replayed_on_reload(index, tmp_path):
+    index.add(["a#0", "b#0"], ["carrelage grès", "carrelage faïence"])
+    index.remove_document("a")
+    reloaded = LexicalIndex(str(tmp_path / 'lexical'))
+    assert _ids(reloaded.search("carrelage", 5)) == ["b#0"]
+
+
+def test_compaction_keeps_live_postings(tmp_path):
+    index = LexicalIndex(str(tmp_path / 'lexical'), compact_ops=3)
+    index.add([f"doc{i}#0" for i in range(4)], [f"plinthe modèle M{i} chêne" for i in range(4)])
+    index.remove_document("doc1")
+    index.remove_document("doc2")
+    # La moitié des chunks supprimés : segment réécrit sans eux, journal vidé
+    assert not (tmp_path / 'lexical' / 'log.jsonl').exists()
+    assert (tmp_path / 'lexical' / 'segment.npz').exists()
+    assert len(index.ids) == 2
+
+    index.add(["doc9#0"], ["plinthe modèle M9 noyer"])
+    assert sorted(_ids(index.search("plinthe", 10))) == ["doc0#0", "doc3#0", "doc9#0"]
+    assert _ids(index.search("m3", 10)) == ["doc3#0"]
+
+    reloaded = LexicalIndex(str(tmp_path / 'lexical'))
+    assert sorted(_ids(reloaded.search("plinthe", 10))) == ["doc0#0", "doc3#0", "doc9#0"]
+    assert _ids(reloaded.search("noyer", 10)) == ["doc9#0"]
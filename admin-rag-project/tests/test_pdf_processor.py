@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from config import Config
+from utils.pdf_processor import iter_pdf_pages
+
+
+def _write_pdf(path, texts):
+    """PDF minimal : une page par texte, en Helvetica"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects)))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b' '.join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+    data, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b''.join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    return _write_pdf(tmp_path / 'fiche.pdf', [f"Page {i} carrelage" for i in range(1, 5)])
+
+
+def test_timeout_ignores_time_spent_by_the_consumer(pdf, monkeypatch):
+    monkeypatch.setattr(Config, 'PDF_PAGES_PER_TASK', 1)
+    monkeypatch.setattr(Config, 'PDF_PARALLEL_MIN_PAGES', 2)
+    pages = []
+    started = time.monotonic()
+    for number, text in iter_pdf_pages(pdf, timeout=3, max_workers=2):
+        pages.append((number, text))
+        time.sleep(1.5)
+    assert time.monotonic() - started > 3
+    assert pages == [(i, f"Page {i} carrelage") for i in range(1, 5)]
+
+
+def test_timeout_bounds_the_extraction(pdf):
+    with pytest.raises(TimeoutError):
+        list(iter_pdf_pages(pdf, timeout=0.01))
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from models.quantized_store import QuantizedIndex, quantize
+
+
+def _vectors(count, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_quantize_round_trip_is_close(dtype):
+    vectors = _vectors(10)
+    quantized, scales = quantize(vectors, dtype)
+    restored = quantized.astype(np.float32) * scales[:, None]
+    assert np.abs(restored - vectors).max() < 0.01
+
+
+def test_search_returns_nearest_first(tmp_path):
+    vectors = _vectors(200)
+    index = QuantizedIndex(str(tmp_path / 'quantized'))
+    index.add([f"doc{i // 10}#{i % 10}" for i in range(200)], vectors)
+
+    query = vectors[42] + 0.01
+    assert index.search(query, 3)[0] == "doc4#2"
+
+
+def test_remove_and_reload(tmp_path):
+    vectors = _vectors(20)
+    ids = [f"doc{i // 10}#{i % 10}" for i in range(20)]
+    index = QuantizedIndex(str(tmp_path / 'quantized'))
+    index.add(ids, vectors)
+    assert index.remove_document("doc0") == 10
+    assert all(not chunk_id.startswith("doc0#") for chunk_id in index.search(vectors[0], 20))
+
+    reloaded = QuantizedIndex(str(tmp_path / 'quantized'))
+    assert len(reloaded) == 10
+    assert reloaded.search(vectors[15], 1) == ["doc1#5"]
+
+
+def test_query_rescores_quantized_candidates(db, engine, monkeypatch):
+    from config import Config
+
+    monkeypatch.setattr(Config, 'VECTOR_STORE_MODE', 'int8')
+    category = db.categories()[0]
+    chunks = [f"Fiche produit {i} : panneau isolant épaisseur {i} mm" for i in range(40)]
+    db.add_chunks(category, "catalogue.pdf", chunks, engine.embeddings.embed_many(chunks), {})
+    assert len(db.quantized_index(category)) == 40
+
+    query = engine.embeddings.embed(chunks[7])
+    results = db._query_quantized(db.collection(category), db.quantized_index(category), query, 3)
+    exact = db._query_one(db.collection(category), query, 3, None)
+    assert [result["id"] for result in results] == [result["id"] for result in exact]
+    # Distances recalculées sur les vecteurs float32 de Chroma, pas sur la copie quantifiée
+    assert results[0]["id"] == "catalogue.pdf#7"
+    assert results[0]["score"] == pytest.approx(exact[0]["score"], abs=1e-4)
+    assert results[0]["text"] == chunks[7]
@@ -0,0 +1,94 @@
+import threading
+import time
+
+from services import external_service
+from services.external_service import ExternalService, ModelService
+from services.response_cache import MODEL_LIST, ResponseCache
+from services.singleflight import SingleFlight
+
+
+class _Upstream:
+    """Renvoie ("v<numéro d'appel>", 200) ; le premier appel peut être retenu"""
+
+    def __init__(self):
+        self.calls = 0
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.calls += 1
+        version = f"v{self.calls}"
+        self.entered.set()
+        self.release.wait(5)
+        return version, 200
+
+
+def _cache(**ttls):
+    return ResponseCache(maxsize=8, ttls=ttls or {'list_models': 60}, stale_ttl=60)
+
+
+def test_concurrent_misses_are_coalesced():
+    cache, upstream = _cache(), _Upstream()
+    upstream.release.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('list_models', (), upstream)))
+               for _ in range(4)]
+    threads[0].start()
+    assert upstream.entered.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.1)
+    upstream.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [("v1", 200)] * 4 and upstream.calls == 1
+    assert cache.get('list_models', (), upstream) == ("v1", 200)
+
+
+def test_call_started_before_a_mutation_is_neither_shared_nor_cached():
+    cache, upstream = _cache(), _Upstream()
+    upstream.release.clear()
+    first = []
+    thread = threading.Thread(target=lambda: first.append(cache.get('list_models', (), upstream)))
+    thread.start()
+    assert upstream.entered.wait(5)
+
+    cache.invalidate()
+    upstream.release.set()
+    # Arrivé après la mutation : nouvel appel amont, pas le résultat en cours
+    assert cache.get('list_models', (), upstream) == ("v2", 200)
+    thread.join(5)
+    assert first == [("v1", 200)]
+    assert cache.get('list_models', (), upstream) == ("v2", 200)
+    assert upstream.calls == 2
+
+
+def test_stale_entry_is_served_while_refreshing():
+    cache, upstream = _cache(list_models=0.05), _Upstream()
+    assert cache.get('list_models', (), upstream) == ("v1", 200)
+    time.sleep(0.1)
+    assert cache.get('list_models', (), upstream) == ("v1", 200)
+    deadline = time.monotonic() + 5
+    while cache.get('list_models', (), upstream) != ("v2", 200) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = cache.stats()
+    assert stats["refreshes"] >= 1 and stats["stale_served"] >= 1
+
+
+def test_model_list_after_a_mutation_is_fresh(monkeypatch):
+    cache, upstream = _cache(), _Upstream()
+    monkeypatch.setattr(external_service, 'response_cache', cache)
+    monkeypatch.setattr(external_service, 'upstream_gets', SingleFlight('test', window=60))
+    monkeypatch.setattr(ExternalService, '_send', staticmethod(lambda url, method, *args: upstream()))
+    upstream.release.clear()
+    first = []
+    thread = threading.Thread(target=lambda: first.append(ModelService.list_models()))
+    thread.start()
+    assert upstream.entered.wait(5)
+
+    cache.invalidate(MODEL_LIST)
+    upstream.release.set()
+    thread.join(5)
+    assert first == [("v1", 200)]
+    assert ModelService.list_models() == ("v2", 200)
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from services.singleflight import SingleFlight
+
+
+def _concurrently(flight, key, fn, count):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def _blocking(result=None, error=None):
+    calls, entered, release = [], threading.Event(), threading.Event()
+
+    def fn():
+        calls.append(True)
+        entered.set()
+        release.wait(5)
+        if error is not None:
+            raise error
+        return result
+    return fn, calls, entered, release
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight('test')
+    fn, calls, entered, release = _blocking(result=("ok", 200))
+    threads, results, _ = _concurrently(flight, 'k', fn, 1)
+    assert entered.wait(5)
+    more, more_results, _ = _concurrently(flight, 'k', fn, 3)
+    time.sleep(0.1)
+    release.set()
+    for thread in threads + more:
+        thread.join(5)
+    assert results + more_results == [("ok", 200)] * 4 and len(calls) == 1
+    # Sans fenêtre, un appel ultérieur est réexécuté
+    assert flight.do('k', lambda: ("new", 200)) == ("new", 200)
+
+
+def test_errors_are_shared_with_waiters_only():
+    flight = SingleFlight('test', window=60)
+    fn, calls, entered, release = _blocking(error=RuntimeError("amont"))
+    threads, _, errors = _concurrently(flight, 'k', fn, 1)
+    assert entered.wait(5)
+    more, _, more_errors = _concurrently(flight, 'k', fn, 2)
+    time.sleep(0.1)
+    release.set()
+    for thread in threads + more:
+        thread.join(5)
+    assert [str(e) for e in errors + more_errors] == ["amont"] * 3 and len(calls) == 1
+    assert flight.do('k', lambda: "reprise") == "reprise"
+
+
+def test_window_keeps_accepted_results_only():
+    flight = SingleFlight('test', window=60, keep=lambda result: result[1] < 500)
+    assert flight.do('a', lambda: ("ok", 200)) == ("ok", 200)
+    assert flight.do('a', lambda: pytest.fail("résultat partagé attendu")) == ("ok", 200)
+    assert flight.do('b', lambda: ("down", 503)) == ("down", 503)
+    assert flight.do('b', lambda: ("up", 200)) == ("up", 200)
+
+
+def test_window_expires():
+    flight = SingleFlight('test', window=0.05)
+    assert flight.do('k', lambda: 1) == 1
+    time.sleep(0.1)
+    # Les résultats expirés sont retirés au prochain appel exécuté
+    assert flight.do('other', lambda: 2) == 2
+    assert 'k' not in flight._calls
+    assert flight.do('k', lambda: 3) == 3
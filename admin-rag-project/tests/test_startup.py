@@ -0,0 +1,50 @@
+import os
+
+import models.database as database
+from config import Config
+
+
+def test_startup_warms_the_model(monkeypatch):
+    import app as proxy
+
+    opened = []
+    monkeypatch.setattr(database, 'get_db', lambda: opened.append(True))
+    monkeypatch.setattr(Config, 'EMBEDDING_WARMUP', False)
+    proxy.startup()
+    assert opened == []
+
+    monkeypatch.setattr(Config, 'EMBEDDING_WARMUP', True)
+    proxy.startup()
+    assert opened == [True]
+
+
+def test_startup_survives_a_failed_warmup(monkeypatch):
+    import app as proxy
+
+    def fail():
+        raise OSError("modèle introuvable")
+
+    monkeypatch.setattr(database, 'get_db', fail)
+    monkeypatch.setattr(Config, 'EMBEDDING_WARMUP', True)
+    proxy.startup()
+
+
+def test_gunicorn_warms_each_worker(monkeypatch):
+    import runpy
+
+    import app as proxy
+
+    started = []
+    monkeypatch.setattr(proxy, 'startup', lambda: started.append(True))
+    hooks = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py'))
+    hooks['post_worker_init'](None)
+    assert started == [True]
+
+
+def test_gunicorn_runs_a_single_worker(monkeypatch):
+    import runpy
+
+    monkeypatch.setattr(Config, 'WEB_WORKERS', 4)
+    monkeypatch.setattr(Config, 'SOCKETIO_MESSAGE_QUEUE', 'redis://redis:6379/0')
+    hooks = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py'))
+    assert hooks['workers'] == 1
@@ -0,0 +1,68 @@
+import io
+
+import pytest
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from services.streaming import MultipartStream, RelayedMultipartStream, iter_sse_events
+
+
+def _parse(body, content_type):
+    """Décode un corps multipart comme le ferait le service de modèles"""
+    data = b''.join(body)
+    request = Request.from_values(input_stream=io.BytesIO(data), content_length=len(data),
+                                  content_type=content_type, method='POST')
+    return request.form.to_dict(), {name: (storage.filename, storage.read())
+                                    for name, storage in request.files.items(multi=True)}
+
+
+def _incoming(data):
+    builder = EnvironBuilder(method='POST', data=data)
+    environ = builder.get_environ()
+    return environ['wsgi.input'], environ['CONTENT_TYPE']
+
+
+def test_multipart_stream_round_trip():
+    payload = b'%PDF-1.4 ' + bytes(range(256)) * 500
+    body = MultipartStream(fields={"model_name": "Modèle 1", "skip": None},
+                           files=[("files[]", ("fiche \"A\".pdf", io.BytesIO(payload), "application/pdf"))])
+    form, files = _parse(body, body.content_type)
+    assert form == {"model_name": "Modèle 1"}
+    assert files == {"files[]": ("fiche \"A\".pdf", payload)}
+
+
+def test_relayed_stream_filters_files_and_overrides_fields():
+    stream, content_type = _incoming({
+        "model_name": "entrant",
+        "description": "Catalogue 2024",
+        "files[]": [(io.BytesIO(b'%PDF-1.4 contenu'), 'a.pdf'), (io.BytesIO(b'MZ'), 'virus.exe')],
+    })
+    body = RelayedMultipartStream(stream, content_type, fields={"model_name": "imposé"},
+                                  file_filter=lambda name: name.endswith('.pdf'))
+    body.validate(required_fields=("description",), require_file=True)
+    assert body.field_values == {"description": "Catalogue 2024"}
+
+    form, files = _parse(body, body.content_type)
+    assert form == {"model_name": "imposé", "description": "Catalogue 2024"}
+    assert files == {"files[]": ("a.pdf", b'%PDF-1.4 contenu')}
+    assert body.accepted_files == 1
+
+
+def test_relayed_stream_validation_errors():
+    stream, content_type = _incoming({"files[]": (io.BytesIO(b'%PDF-1.4'), 'a.pdf')})
+    with pytest.raises(ValueError, match="Missing model_name"):
+        RelayedMultipartStream(stream, content_type).validate(required_fields=("model_name",))
+
+    stream, content_type = _incoming({"model_name": "m", "files[]": (io.BytesIO(b'MZ'), 'a.exe')})
+    body = RelayedMultipartStream(stream, content_type, file_filter=lambda name: name.endswith('.pdf'))
+    with pytest.raises(ValueError, match="No valid files provided"):
+        body.validate(required_fields=("model_name",), require_file=True)
+
+    with pytest.raises(ValueError):
+        RelayedMultipartStream(io.BytesIO(b''), 'application/json')
+
+
+def test_sse_events_across_chunk_boundaries():
+    raw = 'event: token\ndata: Bon\n\ndata: jour\r\n\r\n: commentaire\n\nevent: done\ndata: [DONE]\n\n'
+    chunks = [raw[i:i + 7] for i in range(0, len(raw), 7)]
+    assert list(iter_sse_events(chunks)) == [("token", "Bon"), (None, "jour"), ("done", "[DONE]")]
@@ -0,0 +1,50 @@
+import io
+
+import pytest
+from werkzeug.test import EnvironBuilder
+
+from config import Config
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import app as proxy
+    from services.external_service import ExternalService
+
+    received = {}
+
+    def forward_stream(url, body, timeout=None):
+        # Service de modèles factice : consomme le corps relayé sans le garder
+        received["url"], received["bytes"] = url, sum(len(chunk) for chunk in body)
+        return {"message": "ok"}, 200
+
+    monkeypatch.setattr(Config, 'STREAM_UPLOADS', True)
+    monkeypatch.setattr(ExternalService, 'forward_stream', staticmethod(forward_stream))
+    return proxy.app.test_client(), received
+
+
+def _multipart(size):
+    builder = EnvironBuilder(method='POST', data={
+        "model_name": "m1",
+        "files[]": (io.BytesIO(b'%PDF-1.4 ' + b'x' * size), 'catalogue.pdf'),
+    })
+    environ = builder.get_environ()
+    return environ['wsgi.input'].read(), environ['CONTENT_TYPE']
+
+
+def test_streamed_upload_is_not_bound_by_max_content_length(client):
+    test_client, received = client
+    body, content_type = _multipart(Config.MAX_CONTENT_LENGTH + 4 * 1024 * 1024)
+    response = test_client.post('/api/models/upload-model', data=body, content_type=content_type)
+    assert response.status_code == 200
+    assert received["url"].endswith('/upload')
+    assert received["bytes"] > Config.MAX_CONTENT_LENGTH
+
+
+def test_streamed_upload_over_the_stream_limit_is_413(client, monkeypatch):
+    test_client, received = client
+    monkeypatch.setattr(Config, 'STREAM_MAX_CONTENT_LENGTH', 1024 * 1024)
+    body, content_type = _multipart(2 * 1024 * 1024)
+    response = test_client.post('/api/models/m1/files', data=body, content_type=content_type)
+    assert response.status_code == 413
+    assert "bytes" not in received
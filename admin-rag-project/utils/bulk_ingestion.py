@@ -0,0 +1,333 @@
+"""
+Ingestion en masse d'un répertoire ou d'une archive (.zip, .tar, .tar.gz).
+
+Les fichiers sont extraits en parallèle dans un pool de processus (au plus
+PDF_TIMEOUT secondes par fichier : au-delà, le fichier est marqué en échec
+et le pool est recréé), découpés
+en chunks, embeddés par lots de BULK_EMBED_BATCH chunks puis écrits par
+`collection.add` de BULK_WRITE_BATCH chunks au plus. Un manifeste (JSON
+lines, un état par fichier) permet de reprendre un import interrompu : les
+fichiers déjà écrits et inchangés (taille, date) sont ignorés. Un fichier
+modifié, ou écrit en partie avant l'interruption, remplace ses anciens chunks.
+
+Sans catégorie imposée, le premier sous-répertoire de chaque fichier donne
+sa catégorie (ex. `catalogues/REVETEMENT/sols.pdf`) ; avec
+`--create-categories`, les catégories inconnues sont créées.
+
+    python -m utils.bulk_ingestion uploads/catalogues
+    python -m utils.bulk_ingestion fournisseur.zip --category "SALLE DE BAINS" --db db
+
+La CLI écrit directement dans la base : le serveur ne doit pas tourner sur
+la même base pendant l'import (utiliser alors POST /api/ingest/bulk).
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from collections import deque
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz')
+
+
+def is_archive(path):
+    return os.path.isfile(path) and path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _source_key(source, category):
+    return hashlib.sha1(f"{os.path.abspath(source)}|{category or ''}".encode('utf-8')).hexdigest()[:16]
+
+
+def unpack_archive(archive, destination):
+    """Décompresse `archive` dans `destination` (une seule fois) ; refuse les chemins hors de la destination"""
+    marker = os.path.join(destination, '.unpacked')
+    if os.path.exists(marker):
+        return destination
+    os.makedirs(destination, exist_ok=True)
+    root = os.path.realpath(destination)
+
+    def target(name):
+        path = os.path.realpath(os.path.join(root, name))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"Chemin invalide dans l'archive: {name}")
+        return path
+
+    if archive.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive) as bundle:
+            for name in bundle.namelist():
+                target(name)
+            bundle.extractall(root)
+    else:
+        with tarfile.open(archive) as bundle:
+            members = [member for member in bundle.getmembers() if member.isfile() or member.isdir()]
+            for member in members:
+                target(member.name)
+            bundle.extractall(root, members=members)
+    open(marker, 'w').close()
+    return destination
+
+
+class Manifest:
+    """
+    Etat de chaque fichier d'un import, en ajout seul (la dernière ligne d'un fichier fait foi).
+    Un fichier n'est marqué `done` qu'une fois tous ses chunks écrits.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["file"]] = entry
+
+    def is_done(self, name, stat):
+        entry = self.entries.get(name)
+        return bool(entry and entry["status"] == "done" and entry["size"] == stat.st_size
+                    and entry["mtime"] == stat.st_mtime)
+
+    def record(self, name, stat, status, **extra):
+        entry = {"file": name, "size": stat.st_size, "mtime": stat.st_mtime, "status": status,
+                 "at": time.time(), **extra}
+        self.entries[name] = entry
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def reset(self):
+        self.entries = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _init_worker():
+    # Le parallélisme est entre fichiers : pas de second pool par PDF dans un processus du pool
+    Config.PDF_MAX_WORKERS = 1
+
+
+def _extract(path):
+    """Exécuté dans un processus du pool : (chemin, segments, erreur)"""
+    from utils.extractors import iter_segments
+    try:
+        return path, list(iter_segments(path)), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+class BulkIngestion:
+    def __init__(self, db, source, category=None, manifest_path=None, workers=None,
+                 embed_batch=None, write_batch=None, progress=None, create_categories=False):
+        self.db = db
+        self.source = source
+        self.create_categories = create_categories
+        self.category = self._resolve(category) if category else None
+        self.manifest = Manifest(manifest_path or os.path.join(
+            Config.BULK_MANIFEST_DIR, f"{_source_key(source, category)}.jsonl"))
+        self.workers = workers or Config.BULK_EXTRACT_WORKERS
+        self.embed_batch = embed_batch or Config.BULK_EMBED_BATCH
+        self.write_batch = write_batch or Config.BULK_WRITE_BATCH
+        self.progress = progress
+        self.report = {"files_total": 0, "files_done": 0, "skipped": 0, "replaced": 0, "failed": 0,
+                       "chunks_embedded": 0, "chunks_written": 0, "errors": {}}
+        # Fichiers extraits en attente d'embedding : (nom, stat, catégorie, [(chunk, location)])
+        self._pending = []
+        self._pending_chunks = 0
+
+    def _directory(self):
+        if os.path.isdir(self.source):
+            return self.source
+        if is_archive(self.source):
+            staging = os.path.join(Config.BULK_STAGING_FOLDER, _source_key(self.source, None))
+            return unpack_archive(self.source, staging)
+        raise ValueError(f"Source introuvable ou format non supporté: {self.source}")
+
+    def _files(self, directory):
+        from utils.extractors import supported_extensions
+
+        extensions = set(supported_extensions())
+        for root, dirs, names in os.walk(directory):
+            dirs.sort()
+            for name in sorted(names):
+                if not name.startswith('.') and os.path.splitext(name)[1].lstrip('.').lower() in extensions:
+                    path = os.path.join(root, name)
+                    yield path, os.path.relpath(path, directory).replace(os.sep, '/')
+
+    def _resolve(self, category):
+        try:
+            return self.db.resolve_category(category)
+        except ValueError:
+            if not self.create_categories:
+                raise
+            return self.db.create_category(category)["name"]
+
+    def _category_of(self, name):
+        if self.category:
+            return self.category
+        if '/' not in name:
+            raise ValueError("Fichier hors d'un sous-répertoire de catégorie")
+        return self._resolve(name.split('/', 1)[0])
+
+    def run(self, restart=False):
+        """Exécute (ou reprend) l'import ; renvoie le rapport"""
+        started = time.perf_counter()
+        if restart:
+            self.manifest.reset()
+        directory = self._directory()
+
+        todo = []
+        for path, name in self._files(directory):
+            self.report["files_total"] += 1
+            stat = os.stat(path)
+            if self.manifest.is_done(name, stat):
+                self.report["skipped"] += 1
+                continue
+            try:
+                todo.append((path, name, stat, self._category_of(name)))
+            except ValueError as e:
+                self._fail(name, stat, str(e))
+        self._report_progress()
+
+        if todo:
+            self._extract_all(todo)
+            self._flush()
+
+        self.report["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(f"Bulk ingestion of {self.source}: {self.report}")
+        return self.report
+
+    def _extract_all(self, todo):
+        """
+        Extrait les fichiers dans le pool, au plus un par processus à la fois,
+        et met en file leurs segments. Un fichier dont l'extraction dépasse
+        PDF_TIMEOUT est marqué en échec ; le processus bloqué ne pouvant être
+        arrêté qu'avec son pool, celui-ci est recréé et les fichiers qui y
+        étaient en cours sont relancés.
+        """
+        context = multiprocessing.get_context('spawn')
+        size = min(self.workers, len(todo))
+        timeout = Config.PDF_TIMEOUT
+        waiting, running = deque(todo), deque()
+        pool = context.Pool(size, initializer=_init_worker)
+        try:
+            while waiting or running:
+                while waiting and len(running) < size:
+                    item = waiting.popleft()
+                    deadline = time.monotonic() + timeout if timeout else None
+                    running.append((item, pool.apply_async(_extract, (item[0],)), deadline))
+                (path, name, stat, category), result, deadline = running.popleft()
+                try:
+                    _, segments, error = result.get(
+                        timeout=max(0.0, deadline - time.monotonic()) if deadline else None)
+                except multiprocessing.TimeoutError:
+                    self._fail(name, stat, f"Extraction interrompue après {timeout}s")
+                    pool.terminate()
+                    pool.join()
+                    waiting.extendleft(reversed([item for item, _, _ in running]))
+                    running.clear()
+                    pool = context.Pool(size, initializer=_init_worker)
+                    continue
+                if error is not None:
+                    self._fail(name, stat, error)
+                    continue
+                self._queue(name, stat, category, segments)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _fail(self, name, stat, error):
+        logger.error(f"Bulk ingestion of {name} failed: {error}")
+        self.report["failed"] += 1
+        self.report["errors"][name] = error
+        self.manifest.record(name, stat, "failed", error=error)
+
+    def _queue(self, name, stat, category, segments):
+        from utils.embedding_generator import iter_chunks
+
+        chunks = list(iter_chunks(segments))
+        self._pending.append((name, stat, category, chunks))
+        self._pending_chunks += len(chunks)
+        if self._pending_chunks >= self.embed_batch:
+            self._flush()
+
+    def _flush(self):
+        """
+        Embedde les fichiers en attente en un appel, écrit par lots, puis les marque terminés.
+        Les chunks déjà stockés pour un fichier (version précédente ou import
+        interrompu) sont supprimés avant l'écriture : le doc_id est le chemin du
+        fichier, les ids des nouveaux chunks reprendraient les anciens.
+        """
+        from utils.embedding_engine import get_engine
+
+        if not self._pending:
+            return
+        texts = [chunk for _, _, _, chunks in self._pending for chunk, _ in chunks]
+        embeddings = iter(get_engine().encode(texts) if texts else [])
+        self.report["chunks_embedded"] += len(texts)
+
+        for name, _, _, _ in self._pending:
+            if self.db.delete_document(name):
+                self.report["replaced"] += 1
+
+        records = {}
+        for name, _, category, chunks in self._pending:
+            metadata = {"filename": os.path.basename(name), "source": name}
+            for index, (chunk, location) in enumerate(chunks):
+                chunk_metadata = {**metadata, "page": location} if location is not None else metadata
+                records.setdefault(category, []).append((name, index, chunk, next(embeddings), chunk_metadata))
+        for category, items in records.items():
+            for start in range(0, len(items), self.write_batch):
+                self.report["chunks_written"] += self.db.add_records(category, items[start:start + self.write_batch])
+
+        for name, stat, category, chunks in self._pending:
+            self.manifest.record(name, stat, "done", category=category, chunks=len(chunks))
+            self.report["files_done"] += 1
+        self._pending, self._pending_chunks = [], 0
+        self._report_progress()
+
+    def _report_progress(self):
+        if self.progress:
+            done = self.report["files_done"] + self.report["skipped"] + self.report["failed"]
+            self.progress(done, self.report["files_total"], self.report["chunks_embedded"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help="répertoire ou archive .zip/.tar(.gz) à importer")
+    parser.add_argument('--category', help="catégorie de tous les fichiers (sinon : premier sous-répertoire)")
+    parser.add_argument('--db', help="base Chroma (défaut : CHROMA_DB_PATH)")
+    parser.add_argument('--manifest', help="fichier de reprise (défaut : BULK_MANIFEST_DIR/<source>.jsonl)")
+    parser.add_argument('--workers', type=int, help="processus d'extraction")
+    parser.add_argument('--embed-batch', type=int, help="chunks par appel au modèle")
+    parser.add_argument('--write-batch', type=int, help="chunks par collection.add")
+    parser.add_argument('--restart', action='store_true', help="ignore le manifeste et réimporte tout")
+    parser.add_argument('--create-categories', action='store_true', help="crée les catégories inconnues")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL), format=Config.LOG_FORMAT)
+    from models.database import ChromaDBManager
+
+    db = ChromaDBManager(path=args.db)
+
+    def progress(files_done, files_total, chunks_done):
+        print(f"{files_done}/{files_total} files, {chunks_done} chunks", file=sys.stderr)
+
+    ingestion = BulkIngestion(db, args.source, args.category, args.manifest, args.workers,
+                              args.embed_batch, args.write_batch, progress, args.create_categories)
+    report = ingestion.run(restart=args.restart)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 1 if report["failed"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
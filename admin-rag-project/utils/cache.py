@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Cache LRU borné avec expiration (TTL) par entrée, thread-safe.
+
+    `ttl=None` désactive l'expiration ; `maxsize` borne le nombre d'entrées,
+    la moins récemment utilisée étant évincée en premier.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or (entry[1] is not None and entry[1] <= time.monotonic()):
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate=None):
+        """Supprime les entrées dont la clé vérifie `predicate` (toutes si None)"""
+        if predicate is None:
+            return self._remove(None)
+        return self._remove(lambda key, value: predicate(key))
+
+    def invalidate_entries(self, predicate):
+        """Supprime les entrées pour lesquelles `predicate(clé, valeur)` est vrai"""
+        return self._remove(predicate)
+
+    def _remove(self, predicate):
+        with self._lock:
+            if predicate is None:
+                removed = len(self._data)
+                self._data.clear()
+            else:
+                keys = [key for key, (value, _) in self._data.items() if predicate(key, value)]
+                for key in keys:
+                    del self._data[key]
+                removed = len(keys)
+            self.invalidations += removed
+            return removed
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,33 @@
+import sys
+
+
+def _patched_by():
+    """'eventlet' ou 'gevent' si wsgi.py a rendu les threads coopératifs, sinon None"""
+    if 'eventlet' in sys.modules:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('thread'):
+            return 'eventlet'
+    if 'gevent' in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return 'gevent'
+    return None
+
+
+def offload(fn, *args, **kwargs):
+    """
+    Exécute un appel CPU (modèle d'embedding, recherche et écriture Chroma)
+    sur un vrai thread système quand le processus est monkey-patché.
+
+    Sous eventlet/gevent, les threads de l'application sont des green threads
+    partageant un seul thread système : un calcul qui ne rend pas la main
+    bloquerait toutes les requêtes du worker. Hors gunicorn, l'appel est direct.
+    """
+    mode = _patched_by()
+    if mode == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(fn, *args, **kwargs)
+    if mode == 'gevent':
+        from gevent import get_hub
+        return get_hub().threadpool.apply(fn, args, kwargs)
+    return fn(*args, **kwargs)
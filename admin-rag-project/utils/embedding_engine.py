@@ -0,0 +1,158 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from config import Config
+from utils.cooperative import offload
+from utils.metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_QUEUE_WAIT
+from utils.model_registry import get_embedding_model
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class _Request:
+    __slots__ = ('texts', 'future', 'enqueued_at')
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class EmbeddingEngine:
+    """
+    Regroupe les textes de plusieurs appelants concurrents en micro-batchs.
+
+    Chaque appel à `submit` dépose ses textes dans une file commune. Un thread
+    dédié vide la file dès que `batch_size` textes sont disponibles ou que le
+    plus ancien attend depuis `max_wait_ms`, encode le tout en un seul appel
+    au modèle, puis rend à chaque appelant sa propre tranche via un Future.
+
+    Quand le moteur est inactif (rien en file ni en cours d'encodage),
+    l'appelant encode directement dans son thread sans attendre `max_wait_ms` :
+    seules les requêtes arrivant pendant un encodage sont regroupées.
+    """
+
+    def __init__(self, model_name=None, batch_size=None, max_wait_ms=None, workers=None):
+        self.model_name = model_name or Config.EMBEDDING_MODEL_NAME
+        self.batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+        self.max_wait = (Config.EMBEDDING_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        # Exportés sur /metrics
+        self.batch_sizes = EMBEDDING_BATCH_SIZE.labels(model=self.model_name)
+        self.queue_latency = EMBEDDING_QUEUE_WAIT.labels(model=self.model_name)
+        self._queue = queue.Queue()
+        # Requêtes déposées et pas encore servies (en file, en attente de batch ou en cours d'encodage)
+        self._outstanding = 0
+        self._outstanding_lock = threading.Lock()
+        self._threads = []
+        for i in range(workers or Config.EMBEDDING_WORKERS):
+            thread = threading.Thread(target=self._run, name=f"embedding-engine-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, texts):
+        """Planifie l'encodage de `texts` (sur place si le moteur est inactif) ; le Future renvoie les vecteurs"""
+        request = _Request(list(texts))
+        if not request.texts:
+            request.future.set_result([])
+            return request.future
+        with self._outstanding_lock:
+            idle = self._outstanding == 0
+            self._outstanding += 1
+        if idle:
+            self._encode([request])
+        else:
+            self._queue.put(request)
+        return request.future
+
+    def encode(self, texts, timeout=None):
+        return self.submit(texts).result(timeout)
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "batch_size": self.batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self._queue.qsize(),
+            "batch_sizes": self.batch_sizes.snapshot(),
+            "queue_latency_seconds": self.queue_latency.snapshot()
+        }
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def _collect(self, first):
+        batch = [first]
+        size = len(first.texts)
+        deadline = first.enqueued_at + self.max_wait
+        while size < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is _STOP:
+                # Rendre le signal d'arrêt après avoir traité le batch courant
+                self._queue.put(_STOP)
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            self._encode(self._collect(first))
+
+    def _encode(self, batch):
+        started = time.perf_counter()
+        texts = [text for request in batch for text in request.texts]
+        for request in batch:
+            self.queue_latency.observe(started - request.enqueued_at)
+        self.batch_sizes.observe(len(texts))
+
+        try:
+            model = get_embedding_model(self.model_name)
+            vectors = offload(model.encode, texts, batch_size=self.batch_size).tolist()
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(texts)} texts failed: {str(e)}")
+            self._release(batch)
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        self._release(batch)
+        offset = 0
+        for request in batch:
+            request.future.set_result(vectors[offset:offset + len(request.texts)])
+            offset += len(request.texts)
+
+    def _release(self, batch):
+        # Avant de rendre les résultats : un appelant servi qui ressoumet trouve le moteur inactif
+        with self._outstanding_lock:
+            self._outstanding -= len(batch)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Moteur partagé du processus, démarré au premier appel"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = EmbeddingEngine()
+    return _engine
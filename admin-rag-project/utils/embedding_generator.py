@@ -1,29 +1,120 @@
-from sentence_transformers import SentenceTransformer
-import numpy as np
+import re
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+from config import Config
+from utils.embedding_engine import get_engine
+from utils.model_registry import get_tokenizer
+
+_PARAGRAPH = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
+# Tokens spéciaux ([CLS], [SEP]) ajoutés par le modèle à chaque entrée
+_SPECIAL_TOKENS = 2
 
 def generate_embeddings(text):
     # Découpage en chunks pour les longs documents
     chunks = split_text_into_chunks(text)
-    embeddings = model.encode(chunks)
-    return embeddings.tolist()
-
-def split_text_into_chunks(text, max_chunk_size=512):
-    words = text.split()
-    chunks = []
-    current_chunk = []
-    current_size = 0
-    
-    for word in words:
-        if current_size + len(word) + 1 > max_chunk_size:
-            chunks.append(' '.join(current_chunk))
-            current_chunk = []
-            current_size = 0
-        current_chunk.append(word)
-        current_size += len(word) + 1
-    
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    
-    return chunks
\ No newline at end of file
+    # Les chunks sont regroupés avec ceux des autres appels concurrents
+    return get_engine().encode(chunks)
+
+def generate_chunk_embeddings(text):
+    """Retourne les chunks et leurs embeddings (un vecteur par chunk, même ordre)"""
+    chunks = split_text_into_chunks(text)
+    return chunks, get_engine().encode(chunks)
+
+def split_text_into_chunks(text, max_tokens=None, overlap=None):
+    return [chunk for chunk, _ in iter_chunks([(None, text)], max_tokens, overlap)]
+
+def _paragraphs(segments):
+    """(location, [phrases]) pour chaque paragraphe des segments, espaces normalisés"""
+    for location, text in segments:
+        for paragraph in _PARAGRAPH.split(text):
+            sentences = [' '.join(sentence.split()) for sentence in _SENTENCE_END.split(paragraph)]
+            sentences = [sentence for sentence in sentences if sentence]
+            if sentences:
+                yield location, sentences
+
+def _join(units):
+    return ' '.join(text for text, _ in units)
+
+def _split_long_sentence(sentence, tokenizer, max_tokens, overlap):
+    """Fenêtres de `max_tokens` tokens (avec recouvrement) d'une phrase trop longue pour un chunk"""
+    offsets = tokenizer(sentence, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+    step = max_tokens - overlap
+    for start in range(0, len(offsets), step):
+        window = offsets[start:start + max_tokens]
+        yield sentence[window[0][0]:window[-1][1]]
+        if start + max_tokens >= len(offsets):
+            return
+
+def iter_chunks(segments, max_tokens=None, overlap=None, tokenizer=None, model_max=None):
+    """
+    Découpe un flux de segments (location, texte) en chunks, au fil de l'eau.
+
+    Les tailles sont comptées en tokens du modèle d'embedding : un chunk ne
+    dépasse jamais ce que le modèle encode sans troncature (CHUNK_MAX_TOKENS,
+    par défaut la limite du modèle). Les coupures tombent entre deux phrases ;
+    un paragraphe qui ne tient pas dans un chunk déjà bien rempli commence le
+    suivant. Chaque chunk reprend les dernières phrases du précédent dans la
+    limite de `overlap` tokens. Une phrase plus longue qu'un chunk est coupée
+    par fenêtres de tokens.
+
+    `location` (ex. numéro de page) est celle du segment où commence le texte
+    propre au chunk (hors recouvrement). Seul le chunk en cours est gardé en
+    mémoire.
+
+    La limite du modèle est le `max_seq_length` du SentenceTransformer (au-delà,
+    `encode` tronque), et non `tokenizer.model_max_length` qui peut être plus
+    grand : avec un `tokenizer` fourni, `model_max` la précise.
+    """
+    if tokenizer is None:
+        tokenizer, model_max = get_tokenizer()
+    elif model_max is None:
+        model_max = get_tokenizer()[1]
+    max_tokens = min(max_tokens or Config.CHUNK_MAX_TOKENS or model_max, model_max - _SPECIAL_TOKENS)
+    overlap = Config.CHUNK_OVERLAP_TOKENS if overlap is None else overlap
+    overlap = min(overlap, max_tokens // 2)
+
+    current = []  # (phrase, tokens)
+    size = 0
+    fresh = 0  # phrases ajoutées depuis la dernière coupure (le recouvrement n'en fait pas partie)
+    location = None
+
+    def overlap_tail():
+        tail, tail_size = [], 0
+        for sentence, count in reversed(current):
+            if tail_size + count > overlap:
+                break
+            tail.insert(0, (sentence, count))
+            tail_size += count
+        return tail, tail_size
+
+    for paragraph_location, sentences in _paragraphs(segments):
+        counts = [len(ids) for ids in tokenizer(sentences, add_special_tokens=False)['input_ids']]
+        if fresh and size + sum(counts) > max_tokens and size >= max_tokens * Config.CHUNK_PARAGRAPH_MIN_FILL:
+            yield _join(current), location
+            current, size = overlap_tail()
+            fresh = 0
+
+        for sentence, count in zip(sentences, counts):
+            if count > max_tokens:
+                if fresh:
+                    yield _join(current), location
+                for piece in _split_long_sentence(sentence, tokenizer, max_tokens, overlap):
+                    yield piece, paragraph_location
+                current, size, fresh = [], 0, 0
+                continue
+
+            if fresh and size + count > max_tokens:
+                yield _join(current), location
+                current, size = overlap_tail()
+                fresh = 0
+            while current and size + count > max_tokens:
+                size -= current.pop(0)[1]
+
+            if not fresh:
+                location = paragraph_location
+            current.append((sentence, count))
+            size += count
+            fresh += 1
+
+    if fresh:
+        yield _join(current), location
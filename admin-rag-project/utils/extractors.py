@@ -0,0 +1,164 @@
+import io
+import os
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+
+from utils.pdf_processor import iter_pdf_pages
+
+_WHITESPACE = re.compile(r'\s+')
+
+# Espace de noms WordprocessingML (document.xml d'un .docx)
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+_extractors = {}
+_mime_types = {}
+
+
+def register_extractor(extensions, mime_types=()):
+    """
+    Enregistre un extracteur pour des extensions (sans point) et types MIME.
+
+    Un extracteur reçoit un chemin et génère des segments (location, texte)
+    sans charger le fichier entier : ils alimentent `iter_chunks` puis
+    l'ingestion par lots.
+    """
+    def decorator(extractor):
+        for extension in extensions:
+            _extractors[extension.lower()] = extractor
+        for mime_type in mime_types:
+            _mime_types[mime_type] = extensions[0].lower()
+        return extractor
+    return decorator
+
+
+def get_extractor(filepath=None, mime_type=None):
+    """Extracteur associé au type MIME s'il est connu, sinon à l'extension ; ValueError sinon"""
+    extension = _mime_types.get((mime_type or '').split(';')[0].strip().lower())
+    if extension is None and filepath:
+        extension = os.path.splitext(filepath)[1].lstrip('.').lower()
+    extractor = _extractors.get(extension)
+    if extractor is None:
+        raise ValueError(f"Format non supporté pour l'ingestion: {extension or mime_type}")
+    return extractor
+
+
+def supported_extensions():
+    return set(_extractors)
+
+
+def iter_segments(filepath, mime_type=None):
+    return get_extractor(filepath, mime_type)(filepath)
+
+
+def _clean(text):
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+register_extractor(('pdf',), ('application/pdf',))(iter_pdf_pages)
+
+
+@register_extractor(('txt',), ('text/plain',))
+def iter_text_paragraphs(filepath):
+    """
+    Lecture ligne par ligne (tampon de fichier) : les paragraphes sont séparés
+    par des lignes vides. Génère (numéro de la première ligne, texte).
+    """
+    with open(filepath, 'r', encoding='utf-8', errors='replace', buffering=io.DEFAULT_BUFFER_SIZE) as f:
+        start, lines = None, []
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if line:
+                if start is None:
+                    start = number
+                lines.append(line)
+            elif lines:
+                yield start, ' '.join(lines)
+                start, lines = None, []
+        if lines:
+            yield start, ' '.join(lines)
+
+
+@register_extractor(('xlsx',), ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',))
+def iter_xlsx_rows(filepath):
+    """
+    Parcours des feuilles en mode lecture seule : les lignes sont lues au fil
+    du XML de la feuille, une seule est en mémoire. Génère ("Feuille!ligne", texte).
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            for number, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+                cells = [str(value) for value in row if value is not None and str(value).strip()]
+                if cells:
+                    yield f"{sheet.title}!{number}", _clean(' '.join(cells))
+    finally:
+        workbook.close()
+
+
+@register_extractor(('xml',), ('application/xml', 'text/xml'))
+def iter_xml_records(filepath):
+    """
+    Parcours incrémental (iterparse) : chaque enfant direct de la racine est
+    un enregistrement, rendu (numéro d'enregistrement, texte) dès sa fermeture
+    puis effacé, ce qui borne la mémoire à un enregistrement.
+    """
+    depth = 0
+    root = None
+    record = 0
+    for event, element in ET.iterparse(filepath, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            record += 1
+            text = _clean(' '.join(element.itertext()))
+            if text:
+                yield record, text
+            root.clear()
+        elif depth == 0 and record == 0:
+            # Document sans enregistrements : la racine porte tout le texte
+            text = _clean(' '.join(element.itertext()))
+            if text:
+                yield 1, text
+
+
+def _run_text(node):
+    if node.tag == f'{_W}t':
+        return node.text or ''
+    if node.tag in (f'{_W}tab', f'{_W}br'):
+        return ' '
+    return ''
+
+
+@register_extractor(('docx',), ('application/vnd.openxmlformats-officedocument.wordprocessingml.document',))
+def iter_docx_paragraphs(filepath):
+    """
+    Lecture de word/document.xml en flux depuis l'archive : génère
+    (numéro de paragraphe, texte). Les paragraphes des tableaux sont inclus ;
+    chaque bloc du corps est effacé une fois lu.
+    """
+    with zipfile.ZipFile(filepath) as archive:
+        with archive.open('word/document.xml') as document:
+            stack = []
+            paragraph = 0
+            for event, element in ET.iterparse(document, events=('start', 'end')):
+                if event == 'start':
+                    stack.append(element)
+                    continue
+                stack.pop()
+                if element.tag == f'{_W}p':
+                    text = _clean(''.join(_run_text(node) for node in element.iter()))
+                    if text:
+                        paragraph += 1
+                        yield paragraph, text
+                    # Un paragraphe imbriqué (zone de texte) ne doit pas être relu par son parent
+                    element.clear()
+                if len(stack) == 2:
+                    # Fin d'un bloc du corps (paragraphe ou tableau) : on libère <w:body>
+                    stack[1].clear()
@@ -0,0 +1,61 @@
+import logging
+import os
+from functools import partial
+from itertools import islice
+
+from config import Config
+from utils.embedding_engine import get_engine
+from utils.embedding_generator import iter_chunks
+from utils.extractors import iter_segments
+
+logger = logging.getLogger(__name__)
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def ingest_segments(add_chunks, segments, metadata, batch_size=None):
+    """
+    Chunk, embed et enregistre un flux de segments (location, texte) par lots.
+
+    `add_chunks(doc_id, chunks, embeddings, metadata, chunk_metadatas=, start_index=)`
+    écrit un lot : `partial(db.add_chunks, category)` pour une catégorie,
+    `partial(db.add_model_chunks, model_id)` pour un modèle.
+
+    Les chunks sont embeddés et écrits par lots de INGEST_BATCH_SIZE : la
+    mémoire utilisée ne dépend pas de la taille du document. La location de
+    chaque chunk est enregistrée dans la métadonnée `page`.
+    Renvoie le nombre de chunks produits.
+    """
+    batch_size = batch_size or Config.INGEST_BATCH_SIZE
+    doc_id = metadata.get("doc_id", metadata["filename"])
+    engine = get_engine()
+    total = 0
+    for batch in _batches(iter_chunks(segments), batch_size):
+        chunks = [chunk for chunk, _ in batch]
+        chunk_metadatas = [{"page": location} if location is not None else {} for _, location in batch]
+        add_chunks(doc_id, chunks, engine.encode(chunks), metadata,
+                   chunk_metadatas=chunk_metadatas, start_index=total)
+        total += len(batch)
+    logger.info(f"Ingested {doc_id}: {total} chunks")
+    return total
+
+
+def ingest_file(add_chunks, filepath, metadata=None, mime_type=None):
+    """
+    Ingestion d'un fichier au fil de l'eau via l'extracteur de son format
+    (voir utils.extractors) : page, ligne, paragraphe ou enregistrement sert
+    de location pour les citations. Lève ValueError si le format n'est pas supporté.
+    """
+    metadata = {"filename": os.path.basename(filepath), **(metadata or {})}
+    return ingest_segments(add_chunks, iter_segments(filepath, mime_type), metadata)
+
+
+def ingest_pdf(db, filepath, category, metadata=None):
+    return ingest_file(partial(db.add_chunks, category), filepath, metadata)
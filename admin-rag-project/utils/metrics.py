@@ -0,0 +1,258 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from utils.histogram import Histogram
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+QUEUE_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+logger = logging.getLogger(__name__)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} attend les labels {self.labelnames}, reçu {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._samples()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class LabeledHistogram(_Metric):
+    """Un `utils.histogram.Histogram` par combinaison de labels"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def labels(self, **labels):
+        """Histogramme de cette combinaison de labels (créé au besoin)"""
+        key = self._key(labels)
+        histogram = self._values.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._values.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, value, **labels):
+        self.labels(**labels).observe(value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, histogram in sorted(self._samples(), key=lambda item: item[0]):
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot["buckets"]:
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(float(snapshot['sum']))}")
+            lines.append(f"{self.name}_count{labels} {snapshot['count']}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Valeurs lues à chaque rendu : `collect()` renvoie {(valeurs des labels): valeur}"""
+
+    def __init__(self, name, documentation, labelnames, collect, kind='gauge'):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def _samples(self):
+        try:
+            return list(self.collect().items())
+        except Exception as e:
+            logger.warning(f"Collecting {self.name} failed: {str(e)}")
+            return []
+
+
+def render():
+    """Toutes les métriques du processus au format texte Prometheus (0.0.4)"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# Routes Flask
+HTTP_REQUESTS = Counter('http_requests_total', 'Requêtes HTTP traitées.', ('method', 'route', 'status'))
+HTTP_LATENCY = LabeledHistogram('http_request_duration_seconds', 'Durée de traitement des requêtes HTTP.',
+                                ('method', 'route'))
+HTTP_IN_FLIGHT = Gauge('http_requests_in_flight', 'Requêtes HTTP en cours de traitement.')
+
+# Service de modèles
+UPSTREAM_REQUESTS = Counter('upstream_requests_total', 'Appels au service de modèles.',
+                            ('method', 'endpoint', 'status'))
+UPSTREAM_LATENCY = LabeledHistogram('upstream_request_duration_seconds',
+                                    "Durée des appels au service de modèles (jusqu'aux en-têtes pour les flux).",
+                                    ('method', 'endpoint'))
+UPSTREAM_IN_FLIGHT = Gauge('upstream_requests_in_flight', 'Appels au service de modèles en cours.')
+
+# Moteur d'embedding local (micro-batchs)
+EMBEDDING_BATCH_SIZE = LabeledHistogram('embedding_batch_size', 'Textes encodés par appel au modèle.',
+                                        ('model',), buckets=BATCH_SIZE_BUCKETS)
+EMBEDDING_QUEUE_WAIT = LabeledHistogram('embedding_queue_wait_seconds',
+                                        "Attente des textes dans la file avant l'appel au modèle.",
+                                        ('model',), buckets=QUEUE_LATENCY_BUCKETS)
+
+# Caches du processus (`utils.cache.LRUCache.stats()` de chaque cache enregistré)
+_caches = {}
+
+
+def register_cache(name, stats):
+    """Exporte les compteurs renvoyés par `stats()` avec le label cache=`name`"""
+    _caches[name] = stats
+
+
+def _cache_field(field):
+    def collect():
+        samples = {}
+        for name, stats in list(_caches.items()):
+            values = stats()
+            if field in values:
+                samples[(name,)] = values[field]
+        return samples
+    return collect
+
+
+CACHE_HITS = CallbackMetric('cache_hits_total', 'Lectures servies par le cache.', ('cache',),
+                            _cache_field('hits'), kind='counter')
+CACHE_MISSES = CallbackMetric('cache_misses_total', 'Lectures absentes du cache.', ('cache',),
+                              _cache_field('misses'), kind='counter')
+CACHE_EVICTIONS = CallbackMetric('cache_evictions_total', 'Entrées évincées (taille maximale atteinte).',
+                                 ('cache',), _cache_field('evictions'), kind='counter')
+CACHE_INVALIDATIONS = CallbackMetric('cache_invalidations_total', 'Entrées supprimées par invalidation.',
+                                     ('cache',), _cache_field('invalidations'), kind='counter')
+CACHE_ENTRIES = CallbackMetric('cache_entries', 'Entrées présentes dans le cache.', ('cache',),
+                               _cache_field('size'))
+CACHE_STALE_SERVED = CallbackMetric('cache_stale_served_total',
+                                    'Réponses expirées servies (rafraîchissement ou amont indisponible).',
+                                    ('cache',), _cache_field('stale_served'), kind='counter')
+CACHE_REFRESHES = CallbackMetric('cache_refreshes_total', 'Rafraîchissements lancés en arrière-plan.',
+                                 ('cache',), _cache_field('refreshes'), kind='counter')
+
+# ChromaDB local
+CHROMA_LATENCY = LabeledHistogram('chroma_operation_duration_seconds', 'Durée des opérations ChromaDB.',
+                                  ('operation', 'collection'))
+
+
+def upstream_endpoint(url):
+    """Chemin amont sans identifiants (/models/{id}/files/{name}) pour borner la cardinalité"""
+    segments = [segment for segment in urlsplit(url).path.split('/') if segment]
+    endpoint = []
+    for i, segment in enumerate(segments):
+        if i > 0 and segments[i - 1] == 'models':
+            endpoint.append('{id}')
+        elif i > 0 and segments[i - 1] == 'files':
+            endpoint.append('{name}')
+            break
+        else:
+            endpoint.append(segment)
+    return '/' + '/'.join(endpoint)
+
+
+@contextmanager
+def observe_upstream(method, url):
+    """
+    Mesure un appel amont. Le bloc renseigne `outcome["status"]` avec le code
+    HTTP reçu ; à défaut (exception), l'appel est compté en statut "error".
+    """
+    endpoint = upstream_endpoint(url)
+    outcome = {"status": "error"}
+    UPSTREAM_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    try:
+        yield outcome
+    finally:
+        UPSTREAM_IN_FLIGHT.dec()
+        UPSTREAM_LATENCY.observe(time.perf_counter() - started, method=method, endpoint=endpoint)
+        UPSTREAM_REQUESTS.inc(method=method, endpoint=endpoint, status=outcome["status"])
@@ -0,0 +1,57 @@
+import logging
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_models = {}
+_lock = threading.Lock()
+
+
+def get_embedding_model(name=None, device=None):
+    """
+    Retourne le SentenceTransformer `name` chargé une seule fois par processus.
+
+    Le premier appel charge le modèle depuis le disque ; les appels suivants,
+    depuis n'importe quel thread, réutilisent la même instance.
+    """
+    name = name or Config.EMBEDDING_MODEL_NAME
+    device = device or Config.EMBEDDING_DEVICE or None
+    key = (name, device)
+
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+
+            start = time.perf_counter()
+            model = SentenceTransformer(name, device=device)
+            _models[key] = model
+            logger.info(f"Loaded embedding model {name} on {model.device} in {time.perf_counter() - start:.2f}s")
+    return model
+
+
+def get_tokenizer(name=None):
+    """
+    Tokenizer du modèle d'embedding et nombre max de tokens par entrée
+    (`max_seq_length`, tokens spéciaux compris) au-delà duquel le texte est tronqué.
+    """
+    model = get_embedding_model(name)
+    return model.tokenizer, model.max_seq_length
+
+
+def warmup(name=None, device=None):
+    """Charge le modèle et exécute un premier encode pour initialiser le runtime"""
+    model = get_embedding_model(name, device)
+    model.encode(["warmup"])
+    return model
+
+
+def loaded_models():
+    return [{"name": name, "device": device} for name, device in _models]
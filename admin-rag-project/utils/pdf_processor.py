@@ -1,15 +1,131 @@
 from PyPDF2 import PdfReader
+import multiprocessing
+import os
 import re
+import time
 
-def process_pdf(filepath):
+from config import Config
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _clean(text):
+    # Nettoyage basique du texte
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def _extract_page_range(args):
+    """Exécuté dans un processus du pool : extrait les pages [start, stop)"""
+    filepath, start, stop = args
+    reader = PdfReader(filepath)
+    pages = []
+    for number in range(start, stop):
+        page_text = reader.pages[number].extract_text()
+        if page_text:
+            pages.append((number + 1, _clean(page_text)))
+    return pages
+
+
+def _open_document(filepath, max_pages, parallel_min_pages):
+    """
+    Exécuté dans un processus du pool : (nombre de pages, pages). Un petit
+    document est extrait dans la même tâche ; pages vaut None s'il est à
+    répartir sur plusieurs processus ou s'il dépasse `max_pages`.
+    """
+    page_count = len(PdfReader(filepath).pages)
+    if (max_pages and page_count > max_pages) or page_count >= parallel_min_pages:
+        return page_count, None
+    return page_count, _extract_page_range((filepath, 0, page_count))
+
+
+def _iter_in_process(filepath, timeout):
+    """
+    Repli pour un processus démon (pool d'import en masse), qui ne peut pas
+    créer de sous-processus. Le budget n'est vérifié qu'entre deux pages : une
+    page bloquée dans extract_text n'est jamais interrompue ici, c'est l'import
+    en masse qui arrête alors le processus (PDF_TIMEOUT par fichier).
+    """
     reader = PdfReader(filepath)
-    text = ""
-    
-    for page in reader.pages:
+    page_count = len(reader.pages)
+    if Config.PDF_MAX_PAGES and page_count > Config.PDF_MAX_PAGES:
+        raise ValueError(f"PDF trop long ({page_count} pages): {filepath}")
+    remaining = timeout or None
+    for number, page in enumerate(reader.pages, start=1):
+        if remaining is not None and remaining <= 0:
+            raise TimeoutError(f"Extraction de {filepath} interrompue après {timeout}s")
+        started = time.monotonic()
         page_text = page.extract_text()
+        if remaining is not None:
+            remaining -= time.monotonic() - started
         if page_text:
-            # Nettoyage basique du texte
-            page_text = re.sub(r'\s+', ' ', page_text).strip()
-            text += page_text + "\n\n"
-    
-    return text
\ No newline at end of file
+            yield number, _clean(page_text)
+
+
+def iter_pdf_pages(filepath, timeout=None, max_workers=None):
+    """
+    Extrait le texte d'un PDF page par page : génère (numéro de page, texte).
+
+    L'analyse et l'extraction ont lieu dans un pool de processus : un PDF
+    malformé ou une page interminable ne bloque pas le processus appelant.
+    Les gros documents (>= PDF_PARALLEL_MIN_PAGES pages) sont répartis par
+    tranches sur plusieurs processus ; les pages sont rendues dans l'ordre.
+    Lève ValueError si le fichier dépasse PDF_MAX_FILE_SIZE ou PDF_MAX_PAGES,
+    et TimeoutError si l'attente de l'extraction dépasse `timeout` secondes au
+    total (les processus du pool sont alors arrêtés). Seul le temps passé à
+    attendre le pool est décompté : le budget est suspendu pendant que
+    l'appelant traite une page.
+    """
+    size = os.path.getsize(filepath)
+    if Config.PDF_MAX_FILE_SIZE and size > Config.PDF_MAX_FILE_SIZE:
+        raise ValueError(f"PDF trop volumineux ({size} octets): {filepath}")
+
+    timeout = timeout if timeout is not None else Config.PDF_TIMEOUT
+    max_workers = max_workers or Config.PDF_MAX_WORKERS
+    if multiprocessing.current_process().daemon:
+        yield from _iter_in_process(filepath, timeout)
+        return
+
+    remaining = timeout or None
+
+    def wait(get):
+        # Décompte uniquement l'attente du pool, pas le traitement des pages déjà rendues
+        nonlocal remaining
+        if remaining is not None and remaining <= 0:
+            raise TimeoutError(f"Extraction de {filepath} interrompue après {timeout}s")
+        started = time.monotonic()
+        try:
+            result = get(timeout=remaining)
+        except multiprocessing.TimeoutError:
+            raise TimeoutError(f"Extraction de {filepath} interrompue après {timeout}s")
+        if remaining is not None:
+            remaining -= time.monotonic() - started
+        return result
+
+    context = multiprocessing.get_context('spawn')
+    pool = context.Pool(1)
+    try:
+        parallel_min_pages = Config.PDF_PARALLEL_MIN_PAGES if max_workers > 1 else float('inf')
+        page_count, pages = wait(pool.apply_async(
+            _open_document, (filepath, Config.PDF_MAX_PAGES, parallel_min_pages)).get)
+        if Config.PDF_MAX_PAGES and page_count > Config.PDF_MAX_PAGES:
+            raise ValueError(f"PDF trop long ({page_count} pages): {filepath}")
+        if pages is not None:
+            yield from pages
+            return
+
+        batch = Config.PDF_PAGES_PER_TASK
+        ranges = [(filepath, start, min(start + batch, page_count)) for start in range(0, page_count, batch)]
+        pool.terminate()
+        pool.join()
+        pool = context.Pool(min(max_workers, len(ranges)))
+        results = pool.imap(_extract_page_range, ranges)
+        for _ in ranges:
+            yield from wait(results.next)
+    finally:
+        # terminate() arrête aussi un processus bloqué sur une page malformée
+        pool.terminate()
+        pool.join()
+
+
+def process_pdf(filepath):
+    return "".join(page_text + "\n\n" for _, page_text in iter_pdf_pages(filepath))
@@ -0,0 +1,21 @@
+"""
+Point d'entrée de production : gunicorn -c gunicorn.conf.py wsgi:app
+
+Le monkey-patching doit précéder tout autre import : sockets, verrous et
+threads créés à l'import de app (pool HTTP, jobs, Socket.IO) deviennent
+coopératifs et un appel au service de modèles ne bloque plus le worker.
+"""
+import os
+
+_worker_class = os.getenv('WEB_WORKER_CLASS', 'eventlet')
+
+if _worker_class == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif _worker_class == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+from app import app, socketio  # noqa: E402
+
+__all__ = ['app', 'socketio']
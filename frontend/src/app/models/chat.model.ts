@@ -14,3 +14,29 @@ export interface ChatHistory {
   messages: ChatMessage[];
   totalMessages: number;
 }
+
+// Entrée de GET /api/history (index local du proxy)
+export interface ChatHistoryEntry {
+  id: number;
+  model_name: string | null;
+  question: string;
+  answer: string | null;
+  created_at: string;
+}
+
+// Page de GET /api/history : next_cursor (à passer en `before`) lit les entrées plus anciennes
+export interface ChatHistoryPage {
+  history: ChatHistoryEntry[];
+  next_cursor: string | null;
+  prev_cursor: string | null;
+  has_more: boolean;
+}
+
+export interface ChatHistoryQuery {
+  limit?: number;
+  before?: string;
+  after?: string;
+  model?: string;
+  since?: string;
+  until?: string;
+}
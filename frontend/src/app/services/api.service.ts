@@ -1,9 +1,10 @@
 import { Injectable } from '@angular/core';
-import { HttpClient, HttpErrorResponse } from '@angular/common/http';
-import { Observable, throwError } from 'rxjs';
-import { catchError, map } from 'rxjs/operators';
+import { HttpClient, HttpErrorResponse, HttpParams } from '@angular/common/http';
+import { EMPTY, Observable, throwError } from 'rxjs';
+import { catchError, expand, map, reduce } from 'rxjs/operators';
 import { environment } from '../../environments/environment';
 import { AIModel } from '../models/ai-model.interface';
+import { ChatHistoryEntry, ChatHistoryPage, ChatHistoryQuery } from '../models/chat.model';
 
 @Injectable({
   providedIn: 'root'
@@ -130,9 +131,26 @@ export class ApiService {
     );
   }
 
-  getChatHistory(): Observable<any> {
-    return this.http.get(`${this.apiUrl}/history`).pipe(
+  // Une page de l'historique, de la plus récente à la plus ancienne
+  getChatHistory(query: ChatHistoryQuery = {}): Observable<ChatHistoryPage> {
+    let params = new HttpParams();
+    for (const [key, value] of Object.entries(query)) {
+      if (value !== undefined && value !== null) {
+        params = params.set(key, String(value));
+      }
+    }
+    return this.http.get<ChatHistoryPage>(`${this.apiUrl}/history`, { params }).pipe(
       catchError(this.handleError)
     );
   }
+
+  // Historique complet : suit next_cursor page après page
+  getAllChatHistory(query: ChatHistoryQuery = {}): Observable<ChatHistoryEntry[]> {
+    return this.getChatHistory(query).pipe(
+      expand(page => page.has_more && page.next_cursor
+        ? this.getChatHistory({ ...query, after: undefined, before: page.next_cursor })
+        : EMPTY),
+      reduce((entries: ChatHistoryEntry[], page) => entries.concat(page.history), [])
+    );
+  }
 }
\ No newline at end of file